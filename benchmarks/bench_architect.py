@@ -0,0 +1,68 @@
+"""
+Benchmark of YAML generation for large multi-service specs.
+
+Renders a spec with NUM_SERVICES services and as many AWS resources, then
+changes one service and renders again, with and without the fragment cache.
+
+    python benchmarks/bench_architect.py [num_services]
+"""
+import copy
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from architect import YamlGenerator  # noqa: E402
+
+
+def build_spec(num_services):
+    return {
+        "namespace": "bench",
+        "services": [
+            {
+                "name": f"svc-{i}",
+                "image": f"registry.example.com/svc-{i}:1.{i % 7}",
+                "port": 8080,
+                "replicas": 1 + i % 3,
+                "env": {"AWS_REGION": "us-west-2", "SERVICE_INDEX": str(i)},
+                "resources": {"requests": {"memory": "256Mi", "cpu": "250m"}, "limits": {"memory": "512Mi"}},
+                **({"ingress": {"host": f"svc-{i}.example.com"}} if i % 5 == 0 else {}),
+            }
+            for i in range(num_services)
+        ],
+        "resources": [
+            {"type": ["s3_bucket", "sqs_queue", "dynamodb_table"][i % 3], "name": f"Resource{i}"}
+            for i in range(num_services)
+        ],
+    }
+
+
+def timed_render(generator, spec):
+    with open(os.devnull, "w") as out:
+        started = time.perf_counter()
+        written = generator.render(spec, out)
+    return (time.perf_counter() - started) * 1000, written
+
+
+def main():
+    num_services = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    spec = build_spec(num_services)
+    changed = copy.deepcopy(spec)
+    changed["services"][num_services // 2]["replicas"] = 9
+
+    cached = YamlGenerator()
+    cold_ms, written = timed_render(cached, spec)
+    warm_ms, _ = timed_render(cached, changed)
+    print(f"{num_services} services + {num_services} resources, {written / 1e6:.1f} MB of YAML")
+    print(f"first render            {cold_ms:8.1f} ms")
+    print(f"re-render, one change   {warm_ms:8.1f} ms  ({cached.stats()})")
+
+    uncached = YamlGenerator(cache_size=0)
+    timed_render(uncached, spec)
+    full_ms, _ = timed_render(uncached, changed)
+    print(f"re-render without cache {full_ms:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Benchmark of multi-attendee free slot search over a large calendar.
+
+Loads NUM_EVENTS random events for ATTENDEES people into the interval index
+and compares first-common-free-slot queries against a linear scan over the
+raw event list.
+
+    python benchmarks/bench_calendar.py [num_events]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from calendar_store import CalendarStore  # noqa: E402
+
+ATTENDEES = [f"person{i}@example.com" for i in range(200)]
+QUERIES = 500
+HOUR = 3600.0
+
+
+def linear_free_slot(events, attendees, duration, after):
+    """Reference implementation: rescans every event of the attendees."""
+    busy = sorted((s, e) for a, s, e in events if a in attendees)
+    t = after
+    for start, end in busy:
+        if start >= t + duration:
+            break
+        if end > t:
+            t = end
+    return t, t + duration
+
+
+def main():
+    num_events = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    rng = random.Random(0)
+    horizon = 365 * 24 * HOUR
+    events = []
+    for _ in range(num_events):
+        start = rng.uniform(0, horizon)
+        events.append((rng.choice(ATTENDEES), start, start + rng.choice([0.5, 1, 2]) * HOUR))
+
+    store = CalendarStore()
+    started = time.perf_counter()
+    for attendee, start, end in events:
+        store.add_event([attendee], start, end)
+    print(f"inserted {num_events} events in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    queries = [(set(rng.sample(ATTENDEES, 5)), rng.uniform(0, horizon)) for _ in range(QUERIES)]
+    for name, run in [
+        ("index", lambda a, t: store.first_common_free_slot(sorted(a), HOUR, t)),
+        ("linear", lambda a, t: linear_free_slot(events, a, HOUR, t)),
+    ]:
+        started = time.perf_counter()
+        for attendees, after in queries:
+            run(attendees, after)
+        print(f"{name:<7} {(time.perf_counter() - started) / QUERIES * 1e6:8.1f} us/query")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Benchmark of contact lookups over a large generated directory.
+
+Writes NUM_CONTACTS random contacts to a temporary CSV file, loads them into
+a ContactDirectory and measures prefix and misspelled-name queries.
+
+    python benchmarks/bench_contacts.py [num_contacts]
+"""
+import os
+import random
+import statistics
+import string
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from contacts import ContactDirectory  # noqa: E402
+
+QUERIES = 500
+
+
+def random_name(rng):
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 9))).capitalize()
+
+
+def misspell(rng, name):
+    i = rng.randrange(len(name))
+    return name[:i] + rng.choice(string.ascii_lowercase) + name[i + 1:]
+
+
+def measure(directory, queries):
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        directory.search(query, k=5)
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    return statistics.median(latencies) * 1000, latencies[int(len(latencies) * 0.95)] * 1000
+
+
+def main():
+    num_contacts = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    rng = random.Random(0)
+    names = [f"{random_name(rng)} {random_name(rng)}" for _ in range(num_contacts)]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "contacts.csv")
+        with open(path, "w") as f:
+            f.write("name,email,phone\n")
+            for i, name in enumerate(names):
+                f.write(f"{name},{name.replace(' ', '.').lower()}@example.com,555-{i:05d}\n")
+
+        started = time.perf_counter()
+        directory = ContactDirectory(path, poll_interval=0)
+        print(f"loaded {len(directory)} contacts in {time.perf_counter() - started:.2f} s")
+
+        sample = rng.sample(names, QUERIES)
+        for label, queries in [
+            ("prefix", [n.split()[0][:3] for n in sample]),
+            ("fuzzy", [misspell(rng, n) for n in sample]),
+        ]:
+            p50, p95 = measure(directory, queries)
+            print(f"{label:<7} p50 {p50:.2f} ms  p95 {p95:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
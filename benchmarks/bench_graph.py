@@ -0,0 +1,54 @@
+"""
+Benchmark of per-hop overhead: hand-written loop vs compiled LangGraph engine.
+
+The LLM is replaced by an instant fake so the numbers reflect orchestration
+cost only (state copies, routing, streaming, thread hand-offs).
+
+    python benchmarks/bench_graph.py
+"""
+import asyncio
+import os
+import sys
+import time
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from task_manager import run_paa  # noqa: E402
+
+RUNS = 50
+PLAN_STEPS = 10
+
+
+def fake_llm(messages):
+    system = messages[0].content
+    if "replanning" in system:
+        return {"content": "COMPLETE"}
+    if "planning" in system:
+        steps = ", ".join(f'"Step {i}"' for i in range(1, PLAN_STEPS + 1))
+        return {"content": '{"goals": "Benchmark", "plan": [' + steps + ']}'}
+    return {"content": "done"}
+
+
+async def measure(engine: str):
+    hops = 0
+    started = time.perf_counter()
+    for _ in range(RUNS):
+        async for status in run_paa("Benchmark task", "bench-model", engine=engine):
+            if "current_node" in status:
+                hops += 1
+    elapsed = time.perf_counter() - started
+    return elapsed, hops
+
+
+def main():
+    with patch('task_manager.create_llm', return_value=fake_llm):
+        print(f"{'engine':<8}{'runs':>6}{'hops':>8}{'total s':>10}{'us/hop':>10}")
+        for engine in ["loop", "graph"]:
+            asyncio.run(measure(engine))  # warm-up
+            elapsed, hops = asyncio.run(measure(engine))
+            print(f"{engine:<8}{RUNS:>6}{hops:>8}{elapsed:>10.3f}{elapsed / hops * 1e6:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark for offloading pure post-processing to the process pool.
+
+For growing payload sizes it compares running parse_llm_result and
+encode_status inline against running them in a pre-warmed PureExecutor.
+Besides per-call latency it measures how much work a competing thread
+(standing in for the Streamlit server) gets done meanwhile, which is what the
+offload is meant to protect.
+
+    python benchmarks/bench_offload.py
+"""
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from executor import PureExecutor, INLINE, PROCESS  # noqa: E402
+from task_manager import parse_llm_result  # noqa: E402
+
+SIZES = [1_000, 10_000, 100_000, 1_000_000, 4_000_000]
+CALLS = 20
+
+
+def encode_status(status: dict) -> str:
+    """Serializes a status event the way a JSON consumer of run_paa would."""
+    return json.dumps(status, default=str)
+
+
+def make_llm_result(size: int) -> dict:
+    steps = [f"Step {i}: " + "x" * 60 for i in range(max(1, size // 70))]
+    return {"content": "Here is the plan:\n" + json.dumps({"goals": "Benchmark", "plan": steps}), "role": "assistant"}
+
+
+def make_status(size: int) -> dict:
+    actions = [(f"Step {i}", "y" * 500) for i in range(max(1, size // 500))]
+    return {"current_node": "task_executor", "response": "done", "plan": [a[0] for a in actions], "past_actions": actions}
+
+
+def competing_thread(stop: threading.Event, counter: list):
+    while not stop.is_set():
+        sum(range(1000))
+        counter[0] += 1
+
+
+def measure(executor: PureExecutor, fn, payload, size: int):
+    counter = [0]
+    stop = threading.Event()
+    thread = threading.Thread(target=competing_thread, args=(stop, counter))
+    thread.start()
+    started = time.perf_counter()
+    for _ in range(CALLS):
+        executor.run(fn, payload, size_hint=size)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    thread.join()
+    return elapsed / CALLS * 1000, counter[0] / elapsed
+
+
+def main():
+    inline = PureExecutor(mode=INLINE)
+    process = PureExecutor(mode=PROCESS, workers=2)
+    process.warm()
+    print(f"{'function':<18}{'size':>10}{'inline ms':>12}{'process ms':>12}{'inline bg/s':>14}{'process bg/s':>14}")
+    try:
+        for name, fn, make in [("parse_llm_result", parse_llm_result, make_llm_result), ("encode_status", encode_status, make_status)]:
+            for size in SIZES:
+                payload = make(size)
+                inline_ms, inline_bg = measure(inline, fn, payload, size)
+                process_ms, process_bg = measure(process, fn, payload, size)
+                print(f"{name:<18}{size:>10}{inline_ms:>12.2f}{process_ms:>12.2f}{inline_bg:>14.0f}{process_bg:>14.0f}")
+    finally:
+        process.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Benchmark of the local BM25 index over a synthetic corpus.
+
+Indexes NUM_DOCS documents in several incremental segments, reopens the index
+from disk and reports query latency percentiles.
+
+    python benchmarks/bench_search.py [num_docs]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from search_index import SearchIndex  # noqa: E402
+
+VOCABULARY = [f"term{i}" for i in range(50_000)]
+SEGMENTS = 4
+QUERIES = 200
+
+
+def make_documents(start: int, count: int, rng: random.Random):
+    for i in range(start, start + count):
+        # Zipf-like word distribution so some terms have very long postings
+        words = [VOCABULARY[min(int(rng.paretovariate(1.2)), len(VOCABULARY) - 1)] for _ in range(80)]
+        yield f"doc-{i}", f"Document {i}", " ".join(words)
+
+
+def main():
+    num_docs = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as path:
+        index = SearchIndex(path)
+        started = time.perf_counter()
+        per_segment = num_docs // SEGMENTS
+        for segment in range(SEGMENTS):
+            index.add_documents(make_documents(segment * per_segment, per_segment, rng))
+        print(f"indexed {index.num_docs} documents in {time.perf_counter() - started:.1f}s")
+
+        index = SearchIndex(path)
+        latencies = []
+        for _ in range(QUERIES):
+            query = " ".join(rng.choice(VOCABULARY[:2000]) for _ in range(3))
+            started = time.perf_counter()
+            index.search(query, k=10)
+            latencies.append((time.perf_counter() - started) * 1000)
+        latencies.sort()
+        print(f"query ms: p50={latencies[len(latencies) // 2]:.2f} "
+              f"p95={latencies[int(len(latencies) * 0.95)]:.2f} max={latencies[-1]:.2f}")
+
+
+if __name__ == "__main__":
+    main()
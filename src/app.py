@@ -1,8 +1,18 @@
 import streamlit as st
 import asyncio
 import json
-from task_manager import run_paa
+import os
+import shutil
+from runner import get_run_manager
+from decision import DecisionPolicy
+from executor import get_executor
 from llm import list_available_models
+from render import IncrementalRenderer
+from routing import ROUTED_NODES
+from summarizer import upload_dir
+from task_manager import DEFAULT_MAX_HOPS
+from transcripts import get_transcript_store
+from resilience import get_resilient_caller
 from logging_config import setup_logging
 
 # Initialize logging and get log paths
@@ -39,6 +49,9 @@ st.title("Your Personal AI Assistant")
 # Initialize models
 initialize_models()
 
+# Start warming the post-processing workers, if enabled, before the first run
+get_executor()
+
 # Initialize Streamlit session state
 if 'initialized' not in st.session_state:
     st.session_state.initialized = False
@@ -55,6 +68,62 @@ st.sidebar.title("Settings")
 st.session_state.selected_model = st.sidebar.selectbox(
     "Select Ollama Model", available_models
 )
+st.session_state.incremental_ui = st.sidebar.checkbox(
+    "Incremental UI updates", value=True,
+    help="Send only changed fields per step instead of the full status"
+)
+st.session_state.ui_fps = st.sidebar.slider(
+    "Max UI redraws per second", min_value=1, max_value=30, value=10,
+    disabled=not st.session_state.incremental_ui
+)
+st.session_state.engine = st.sidebar.selectbox(
+    "Execution engine", ["loop", "graph"],
+    help="'graph' runs the workflow as a compiled LangGraph graph"
+)
+st.session_state.speculative = st.sidebar.checkbox(
+    "Speculative step prefetch", value=False,
+    help="Request the next step's completion while the current step's tools run"
+)
+st.session_state.profile = st.sidebar.checkbox(
+    "Profile runs", value=False,
+    help="Record where each node spends time and memory; adds overhead"
+)
+st.session_state.batch_steps = st.sidebar.checkbox(
+    "Batch trivial steps", value=False,
+    help="Answer runs of short plan steps with one completion"
+)
+st.session_state.fast_replan = st.sidebar.checkbox(
+    "Skip obvious replanner calls", value=False,
+    help="Finish runs whose steps all succeeded and retry transient errors without asking the model"
+)
+st.session_state.session_affinity = st.sidebar.checkbox(
+    "Reuse prompt prefixes", value=False,
+    help="Keep prompts byte-identical and pin the run to one Ollama host so it can reuse evaluated prefixes"
+)
+st.session_state.time_limit = st.sidebar.number_input(
+    "Time limit (seconds)", min_value=0, value=0, step=30,
+    help="Stop runs after this long and show what they completed; 0 for no limit"
+)
+st.session_state.max_hops = st.sidebar.number_input(
+    "Max workflow steps", min_value=1, value=DEFAULT_MAX_HOPS,
+    help="Stop runs that execute more nodes than this, e.g. replanning loops"
+)
+st.session_state.store_transcripts = st.sidebar.checkbox(
+    "Compress step results", value=False,
+    help="Keep each step result once, compressed, and pass references between steps"
+)
+SAME_MODEL = "(selected model)"
+with st.sidebar.expander("Model routing"):
+    st.session_state.routes = {}
+    for node in ROUTED_NODES:
+        routed_model = st.selectbox(f"Model for {node}", [SAME_MODEL] + available_models, key=f"route_{node}")
+        if routed_model != SAME_MODEL:
+            st.session_state.routes[node] = routed_model
+    escalation_model = st.selectbox(
+        "Retry unparseable output with", ["(no retry)"] + available_models,
+        help="Larger model for planner/replanner outputs the routed model got wrong"
+    )
+    st.session_state.escalation_model = escalation_model if escalation_model in available_models else None
 
 st.write(f"Selected Model: {st.session_state.selected_model}")
 
@@ -81,6 +150,65 @@ user_input = st.text_area(
     key="user_input",
 )
 
+# Optional document for the "Summarize Document" task
+uploaded_document = st.file_uploader(
+    "Attach a text document to summarize", type=["txt", "md", "csv", "log"]
+)
+if uploaded_document is not None:
+    # summarize_document only reads files in the upload directory
+    document_path = os.path.join(upload_dir(), f"paa_{uploaded_document.file_id}_{os.path.basename(uploaded_document.name)}")
+    if not os.path.exists(document_path):
+        # Copy in blocks rather than reading the whole upload into a string
+        with open(document_path, "wb") as f:
+            shutil.copyfileobj(uploaded_document, f)
+    st.caption(f"Attached document path: {document_path}")
+    if document_path not in user_input:
+        user_input = f"{user_input}\n\nDocument path: {document_path}"
+
+def render_updates(updates, expanders, field_slots):
+    """Write incremental updates into per-field slots and append new actions."""
+    for node, update in updates.items():
+        expander = expanders[node]
+        for key, value in update["fields"].items():
+            if (node, key) not in field_slots:
+                field_slots[(node, key)] = expander.empty()
+            slot = field_slots[(node, key)]
+            if isinstance(value, str):
+                slot.markdown(f"**{key}**: {value}")
+            else:
+                slot.json({key: value})
+        for task, result in update["new_actions"]:
+            expander.json({"task": task, "result": get_transcript_store().resolve(result)})
+
+def with_action_text(status):
+    """Returns status with its past_actions results resolved from the transcript store."""
+    if not status.get("past_actions"):
+        return status
+    return {**status, "past_actions": get_transcript_store().resolve_actions(status["past_actions"])}
+
+NODE_PROGRESS = {
+    "planner": 25,
+    "task_executor": 50,
+    "project_updater": 75,
+    "replanner": 90,
+}
+
+def run_options() -> dict:
+    """Returns the run_paa options selected in the sidebar."""
+    return {
+        "speculative": st.session_state.get("speculative", False),
+        "session_affinity": st.session_state.get("session_affinity", False),
+        "profile": st.session_state.get("profile", False),
+        "batch_steps": 5 if st.session_state.get("batch_steps", False) else 0,
+        "decision_policy": DecisionPolicy() if st.session_state.get("fast_replan", False) else None,
+        "engine": st.session_state.get("engine", "loop"),
+        "routes": st.session_state.get("routes") or None,
+        "escalation_model": st.session_state.get("escalation_model"),
+        "deadline": st.session_state.get("time_limit") or None,
+        "max_hops": st.session_state.get("max_hops", DEFAULT_MAX_HOPS),
+        "store_transcripts": st.session_state.get("store_transcripts", False),
+    }
+
 async def process_request(
     user_input: str,
     progress_bar,
@@ -89,12 +217,34 @@ async def process_request(
     planner_expander,
     task_expander,
     update_expander,
-    replan_expander
+    replan_expander,
+    run_id=None
 ):
-    """Process a user request and update the UI with progress."""
+    """
+    Follow a background run and update the UI with its progress.
+
+    A new run is submitted for user_input unless run_id points at an existing
+    one, in which case its events are replayed from the start.
+    """
+    run_manager = get_run_manager()
+    if run_id is None:
+        run_id = run_manager.submit(user_input, st.session_state.selected_model, **run_options())
+    expanders = {
+        "planner": planner_expander,
+        "task_executor": task_expander,
+        "project_updater": update_expander,
+        "replanner": replan_expander,
+    }
+    renderer = (
+        IncrementalRenderer(max_fps=st.session_state.get("ui_fps", 10))
+        if st.session_state.get("incremental_ui", False)
+        else None
+    )
+    field_slots = {}
+    task_checklist = task_expander.empty()
     try:
         logger.info("Starting PAA execution")
-        async for status in run_paa(user_input, st.session_state.selected_model):
+        async for status in run_manager.follow(run_id):
             logger.debug(f"Received status update: {status}")
             if "error" in status:
                 error_msg = status['error']
@@ -110,9 +260,16 @@ async def process_request(
             current_node = status.get("current_node")
 
             if current_node == "end":
+                if renderer is not None:
+                    render_updates(renderer.flush(), expanders, field_slots)
+
                 # Final response handling
-                logger.info("Task execution completed successfully")
-                st.success("Task Completed")
+                if status.get("stopped"):
+                    logger.info(f"Task execution stopped early: {status['stopped']}")
+                    st.warning(f"Run stopped early ({status['stopped']}); showing the steps completed so far")
+                else:
+                    logger.info("Task execution completed successfully")
+                    st.success("Task Completed")
                 final_response = status.get("response", "Task completed")
                 logger.debug(f"Final response: {final_response}")
                 st.write("Final Response:", final_response)
@@ -123,38 +280,41 @@ async def process_request(
                 final_status_expander = st.expander(
                     "Final Status", expanded=True
                 )
-                final_status_expander.json(status)
+                final_status_expander.json(with_action_text(status))
+                if "profile" in status:
+                    st.session_state.last_profile = {"run_id": run_id, "profile": status["profile"]}
                 break
 
-            if current_node:
+            if current_node in expanders:
                 if current_node not in st.session_state.task_status:
                     st.session_state.task_status[current_node] = {
                         "status": "In Progress",
                         "details": "",
                     }
 
-                if current_node == "planner":
-                    planner_expander.json(status)
-                    if "plan" in status:
-                        task_checklist = task_expander.empty()
-                        task_checklist.write("#### Task Checklist")
-                        for i, task in enumerate(status["plan"]):
-                            task_checklist.checkbox(task, key=f"task_{i}")
-                    st.session_state.progress = 25
-                elif current_node == "task_executor":
-                    task_expander.json(status)
-                    st.session_state.progress = 50
-                elif current_node == "project_updater":
-                    update_expander.json(status)
-                    st.session_state.progress = 75
-                elif current_node == "replanner":
-                    replan_expander.json(status)
-                    st.session_state.progress = 90
+                if renderer is None:
+                    expanders[current_node].json(with_action_text(status))
+                else:
+                    updates = renderer.update(current_node, status)
+                    if updates:
+                        render_updates(updates, expanders, field_slots)
+
+                if current_node == "planner" and "plan" in status:
+                    if renderer is None or renderer.plan_changed(status["plan"]):
+                        task_checklist.empty()
+                        with task_checklist.container():
+                            st.write("#### Task Checklist")
+                            for i, task in enumerate(status["plan"]):
+                                st.checkbox(task, key=f"task_{i}")
 
+                st.session_state.progress = NODE_PROGRESS[current_node]
                 st.session_state.task_status[current_node]["status"] = "Completed"
                 progress_bar.progress(st.session_state.progress)
                 status_placeholder.write(f"Current step: {current_node}")
 
+        if renderer is not None:
+            render_updates(renderer.flush(), expanders, field_slots)
+
     except Exception as e:
         error_msg = "Unexpected error during request processing"
         logger.error(error_msg, exc_info=True)
@@ -167,36 +327,70 @@ if st.button("Get Assistance"):
     if user_input:
         logger.info(f"Processing new request with model: {st.session_state.selected_model}")
         logger.debug(f"User input: {user_input}")
-        st.session_state.task_status = {}
-        st.session_state.progress = 0
-
-        # Create placeholders for each step
-        input_expander = st.expander("Input", expanded=True)
-        planner_expander = st.expander("Planning", expanded=True)
-        task_expander = st.expander("Task Execution", expanded=False)
-        update_expander = st.expander("Project Update", expanded=False)
-        replan_expander = st.expander("Replanning", expanded=False)
-
-        input_expander.write(user_input)
-
-        progress_bar = st.progress(0)
-        status_placeholder = st.empty()
-
-        # Run the async function
-        asyncio.run(process_request(
-            user_input,
-            progress_bar,
-            status_placeholder,
-            input_expander,
-            planner_expander,
-            task_expander,
-            update_expander,
-            replan_expander
-        ))
+        st.session_state.run_id = get_run_manager().submit(
+            user_input, st.session_state.selected_model, **run_options()
+        )
+        st.session_state.run_input = user_input
     else:
         logger.warning("Attempted to submit empty task")
         st.warning("Please enter a task or question.")
 
+if st.session_state.get("run_id") and st.button("Stop run"):
+    run_manager = get_run_manager()
+    if run_manager.cancel(st.session_state.run_id):
+        if run_manager.get(st.session_state.run_id).cancel_token.reason is None:
+            # Other sessions share the run, so it keeps going; this one stops following it
+            st.session_state.run_id = None
+            st.info("Stopped following the run")
+        else:
+            st.info("Stopping the run...")
+
+# Reattach to the current run; it keeps going in the background across reruns
+if st.session_state.get("run_id"):
+    st.session_state.task_status = {}
+    st.session_state.progress = 0
+
+    # Create placeholders for each step
+    input_expander = st.expander("Input", expanded=True)
+    planner_expander = st.expander("Planning", expanded=True)
+    task_expander = st.expander("Task Execution", expanded=False)
+    update_expander = st.expander("Project Update", expanded=False)
+    replan_expander = st.expander("Replanning", expanded=False)
+
+    input_expander.write(st.session_state.run_input)
+
+    progress_bar = st.progress(0)
+    status_placeholder = st.empty()
+
+    # Follow the run until it ends
+    asyncio.run(process_request(
+        st.session_state.run_input,
+        progress_bar,
+        status_placeholder,
+        input_expander,
+        planner_expander,
+        task_expander,
+        update_expander,
+        replan_expander,
+        run_id=st.session_state.run_id
+    ))
+
+st.sidebar.markdown(f"Runs in progress: {len(get_run_manager().active_runs())}")
+if get_run_manager().coalesce:
+    st.sidebar.markdown(f"Submissions joined to identical runs: {get_run_manager().coalesced}")
+with st.sidebar.expander("Ollama call health"):
+    st.json(get_resilient_caller().metrics())
+if st.session_state.get("store_transcripts"):
+    with st.sidebar.expander("Step result store"):
+        st.json(get_transcript_store().stats())
+if st.session_state.get("last_profile"):
+    last_profile = st.session_state.last_profile
+    st.sidebar.download_button(
+        "Download last run profile",
+        json.dumps(last_profile["profile"], indent=2),
+        file_name=f"profile_{last_profile['run_id']}.json",
+        mime="application/json",
+    )
 st.sidebar.markdown("---")
 st.sidebar.markdown(
     "<p class='footer'>© 2024 Your Personal AI Assistant</p>", unsafe_allow_html=True
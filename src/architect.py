@@ -1,29 +1,578 @@
 """
 Module for AWS architecture generation functionality.
+
+Requirements are dictionaries describing Kubernetes services and AWS
+resources:
+
+    {
+        "name": "shop",
+        "namespace": "shop",
+        "services": [
+            {"name": "api", "image": "repo/api:1.2", "port": 8080, "replicas": 2,
+             "env": {"AWS_REGION": "us-west-2"}, "ingress": {"host": "api.example.com"}},
+        ],
+        "resources": [
+            {"type": "s3_bucket", "name": "Assets", "properties": {"VersioningConfiguration": {"Status": "Enabled"}}},
+        ],
+    }
+
+Every service becomes a Deployment and a Service (plus an Ingress when it
+has one), like the manifests in deployment/kubernetes, and the resources
+become a CloudFormation template. Each of these fragments is rendered from
+a template compiled once and memoized by a hash of the requirements it is
+rendered from, so re-rendering after a small change only renders the
+fragments that changed.
+
+run_aws_architect_agent builds a CloudFormation template from a prompt with
+an Ollama model, generating the components of the architecture (network,
+compute, storage, IAM, ...) concurrently.
 """
+import asyncio
+import copy
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, List, Optional, TextIO, Union
+import yaml
+from jinja2 import Environment
+from llm import create_llm, list_available_models
+
+logger = logging.getLogger(__name__)
+
+RESOURCE_TYPES = {
+    "s3_bucket": "AWS::S3::Bucket",
+    "ec2_instance": "AWS::EC2::Instance",
+    "rds_instance": "AWS::RDS::DBInstance",
+    "lambda_function": "AWS::Lambda::Function",
+    "dynamodb_table": "AWS::DynamoDB::Table",
+    "sqs_queue": "AWS::SQS::Queue",
+    "sns_topic": "AWS::SNS::Topic",
+    "ecr_repository": "AWS::ECR::Repository",
+}
+
+RESOURCE_DEFAULTS = {
+    "AWS::EC2::Instance": {"InstanceType": "t3.micro"},
+    "AWS::RDS::DBInstance": {
+        "Engine": "mysql",
+        "DBInstanceClass": "db.t3.micro",
+        "AllocatedStorage": "20",
+        "MasterUsername": "admin",
+        "ManageMasterUserPassword": True,
+    },
+    "AWS::DynamoDB::Table": {"BillingMode": "PAY_PER_REQUEST"},
+}
+
+# AWS service names recognized in free-text requirements
+SERVICE_KEYWORDS = {
+    "S3": "s3_bucket",
+    "EC2": "ec2_instance",
+    "RDS": "rds_instance",
+    "Lambda": "lambda_function",
+    "DynamoDB": "dynamodb_table",
+    "SQS": "sqs_queue",
+    "SNS": "sns_topic",
+    "ECR": "ecr_repository",
+}
+
+
+def _to_yaml(value: Any, indent: int = 0) -> str:
+    """Dumps value as block YAML, indenting every line but the first."""
+    text = yaml.safe_dump(value, default_flow_style=False, sort_keys=False, allow_unicode=True).rstrip("\n")
+    if text.endswith("\n..."):
+        text = text[:-4]
+    return text.replace("\n", "\n" + " " * indent)
+
+
+def _scalar(value: Any) -> str:
+    """Dumps a scalar as a single YAML token; JSON scalars are valid YAML."""
+    return json.dumps(value, ensure_ascii=False)
 
-def generate_yaml(requirements: dict) -> str:
+
+TEMPLATES = {
+    "deployment": """\
+apiVersion: apps/v1
+kind: Deployment
+metadata:
+  name: {{ s.name | q }}
+  namespace: {{ namespace | q }}
+  labels:
+    app: {{ s.name | q }}
+spec:
+  replicas: {{ s.replicas | default(1) }}
+  selector:
+    matchLabels:
+      app: {{ s.name | q }}
+  template:
+    metadata:
+      labels:
+        app: {{ s.name | q }}
+    spec:
+      containers:
+      - name: {{ s.name | q }}
+        image: {{ s.image | q }}
+        ports:
+        - containerPort: {{ s.port | default(8080) }}
+{%- if s.env %}
+        env:
+{%- for key, value in s.env.items() %}
+        - name: {{ key | q }}
+          value: {{ value | string | q }}
+{%- endfor %}
+{%- endif %}
+{%- if s.resources %}
+        resources:
+          {{ s.resources | to_yaml(10) }}
+{%- endif %}
+""",
+    "service": """\
+apiVersion: v1
+kind: Service
+metadata:
+  name: {{ (s.name ~ "-service") | q }}
+  namespace: {{ namespace | q }}
+spec:
+  selector:
+    app: {{ s.name | q }}
+  ports:
+    - protocol: TCP
+      port: {{ s.service_port | default(80) }}
+      targetPort: {{ s.port | default(8080) }}
+  type: {{ s.service_type | default("ClusterIP") }}
+""",
+    "ingress": """\
+apiVersion: networking.k8s.io/v1
+kind: Ingress
+metadata:
+  name: {{ (s.name ~ "-ingress") | q }}
+  namespace: {{ namespace | q }}
+{%- if s.ingress.annotations %}
+  annotations:
+    {{ s.ingress.annotations | to_yaml(4) }}
+{%- endif %}
+spec:
+  ingressClassName: {{ s.ingress.class_name | default("alb") | q }}
+  rules:
+  - host: {{ s.ingress.host | q }}
+    http:
+      paths:
+      - path: {{ s.ingress.path | default("/") | q }}
+        pathType: Prefix
+        backend:
+          service:
+            name: {{ (s.name ~ "-service") | q }}
+            port:
+              number: {{ s.service_port | default(80) }}
+""",
+    "resource": """\
+  {{ name }}:
+    Type: {{ type }}
+{%- if properties %}
+    Properties:
+      {{ properties | to_yaml(6) }}
+{%- endif %}
+""",
+}
+
+CLOUDFORMATION_HEADER = "AWSTemplateFormatVersion: '2010-09-09'\nResources:\n"
+
+
+def _fingerprint(*parts: Any) -> str:
+    canonical = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _require(spec: Dict[str, Any], kind: str, *keys: str):
+    missing = [key for key in keys if not spec.get(key)]
+    if missing:
+        raise ValueError(f"{kind} {spec.get('name', '?')} is missing {', '.join(missing)}")
+
+
+def requirements_from_text(text: str) -> Dict[str, Any]:
+    """Builds requirements with one resource per AWS service named in text."""
+    resources = []
+    for keyword, kind in SERVICE_KEYWORDS.items():
+        if re.search(rf"\b{keyword}\b", text, re.IGNORECASE):
+            logical_id = RESOURCE_TYPES[kind].split("::")[-1]
+            resources.append({"type": kind, "name": f"{keyword.capitalize()}{logical_id}"})
+    return {"resources": resources}
+
+
+class YamlGenerator:
+    """
+    Renders requirement dictionaries to YAML with memoized fragments.
+
+    Args:
+        cache_size: Most rendered fragments kept
+    """
+
+    def __init__(self, cache_size: int = 10000):
+        environment = Environment(keep_trailing_newline=True, autoescape=False)
+        environment.filters["q"] = _scalar
+        environment.filters["to_yaml"] = _to_yaml
+        # Templates are compiled once per generator
+        self.templates = {name: environment.from_string(source) for name, source in TEMPLATES.items()}
+        self.cache_size = cache_size
+        self._fragments: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.rendered = 0
+        self.reused = 0
+
+    def _fragment(self, template: str, **context: Any) -> str:
+        key = _fingerprint(template, context)
+        with self._lock:
+            text = self._fragments.get(key)
+            if text is not None:
+                self._fragments.move_to_end(key)
+                self.reused += 1
+                return text
+        text = self.templates[template].render(**context)
+        with self._lock:
+            self.rendered += 1
+            self._fragments[key] = text
+            if len(self._fragments) > self.cache_size:
+                self._fragments.popitem(last=False)
+        return text
+
+    def fragments(self, requirements: Dict[str, Any]) -> Iterator[str]:
+        """Yields the YAML fragments for requirements in output order."""
+        namespace = requirements.get("namespace", "default")
+        documents = 0
+        for service in requirements.get("services", []):
+            _require(service, "service", "name", "image")
+            for template in ("deployment", "service") + (("ingress",) if service.get("ingress") else ()):
+                if documents:
+                    yield "---\n"
+                yield self._fragment(template, s=service, namespace=namespace)
+                documents += 1
+
+        resources = requirements.get("resources", [])
+        if resources:
+            if documents:
+                yield "---\n"
+            yield CLOUDFORMATION_HEADER
+            for resource in resources:
+                _require(resource, "resource", "type", "name")
+                resource_type = RESOURCE_TYPES.get(resource["type"], resource["type"])
+                properties = {**RESOURCE_DEFAULTS.get(resource_type, {}), **resource.get("properties", {})}
+                yield self._fragment("resource", name=resource["name"], type=resource_type, properties=properties)
+
+    def render(self, requirements: Dict[str, Any], out: TextIO) -> int:
+        """
+        Writes the YAML for requirements to out, fragment by fragment.
+
+        Returns:
+            Number of characters written
+        """
+        written = 0
+        for fragment in self.fragments(requirements):
+            out.write(fragment)
+            written += len(fragment)
+        return written
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"rendered": self.rendered, "reused": self.reused, "cached": len(self._fragments)}
+
+
+_generator: Optional[YamlGenerator] = None
+_generator_lock = threading.Lock()
+
+
+def get_yaml_generator() -> YamlGenerator:
+    """Returns the shared generator, whose fragment cache persists across calls."""
+    global _generator
+    with _generator_lock:
+        if _generator is None:
+            _generator = YamlGenerator()
+        return _generator
+
+
+def generate_yaml(requirements: Union[dict, str], out: Optional[TextIO] = None) -> str:
     """
     Generate YAML configuration based on requirements.
-    
+
     Args:
         requirements (dict): Dictionary containing architecture requirements
-        
+            (see the module docstring). A string is accepted too; it then
+            gets one CloudFormation resource per AWS service it names.
+        out (TextIO, optional): File handle to stream the YAML to instead of
+            returning it
+
     Returns:
-        str: Generated YAML configuration
+        str: Generated YAML configuration, or "" when written to out
+    """
+    if isinstance(requirements, str):
+        requirements = requirements_from_text(requirements)
+    generator = get_yaml_generator()
+    if out is not None:
+        generator.render(requirements, out)
+        return ""
+    buffer = io.StringIO()
+    generator.render(requirements, buffer)
+    return buffer.getvalue()
+
+
+COMPONENTS = ("network", "compute", "storage", "database", "iam", "messaging")
+
+# Component each recognized AWS service belongs to, for the fallback plan
+SERVICE_COMPONENTS = {
+    "s3_bucket": "storage",
+    "ec2_instance": "compute",
+    "lambda_function": "compute",
+    "ecr_repository": "compute",
+    "rds_instance": "database",
+    "dynamodb_table": "database",
+    "sqs_queue": "messaging",
+    "sns_topic": "messaging",
+}
+
+PLAN_PROMPT = """You are an AWS architect. Split the architecture below into independent components, \
+using only these component names: {components}.
+Reply with JSON only, like {{"components": [{{"name": "network", "prompt": "VPC with two public subnets"}}]}}, \
+where each prompt describes just what that component must contain.
+
+Architecture: {prompt}"""
+
+COMPONENT_PROMPT = """You are an AWS architect. Write the CloudFormation resources of the {name} component \
+of an architecture.
+Reply with JSON only, like {{"Resources": {{"LogicalId": {{"Type": "AWS::Service::Resource", "Properties": {{}}}}}}}}.
+
+Component: {prompt}"""
+
+
+def normalize_prompt(text: str) -> str:
+    """Lowercases text and collapses whitespace and trailing punctuation."""
+    return re.sub(r"\s+", " ", text).strip().rstrip(".!?").lower()
+
+
+def _parse_json(content: str) -> Optional[Any]:
+    match = re.search(r"\{.*\}", content, re.DOTALL)
+    if not match:
+        return None
+    try:
+        return json.loads(match.group())
+    except json.JSONDecodeError:
+        return None
+
+
+def fallback_components(prompt: str) -> Dict[str, str]:
+    """Plans one component per group of AWS services named in prompt."""
+    services: Dict[str, List[str]] = {}
+    for resource in requirements_from_text(prompt)["resources"]:
+        services.setdefault(SERVICE_COMPONENTS[resource["type"]], []).append(RESOURCE_TYPES[resource["type"]])
+    components = {name: f"{', '.join(types)} for: {prompt}" for name, types in services.items()}
+    return components or {"architecture": prompt}
+
+
+def _valid_resources(name: str, parsed: Any) -> Dict[str, Dict[str, Any]]:
+    resources = parsed.get("Resources", parsed) if isinstance(parsed, dict) else None
+    if not isinstance(resources, dict):
+        raise ValueError(f"component {name} returned no Resources")
+    valid = {}
+    for logical_id, resource in resources.items():
+        if not isinstance(resource, dict) or not str(resource.get("Type", "")).startswith("AWS::"):
+            logger.warning(f"Dropping invalid resource {logical_id} of component {name}")
+            continue
+        if not re.fullmatch(r"[A-Za-z0-9]+", str(logical_id)):
+            logical_id = re.sub(r"[^A-Za-z0-9]", "", str(logical_id)) or f"{name.capitalize()}Resource"
+        valid[logical_id] = resource
+    if not valid:
+        raise ValueError(f"component {name} returned no valid resources")
+    return valid
+
+
+def _references(value: Any) -> Iterator[str]:
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key == "Ref" and isinstance(item, str):
+                yield item
+            elif key == "Fn::GetAtt":
+                target = item[0] if isinstance(item, list) and item else str(item).split(".")[0]
+                yield target
+            else:
+                yield from _references(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _references(item)
+
+
+def merge_components(prompt: str, components: Dict[str, Dict[str, Dict[str, Any]]]) -> Dict[str, Any]:
     """
-    # Placeholder for YAML generation logic
-    return ""
+    Merges per-component resources into one CloudFormation template.
+
+    Identical resources from several components are kept once; different
+    resources with the same logical id are renamed after their component.
 
-def run_aws_architect_agent(prompt: str) -> dict:
+    Raises:
+        ValueError: If no component produced a resource
+    """
+    resources: Dict[str, Dict[str, Any]] = {}
+    owners: Dict[str, List[str]] = {}
+    for name, component_resources in components.items():
+        owners[name] = []
+        for logical_id, resource in component_resources.items():
+            if logical_id in resources and resources[logical_id] != resource:
+                logical_id = f"{logical_id}{re.sub(r'[^A-Za-z0-9]', '', name.title())}"
+            resources[logical_id] = resource
+            owners[name].append(logical_id)
+    if not resources:
+        raise ValueError("No component produced any resources")
+    unresolved = sorted({ref for ref in _references(resources) if ref not in resources and not ref.startswith("AWS::")})
+    if unresolved:
+        logger.warning(f"Unresolved references in generated template: {', '.join(unresolved)}")
+    metadata: Dict[str, Any] = {"Components": owners}
+    if unresolved:
+        metadata["UnresolvedReferences"] = unresolved
+    return {
+        "AWSTemplateFormatVersion": "2010-09-09",
+        "Description": normalize_prompt(prompt)[:1024],
+        "Metadata": metadata,
+        "Resources": resources,
+    }
+
+
+class ArchitectAgent:
+    """
+    Generates CloudFormation templates from prompts, one component at a time.
+
+    A prompt is planned into components once; the components are then
+    generated concurrently, so a template takes about as long as its largest
+    component. Component outputs are cached by model and normalized
+    sub-prompt, so components shared by several prompts are generated once.
+
+    Args:
+        llm_factory: Creates the chat callable for a model id
+        max_concurrency: Maximum number of concurrent component calls
+        cache_size: Most component outputs kept
+    """
+
+    def __init__(self, llm_factory: Optional[Callable[[str], Callable]] = None, max_concurrency: int = 4,
+                 cache_size: int = 1024):
+        self.llm_factory = llm_factory or create_llm
+        self.max_concurrency = max_concurrency
+        self.cache_size = cache_size
+        self._components: "OrderedDict[str, Dict[str, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.generated = 0
+        self.reused = 0
+
+    def plan(self, prompt: str, llm: Callable) -> Dict[str, str]:
+        """Returns component name -> sub-prompt, falling back to keywords if the plan is unusable."""
+        try:
+            result = llm([{"role": "user", "content": PLAN_PROMPT.format(components=", ".join(COMPONENTS), prompt=prompt)}])
+            parsed = _parse_json(result.get("content", ""))
+        except Exception as e:
+            logger.error(f"Error planning architecture components: {str(e)}")
+            parsed = None
+        components: Dict[str, str] = {}
+        for item in (parsed or {}).get("components", []) if isinstance(parsed, dict) else []:
+            if isinstance(item, dict) and item.get("name") and item.get("prompt"):
+                name = normalize_prompt(str(item["name"]))
+                components[name] = f"{components[name]}; {item['prompt']}" if name in components else str(item["prompt"])
+        if not components:
+            logger.warning("Unusable component plan, planning by AWS service keywords")
+            return fallback_components(prompt)
+        return components
+
+    def _cached(self, key: str) -> Optional[Dict[str, Dict[str, Any]]]:
+        with self._lock:
+            resources = self._components.get(key)
+            if resources is not None:
+                self._components.move_to_end(key)
+                self.reused += 1
+            return resources
+
+    def _store(self, key: str, resources: Dict[str, Dict[str, Any]]):
+        with self._lock:
+            self.generated += 1
+            self._components[key] = resources
+            if len(self._components) > self.cache_size:
+                self._components.popitem(last=False)
+
+    async def _component(self, semaphore: asyncio.Semaphore, llm: Callable, model_id: str,
+                         name: str, prompt: str) -> Dict[str, Dict[str, Any]]:
+        key = _fingerprint(model_id, name, normalize_prompt(prompt))
+        resources = self._cached(key)
+        if resources is not None:
+            return copy.deepcopy(resources)
+        async with semaphore:
+            messages = [{"role": "user", "content": COMPONENT_PROMPT.format(name=name, prompt=prompt)}]
+            result = await asyncio.to_thread(llm, messages)
+        resources = _valid_resources(name, _parse_json(result.get("content", "")))
+        self._store(key, resources)
+        return copy.deepcopy(resources)
+
+    async def generate(self, prompt: str, model_id: str, llm: Optional[Callable] = None) -> Dict[str, Any]:
+        """
+        Plans prompt into components and generates them concurrently.
+
+        Components that fail are logged and left out of the template.
+
+        Returns:
+            The merged CloudFormation template
+        """
+        llm = llm or self.llm_factory(model_id)
+        components = await asyncio.to_thread(self.plan, prompt, llm)
+        logger.info(f"Generating {len(components)} architecture components: {', '.join(components)}")
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        results = await asyncio.gather(
+            *(self._component(semaphore, llm, model_id, name, sub_prompt) for name, sub_prompt in components.items()),
+            return_exceptions=True,
+        )
+        generated = {}
+        for name, result in zip(components, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error generating component {name}: {str(result)}")
+                continue
+            generated[name] = result
+        return merge_components(prompt, generated)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"generated": self.generated, "reused": self.reused, "cached": len(self._components)}
+
+
+_agent: Optional[ArchitectAgent] = None
+_agent_lock = threading.Lock()
+
+
+def get_architect_agent() -> ArchitectAgent:
+    """
+    Returns the shared agent, whose component cache persists across calls.
+
+    PAA_ARCHITECT_CONCURRENCY sets the maximum number of concurrent calls.
+    """
+    global _agent
+    with _agent_lock:
+        if _agent is None:
+            _agent = ArchitectAgent(max_concurrency=int(os.environ.get("PAA_ARCHITECT_CONCURRENCY", "4")))
+        return _agent
+
+
+def run_aws_architect_agent(prompt: str, model_id: Optional[str] = None, llm: Optional[Callable] = None) -> dict:
     """
     Run the AWS architect agent to generate architecture based on prompt.
-    
+
     Args:
         prompt (str): User prompt describing architecture requirements
-        
+        model_id (str, optional): Ollama model to use. Defaults to
+            PAA_ARCHITECT_MODEL, or else the first available model.
+        llm (callable, optional): Chat callable to use instead of a new one
+            for model_id
+
     Returns:
-        dict: Generated architecture configuration
+        dict: Generated CloudFormation template, with the logical ids each
+            component contributed under Metadata.Components
     """
-    # Placeholder for architect agent logic
-    return {}
+    model_id = model_id or os.environ.get("PAA_ARCHITECT_MODEL")
+    if not model_id:
+        models = list_available_models()
+        if not models:
+            raise ValueError("No Ollama model available for the architect agent")
+        model_id = models[0]
+    return asyncio.run(get_architect_agent().generate(prompt, model_id, llm=llm))
@@ -0,0 +1,314 @@
+"""
+Runs many requests through run_paa from a JSONL file.
+
+Every input line is a JSON object with a "question" and optionally an "id",
+a "model_id" overriding the default model and "options" for run_paa (e.g.
+{"engine": "graph", "batch_steps": 5}). Results are appended to the output
+JSONL as each request finishes, so an interrupted batch can be resumed with
+--resume, which skips the ids that already completed successfully. An
+existing output file is only replaced with --overwrite.
+
+    python src/batch_runner.py tasks.jsonl results.jsonl --model llama3.2 --workers 8 --model-limit llama3.1:70b=2
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncGenerator, Callable, Dict, Iterator, List, Optional, Set, TextIO
+from decision import DecisionPolicy
+from task_manager import run_paa
+from transcripts import get_transcript_store
+
+logger = logging.getLogger(__name__)
+
+OK = "ok"
+ERROR = "error"
+
+# Seconds past --timeout before a run that ignored its deadline is abandoned
+TIMEOUT_GRACE = 5.0
+
+# run_paa keyword arguments a task may set
+RUN_OPTIONS = ("engine", "speculative", "routes", "escalation_model", "session_affinity", "batch_steps",
+               "deadline", "max_hops", "store_transcripts")
+# Final event statistics copied into the result
+STATS_KEYS = ("routing", "batching", "replanning", "session", "speculation", "stopped")
+
+
+def read_tasks(path: str) -> Iterator[Dict[str, Any]]:
+    """Yields the tasks of a JSONL file, giving tasks without an id their line number."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                task = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{line_number}: invalid JSON: {str(e)}")
+            if not isinstance(task, dict) or not task.get("question"):
+                raise ValueError(f"{path}:{line_number}: expected an object with a question")
+            task.setdefault("id", f"line-{line_number}")
+            task["id"] = str(task["id"])
+            yield task
+
+
+def completed_ids(path: str) -> Set[str]:
+    """Returns the ids of the successful results already in an output file."""
+    done: Set[str] = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short by an interrupted run
+                continue
+            if result.get("status") == OK:
+                done.add(str(result["id"]))
+    return done
+
+
+def drop_partial_line(path: str):
+    """Truncates a last line an interrupted run left without its newline."""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        content = f.read()
+        if content and not content.endswith(b"\n"):
+            f.truncate(content.rfind(b"\n") + 1)
+
+
+def parse_model_limits(specs: List[str]) -> Dict[str, int]:
+    """
+    Parses model limits like ["llama3.1:70b=2"].
+
+    Raises:
+        ValueError: If a limit is not model=N with N >= 1
+    """
+    limits = {}
+    for spec in specs:
+        model, sep, limit = spec.rpartition("=")
+        if not sep or not model or not limit.isdigit() or int(limit) < 1:
+            raise ValueError(f"Invalid model limit '{spec}', expected model=N")
+        limits[model] = int(limit)
+    return limits
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of values; 0.0 if there are none."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+async def run_task(task: Dict[str, Any], model_id: str, timeout: Optional[float] = None,
+                   fast_replan: bool = False, run: Callable[..., AsyncGenerator] = run_paa) -> Dict[str, Any]:
+    """Runs one task to completion and returns its result record."""
+    options = {key: value for key, value in (task.get("options") or {}).items() if key in RUN_OPTIONS}
+    if fast_replan:
+        options["decision_policy"] = DecisionPolicy()
+    if timeout is not None:
+        # Let the run stop itself at the deadline and return what it has; wait_for is only the backstop
+        options.setdefault("deadline", timeout)
+    result: Dict[str, Any] = {"id": task["id"], "question": task["question"], "model_id": model_id}
+    final: Dict[str, Any] = {}
+    error: Optional[str] = None
+
+    async def consume():
+        nonlocal final, error
+        async for status in run(task["question"], model_id, **options):
+            if "error" in status:
+                error = status["error"]
+            elif status.get("current_node") == "end":
+                final = status
+            elif "final_answer" in status and not final:
+                final = {"response": status["final_answer"]}
+
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(consume(), timeout + TIMEOUT_GRACE if timeout is not None else None)
+    except asyncio.TimeoutError:
+        error = f"Timed out after {timeout}s"
+    except Exception as e:
+        logger.error(f"Task {task['id']} failed: {str(e)}", exc_info=True)
+        error = str(e)
+    result["latency"] = round(time.perf_counter() - started, 4)
+    if error is None and final.get("stopped"):
+        # A stopped run only has part of the answer, so --resume runs it again
+        error = f"Run stopped: {final['stopped']}"
+
+    if error is not None:
+        result.update(status=ERROR, error=error)
+        result.update({key: final[key] for key in STATS_KEYS if key in final})
+    else:
+        result.update(
+            status=OK,
+            response=final.get("response", ""),
+            goals=final.get("goals", ""),
+            plan=final.get("plan", []),
+            # Results hold the text, so they stay readable without the run's transcript store
+            past_actions=get_transcript_store().resolve_actions(final.get("past_actions", [])),
+        )
+        result.update({key: final[key] for key in STATS_KEYS if key in final})
+    return result
+
+
+async def run_batch(input_path: str, output_path: str, model_id: str, workers: int = 4,
+                    model_limits: Optional[Dict[str, int]] = None, resume: bool = False,
+                    timeout: Optional[float] = None, fast_replan: bool = False, overwrite: bool = False,
+                    run: Callable[..., AsyncGenerator] = run_paa) -> Dict[str, Any]:
+    """
+    Runs the tasks of input_path concurrently, appending results to output_path.
+
+    Args:
+        input_path: JSONL file of tasks
+        output_path: JSONL file results are appended to as they finish
+        model_id: Model for tasks that don't name one
+        workers: Tasks run at the same time
+        model_limits: Most tasks running at the same time per model
+        resume: Skip tasks whose id already has a successful result in output_path
+        timeout: Seconds a task may take before it is recorded as failed
+        fast_replan: Answer obvious replanning cases without the model
+        overwrite: Replace output_path if it exists and resume is not set
+        run: The workflow to run, run_paa by default
+
+    Returns:
+        Summary with counts, wall time, throughput and latency percentiles
+
+    Raises:
+        ValueError: If output_path exists and neither resume nor overwrite is set
+    """
+    if resume:
+        drop_partial_line(output_path)
+        skip = completed_ids(output_path)
+    else:
+        skip = set()
+        if os.path.exists(output_path):
+            if not overwrite:
+                raise ValueError(f"{output_path} already exists; pass --resume to continue it or --overwrite to replace it")
+            open(output_path, "w").close()
+    tasks = (task for task in read_tasks(input_path) if task["id"] not in skip)
+    limits = model_limits or {}
+    # Tasks read ahead because their model was at its limit, and the runs active per model
+    deferred: List[Dict[str, Any]] = []
+    running: Dict[str, int] = {}
+    exhausted = False
+    ready = asyncio.Condition()
+    latencies: List[float] = []
+    counts = {OK: 0, ERROR: 0}
+    # Nodes run in worker threads; give every concurrent run room for its node and a prefetch
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=max(4, 2 * workers)))
+
+    def write(out: TextIO, result: Dict[str, Any]):
+        out.write(json.dumps(result, default=str) + "\n")
+        out.flush()
+
+    def task_model(task: Dict[str, Any]) -> str:
+        return task.get("model_id") or model_id
+
+    def has_room(task: Dict[str, Any]) -> bool:
+        limit = limits.get(task_model(task))
+        return limit is None or running.get(task_model(task), 0) < limit
+
+    def next_task() -> Optional[Dict[str, Any]]:
+        """
+        The first task whose model has room, reading past tasks for a busy model
+        so they don't hold up the others. Returns {} when no task is left and
+        None when the remaining ones have to wait for a run to finish.
+        """
+        nonlocal exhausted
+        for i, task in enumerate(deferred):
+            if has_room(task):
+                return deferred.pop(i)
+        while not exhausted:
+            task = next(tasks, None)
+            if task is None:
+                exhausted = True
+            elif has_room(task):
+                return task
+            else:
+                deferred.append(task)
+        return None if deferred else {}
+
+    async def worker(out: TextIO):
+        while True:
+            async with ready:
+                while (task := next_task()) is None:
+                    await ready.wait()
+                if not task:
+                    return
+                model = task_model(task)
+                running[model] = running.get(model, 0) + 1
+            try:
+                result = await run_task(task, model, timeout, fast_replan, run)
+            finally:
+                async with ready:
+                    running[model] -= 1
+                    ready.notify_all()
+            write(out, result)
+            counts[result["status"]] += 1
+            latencies.append(result["latency"])
+            logger.info(f"Task {task['id']} finished with status {result['status']} in {result['latency']:.2f}s")
+
+    started = time.perf_counter()
+    with open(output_path, "a", encoding="utf-8") as out:
+        await asyncio.gather(*(worker(out) for _ in range(max(1, workers))))
+    elapsed = time.perf_counter() - started
+
+    finished = counts[OK] + counts[ERROR]
+    return {
+        "completed": counts[OK],
+        "failed": counts[ERROR],
+        "skipped": len(skip),
+        "wall_time": round(elapsed, 3),
+        "throughput": round(finished / elapsed, 3) if elapsed else 0.0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+    }
+
+
+def format_summary(summary: Dict[str, Any]) -> str:
+    return (
+        f"Completed {summary['completed']}, failed {summary['failed']}, skipped {summary['skipped']} "
+        f"in {summary['wall_time']:.1f}s ({summary['throughput']:.2f} tasks/s)\n"
+        f"Latency p50 {summary['p50']:.2f}s, p95 {summary['p95']:.2f}s, p99 {summary['p99']:.2f}s"
+    )
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Run many requests through the assistant from a JSONL file.")
+    parser.add_argument("input", help="JSONL file of tasks with a question and optional id, model_id and options")
+    parser.add_argument("output", help="JSONL file to append results to")
+    parser.add_argument("--model", required=True, help="Ollama model for tasks that don't name one")
+    parser.add_argument("--workers", type=int, default=4, help="Tasks run at the same time")
+    parser.add_argument("--model-limit", action="append", default=[], metavar="MODEL=N",
+                        help="Most tasks running at the same time for MODEL; repeatable")
+    parser.add_argument("--resume", action="store_true", help="Skip tasks that already succeeded in OUTPUT")
+    parser.add_argument("--overwrite", action="store_true", help="Replace OUTPUT if it exists")
+    parser.add_argument("--timeout", type=float, help="Seconds a task may take")
+    parser.add_argument("--fast-replan", action="store_true", help="Answer obvious replanning cases without the model")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    summary = asyncio.run(run_batch(
+        args.input,
+        args.output,
+        args.model,
+        workers=args.workers,
+        model_limits=parse_model_limits(args.model_limit),
+        resume=args.resume,
+        timeout=args.timeout,
+        fast_replan=args.fast_replan,
+        overwrite=args.overwrite,
+    ))
+    print(format_summary(summary))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Batched execution of consecutive trivial plan steps.
+
+Plans often contain runs of tiny steps ("Open calendar", "Pick a time",
+"Confirm") that each cost a full task executor round trip. A StepBatcher
+groups such steps and has them answered in one completion with a JSON
+answer per step. If the answer doesn't parse, the group is executed step by
+step as usual.
+"""
+import json
+import logging
+import re
+import threading
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Steps with at most this many words count as trivial
+TRIVIAL_MAX_WORDS = 6
+
+BATCH_INSTRUCTIONS = """Goal: {goal}
+Complete each of these steps:
+{steps}
+
+Reply with JSON only, with one entry per step in the same order:
+{{"steps": [{{"step": 1, "result": "What you did for step 1", "tool": "optional tool name", "args": {{}}}}]}}
+Leave out "tool" and "args" for steps that need no tool."""
+
+
+def is_trivial_step(task: str) -> bool:
+    """Whether a plan step is short enough to be batched with its neighbours."""
+    return 0 < len(task.split()) <= TRIVIAL_MAX_WORDS
+
+
+class StepBatcher:
+    """
+    Groups consecutive trivial steps of a run into single completions.
+
+    Args:
+        max_steps: Most steps answered by one completion
+    """
+
+    def __init__(self, max_steps: int = 5):
+        if max_steps < 2:
+            raise ValueError("max_steps must be at least 2")
+        self.max_steps = max_steps
+        self._unbatched: Set[str] = set()
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.steps_batched = 0
+        self.fallbacks = 0
+
+    def group(self, plan: List[str], task: str) -> List[str]:
+        """
+        Returns the trivial steps starting at task to run as one batch.
+
+        Returns an empty list if fewer than two steps qualify.
+        """
+        if task not in plan:
+            return []
+        group = []
+        with self._lock:
+            for step in plan[plan.index(task):]:
+                if len(group) == self.max_steps or step in self._unbatched or not is_trivial_step(step):
+                    break
+                group.append(step)
+        return group if len(group) > 1 else []
+
+    def prompt(self, group: List[str], goal: str) -> str:
+        steps = "\n".join(f"{i}. {step}" for i, step in enumerate(group, 1))
+        return BATCH_INSTRUCTIONS.format(goal=goal, steps=steps)
+
+    def parse(self, content: str, group: List[str]) -> Optional[List[Tuple[str, List[Tuple[str, str]]]]]:
+        """
+        Splits a batch answer into (result, tool calls) per step.
+
+        Tool calls are (tool name, raw JSON arguments) pairs, like
+        task_manager.extract_tool_calls returns. Returns None if the answer
+        doesn't have a well-formed entry for every step.
+        """
+        match = re.search(r"\{.*\}", content, re.DOTALL)
+        try:
+            answer = json.loads(match.group()) if match else None
+        except json.JSONDecodeError:
+            answer = None
+        entries = answer.get("steps") if isinstance(answer, dict) else None
+        if not isinstance(entries, list) or len(entries) != len(group):
+            return None
+        parsed = []
+        for entry in entries:
+            if not isinstance(entry, dict) or not isinstance(entry.get("result"), str):
+                return None
+            tool = entry.get("tool")
+            tool_calls = [(str(tool), json.dumps(entry.get("args") or {}))] if tool else []
+            parsed.append((entry["result"], tool_calls))
+        return parsed
+
+    def record_batch(self, group: List[str]):
+        with self._lock:
+            self.batches += 1
+            self.steps_batched += len(group)
+
+    def record_fallback(self, group: List[str]):
+        """Runs the steps of a batch that failed to parse one at a time from now on."""
+        logger.warning(f"Batch answer for {len(group)} steps did not parse, executing them one by one")
+        with self._lock:
+            self.fallbacks += 1
+            self._unbatched.update(group)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "steps_batched": self.steps_batched,
+                "fallbacks": self.fallbacks,
+                # Each batch replaces len(group) calls with one; a fallback wastes one
+                "round_trips_saved": self.steps_batched - self.batches - self.fallbacks,
+            }
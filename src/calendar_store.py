@@ -0,0 +1,363 @@
+"""
+Local free/busy store for calendar lookups, loadable from iCalendar files.
+"""
+import glob
+import logging
+import os
+import re
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+logger = logging.getLogger(__name__)
+
+EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+DURATION_PATTERN = re.compile(r"^([+-])?P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$")
+WEEKDAYS = {"MO": 0, "TU": 1, "WE": 2, "TH": 3, "FR": 4, "SA": 5, "SU": 6}
+RRULE_FREQUENCIES = ("DAILY", "WEEKLY", "MONTHLY", "YEARLY")
+# How far ahead recurring events without an end are expanded
+RECURRENCE_HORIZON = timedelta(days=730)
+# Most occurrences expanded per recurring event
+MAX_OCCURRENCES = 5000
+
+
+class BusyIndex:
+    """
+    Busy time of one attendee as sorted, merged, non-overlapping intervals.
+
+    Times are POSIX timestamps. Lookups are binary searches; inserting an
+    event merges it with the intervals it overlaps or touches.
+    """
+
+    def __init__(self):
+        self.starts: List[float] = []
+        self.ends: List[float] = []
+
+    def __len__(self):
+        return len(self.starts)
+
+    def add(self, start: float, end: float):
+        if end <= start:
+            return
+        # Intervals overlapping or touching [start, end] are starts[lo:hi]
+        lo = bisect_left(self.ends, start)
+        hi = bisect_right(self.starts, end)
+        if lo < hi:
+            start = min(start, self.starts[lo])
+            end = max(end, self.ends[hi - 1])
+        self.starts[lo:hi] = [start]
+        self.ends[lo:hi] = [end]
+
+    def busy_until(self, t: float) -> Optional[float]:
+        """Returns the end of the busy interval containing t, or None if free at t."""
+        i = bisect_right(self.starts, t) - 1
+        if i >= 0 and self.ends[i] > t:
+            return self.ends[i]
+        return None
+
+    def next_busy(self, t: float) -> Optional[Tuple[float, float]]:
+        """Returns the first busy interval starting after t."""
+        i = bisect_right(self.starts, t)
+        if i < len(self.starts):
+            return self.starts[i], self.ends[i]
+        return None
+
+
+def _param(params: str, name: str) -> Optional[str]:
+    match = re.search(rf"(?:^|;){name}=\"?([^;\"]+)", params)
+    return match.group(1) if match else None
+
+
+def _parse_ics_datetime(value: str, params: str) -> datetime:
+    """
+    Parses an iCalendar DATE or DATE-TIME into an aware datetime.
+
+    UTC ("Z") and TZID times are converted with their zone; dates and
+    floating times are read as UTC.
+
+    Raises:
+        ValueError: If the value is malformed or its TZID is unknown
+    """
+    value = value.strip()
+    if "T" not in value:
+        return datetime.strptime(value, "%Y%m%d").replace(tzinfo=timezone.utc)
+    parsed = datetime.strptime(value.rstrip("Z"), "%Y%m%dT%H%M%S")
+    if value.endswith("Z"):
+        return parsed.replace(tzinfo=timezone.utc)
+    tzid = _param(params, "TZID")
+    if tzid:
+        try:
+            return parsed.replace(tzinfo=ZoneInfo(tzid.strip()))
+        except (ZoneInfoNotFoundError, ValueError):
+            raise ValueError(f"Unknown TZID '{tzid}'")
+    return parsed.replace(tzinfo=timezone.utc)
+
+
+def _parse_duration(value: str) -> timedelta:
+    """
+    Parses an iCalendar DURATION such as PT1H30M or P1D.
+
+    Raises:
+        ValueError: If the value is not a duration
+    """
+    match = DURATION_PATTERN.match(value.strip())
+    if not match or not any(match.groups()[1:]):
+        raise ValueError(f"Invalid DURATION '{value}'")
+    sign, weeks, days, hours, minutes, seconds = match.groups()
+    duration = timedelta(weeks=int(weeks or 0), days=int(days or 0), hours=int(hours or 0),
+                         minutes=int(minutes or 0), seconds=int(seconds or 0))
+    return -duration if sign == "-" else duration
+
+
+def _candidates(start: datetime, freq: str, interval: int, weekdays: List[int]) -> Iterator[datetime]:
+    """Yields the occurrence times of a rule in order, without COUNT or UNTIL limits."""
+    n = 0
+    while True:
+        if freq == "DAILY":
+            yield start + timedelta(days=n * interval)
+        elif freq == "WEEKLY" and not weekdays:
+            yield start + timedelta(weeks=n * interval)
+        elif freq == "WEEKLY":
+            week = start - timedelta(days=start.weekday()) + timedelta(weeks=n * interval)
+            for weekday in weekdays:
+                occurrence = week + timedelta(days=weekday)
+                if occurrence >= start:
+                    yield occurrence
+        else:
+            year, month = divmod(start.month - 1 + n * interval * (12 if freq == "YEARLY" else 1), 12)
+            try:
+                yield start.replace(year=start.year + year, month=month + 1)
+            except ValueError:
+                # RFC 5545 skips dates that don't exist, e.g. the 31st of a 30-day month
+                pass
+        n += 1
+
+
+def expand_rrule(start: datetime, rule: str, horizon: datetime) -> Iterator[datetime]:
+    """
+    Yields the start of every occurrence of a recurring event, the first included.
+
+    FREQ=DAILY/WEEKLY/MONTHLY/YEARLY with INTERVAL, COUNT, UNTIL and, for
+    weekly rules, BYDAY are expanded. Rules without COUNT or UNTIL stop at
+    horizon. Other rules are logged and only their first occurrence is kept.
+    """
+    parts = dict(part.split("=", 1) for part in rule.strip().split(";") if "=" in part)
+    freq = parts.get("FREQ")
+    unsupported = set(parts) - {"FREQ", "INTERVAL", "COUNT", "UNTIL", "BYDAY", "WKST"}
+    weekdays = [WEEKDAYS.get(day.strip()[-2:]) for day in parts["BYDAY"].split(",")] if "BYDAY" in parts else []
+    if freq not in RRULE_FREQUENCIES or unsupported or None in weekdays or (weekdays and freq != "WEEKLY"):
+        logger.warning(f"Unsupported RRULE '{rule}'; only the first occurrence is used")
+        yield start
+        return
+    interval = max(1, int(parts.get("INTERVAL", "1")))
+    count = int(parts["COUNT"]) if "COUNT" in parts else None
+    until = _parse_ics_datetime(parts["UNTIL"], "") if "UNTIL" in parts else horizon
+    for generated, occurrence in enumerate(_candidates(start, freq, interval, sorted(set(weekdays)))):
+        if (count is not None and generated >= count) or occurrence > until or generated >= MAX_OCCURRENCES:
+            return
+        yield occurrence
+
+
+def _event_times(event: Dict, horizon: datetime) -> Iterator[Tuple[float, float]]:
+    """
+    Yields (start, end) timestamps of every occurrence of a parsed VEVENT.
+
+    Raises:
+        ValueError: If a date, duration or rule of the event is malformed
+    """
+    start_value, start_params = event["DTSTART"]
+    start = _parse_ics_datetime(start_value, start_params)
+    if "DTEND" in event:
+        length = _parse_ics_datetime(*event["DTEND"]) - start
+    elif "DURATION" in event:
+        length = _parse_duration(event["DURATION"][0])
+    elif "T" not in start_value:
+        # An all-day event without an end lasts one day (RFC 5545 3.6.1)
+        length = timedelta(days=1)
+    else:
+        length = timedelta(0)
+    excluded = {
+        _parse_ics_datetime(value, params).timestamp()
+        for values, params in event["EXDATE"]
+        for value in values.split(",")
+    }
+    occurrences = expand_rrule(start, event["RRULE"][0], horizon) if "RRULE" in event else [start]
+    for occurrence in occurrences:
+        if occurrence.timestamp() not in excluded:
+            # Wall-clock arithmetic, so an event at 9:00 stays at 9:00 across DST changes
+            yield occurrence.timestamp(), (occurrence + length).timestamp()
+
+
+def parse_ics(text: str, horizon: Optional[float] = None) -> Iterable[Tuple[List[Tuple[str, str]], float, float]]:
+    """
+    Yields (attendees, start, end) for every occurrence of every VEVENT in an iCalendar document.
+
+    attendees is a list of (email, common name) pairs, organizer included.
+    Recurring events are expanded up to horizon, a timestamp defaulting to
+    RECURRENCE_HORIZON from now, unless their rule ends earlier. Events
+    with malformed dates are skipped with a warning.
+    """
+    horizon_time = (
+        datetime.fromtimestamp(horizon, tz=timezone.utc) if horizon is not None
+        else datetime.now(timezone.utc) + RECURRENCE_HORIZON
+    )
+    # Unfold continuation lines (RFC 5545 3.1)
+    lines = re.sub(r"\r?\n[ \t]", "", text).splitlines()
+    event = None
+    for line in lines:
+        if line == "BEGIN:VEVENT":
+            event = {"attendees": [], "EXDATE": []}
+            continue
+        if event is None:
+            continue
+        if line == "END:VEVENT":
+            if "DTSTART" in event:
+                try:
+                    times = list(_event_times(event, horizon_time))
+                except ValueError as e:
+                    logger.warning(f"Skipping event {event.get('UID', ('without UID',))[0]}: {str(e)}")
+                    times = []
+                for start, end in times:
+                    yield event["attendees"], start, end
+            event = None
+            continue
+        name, _, value = line.partition(":")
+        key, _, params = name.partition(";")
+        if key in ("DTSTART", "DTEND", "DURATION", "RRULE", "UID"):
+            event[key] = (value, params)
+        elif key == "EXDATE":
+            event["EXDATE"].append((value, params))
+        elif key in ("ATTENDEE", "ORGANIZER"):
+            email = value.split(":", 1)[-1].strip().lower()
+            cn = re.search(r"CN=\"?([^;:\"]+)", params)
+            event["attendees"].append((email, cn.group(1).strip() if cn else ""))
+
+
+class CalendarStore:
+    """
+    Per-attendee busy indexes with multi-attendee free slot search.
+
+    Attendees are keyed by lowercase email; common names from the calendar
+    files are kept as aliases so "Eric" resolves to eric@example.com.
+    """
+
+    def __init__(self):
+        self._busy: Dict[str, BusyIndex] = {}
+        self._aliases: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def attendees(self) -> List[str]:
+        return list(self._busy)
+
+    def add_event(self, attendees: Iterable[str], start: float, end: float):
+        """Marks every attendee as busy between start and end."""
+        with self._lock:
+            for attendee in attendees:
+                self._busy.setdefault(attendee.lower(), BusyIndex()).add(start, end)
+
+    def load_ics(self, path: str) -> int:
+        """Adds all events of an iCalendar file and returns how many were read."""
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            text = f.read()
+        count = 0
+        for attendees, start, end in parse_ics(text):
+            self.add_event([email for email, _ in attendees], start, end)
+            with self._lock:
+                for email, cn in attendees:
+                    if cn:
+                        self._aliases[cn.lower()] = email
+                        self._aliases.setdefault(cn.split()[0].lower(), email)
+            count += 1
+        logger.info(f"Loaded {count} events from {path}")
+        return count
+
+    def resolve(self, name: str) -> Optional[str]:
+        """Maps an email or a known attendee name to an attendee key."""
+        name = name.strip().lower()
+        if name in self._busy:
+            return name
+        return self._aliases.get(name)
+
+    def first_common_free_slot(self, attendees: List[str], duration: float, after: float,
+                               before: Optional[float] = None) -> Optional[Tuple[float, float]]:
+        """
+        Finds the earliest slot of the given duration when everyone is free.
+
+        Each step either confirms the candidate or jumps it past a busy
+        interval of some attendee, and every check is a binary search, so the
+        cost depends on the intervals skipped rather than on calendar size.
+
+        Args:
+            attendees: Attendee keys (see resolve)
+            duration: Slot length in seconds
+            after: Earliest start, as a timestamp
+            before: Latest end, as a timestamp; unbounded if None
+
+        Returns:
+            (start, end) timestamps, or None if no slot fits before the limit
+        """
+        indexes = [self._busy[a] for a in attendees if a in self._busy]
+        t = after
+        while before is None or t + duration <= before:
+            moved = False
+            for index in indexes:
+                busy_end = index.busy_until(t)
+                if busy_end is not None:
+                    t, moved = busy_end, True
+                    continue
+                upcoming = index.next_busy(t)
+                if upcoming is not None and upcoming[0] < t + duration:
+                    t, moved = upcoming[1], True
+            if not moved:
+                return t, t + duration
+        return None
+
+
+_stores: Dict[str, CalendarStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_calendar_store(directory: str) -> CalendarStore:
+    """Returns the store for a directory of .ics files, loading it on first use."""
+    with _stores_lock:
+        if directory not in _stores:
+            store = CalendarStore()
+            for path in sorted(glob.glob(os.path.join(directory, "*.ics"))):
+                store.load_ics(path)
+            _stores[directory] = store
+        return _stores[directory]
+
+
+def _format(ts: float) -> str:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
+
+
+def answer_free_slot_query(store: CalendarStore, query: str, now: Optional[float] = None) -> Optional[str]:
+    """
+    Answers a free-slot request phrased in text, e.g.
+    "30 minutes with eric@example.com and Ana after 2024-05-07 14:00".
+
+    Returns None if the query names no known attendee.
+    """
+    names = re.findall(rf"{EMAIL_PATTERN.pattern}|[A-Za-z][\w'-]*", query)
+    attendees = list(dict.fromkeys(a for a in (store.resolve(n) for n in names) if a))
+    if not attendees:
+        return None
+
+    duration = 30 * 60
+    match = re.search(r"(\d+)\s*(h|hours?|m|min|minutes?)\b", query, re.IGNORECASE)
+    if match:
+        duration = int(match.group(1)) * (3600 if match.group(2).lower().startswith("h") else 60)
+
+    after = now if now is not None else datetime.now(timezone.utc).timestamp()
+    match = re.search(r"\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2})?", query)
+    if match:
+        after = datetime.fromisoformat(match.group().replace(" ", "T")).replace(tzinfo=timezone.utc).timestamp()
+
+    slot = store.first_common_free_slot(attendees, duration, after)
+    if slot is None:
+        return f"No common free slot found for {', '.join(attendees)}"
+    return f"First common free slot for {', '.join(attendees)}: {_format(slot[0])} to {_format(slot[1])}"
@@ -0,0 +1,118 @@
+"""
+Cooperative cancellation and deadlines for runs.
+
+A CancellationToken is checked by run_paa between nodes and, through the
+current_cancel_token context variable, by the Ollama and tool calls a node
+makes. Calls in flight when the token trips are abandoned: the run stops
+waiting for them right away, and retries of the abandoned call stop at their
+next attempt.
+"""
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+CANCELLED = "cancelled"
+DEADLINE = "deadline"
+MAX_HOPS = "max_hops"
+
+# How often an abandonable call looks at its token
+POLL_INTERVAL = 0.05
+
+
+class CancelledRunError(RuntimeError):
+    """Raised inside a run whose token was cancelled or whose deadline passed."""
+
+    def __init__(self, reason: str):
+        super().__init__(f"Run stopped: {reason}")
+        self.reason = reason
+
+
+class CancellationToken:
+    """
+    Cancellation flag with an optional deadline.
+
+    Args:
+        timeout: Seconds from now after which the token counts as tripped
+        clock: Monotonic clock, replaceable in tests
+    """
+
+    def __init__(self, timeout: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.deadline: Optional[float] = None
+        self._cancelled = threading.Event()
+        if timeout is not None:
+            self.set_deadline(timeout)
+
+    def cancel(self):
+        if not self._cancelled.is_set():
+            logger.info("Run cancellation requested")
+        self._cancelled.set()
+
+    def set_deadline(self, timeout: float):
+        """Trips the token timeout seconds from now, unless an earlier deadline is set."""
+        deadline = self.clock() + timeout
+        if self.deadline is None or deadline < self.deadline:
+            self.deadline = deadline
+
+    @property
+    def reason(self) -> Optional[str]:
+        """CANCELLED or DEADLINE once the token has tripped, else None."""
+        if self._cancelled.is_set():
+            return CANCELLED
+        if self.deadline is not None and self.clock() >= self.deadline:
+            return DEADLINE
+        return None
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left until the deadline, or None without one."""
+        return None if self.deadline is None else max(0.0, self.deadline - self.clock())
+
+    def check(self):
+        """
+        Raises:
+            CancelledRunError: If the token has tripped
+        """
+        reason = self.reason
+        if reason is not None:
+            raise CancelledRunError(reason)
+
+    def run(self, fn: Callable[[], Any]) -> Any:
+        """
+        Calls fn on a daemon thread, abandoning it if the token trips first.
+
+        Raises:
+            CancelledRunError: If the token trips before fn returns
+        """
+        self.check()
+        outcome: Dict[str, Any] = {}
+        done = threading.Event()
+
+        def target():
+            try:
+                outcome["result"] = fn()
+            except BaseException as e:
+                outcome["error"] = e
+            finally:
+                done.set()
+
+        threading.Thread(target=target, name="paa-cancellable-call", daemon=True).start()
+        while not done.wait(POLL_INTERVAL):
+            self.check()
+        if "error" in outcome:
+            raise outcome["error"]
+        return outcome["result"]
+
+
+# Token of the run a node belongs to, set by task_manager.run_node
+current_cancel_token: ContextVar[Optional[CancellationToken]] = ContextVar("current_cancel_token", default=None)
+
+
+def check_cancelled():
+    """Raises CancelledRunError if the current run has been stopped."""
+    token = current_cancel_token.get()
+    if token is not None:
+        token.check()
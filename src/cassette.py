@@ -0,0 +1,126 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+RECORD = "record"
+REPLAY = "replay"
+
+
+def request_key(model_id: str, messages: List[Dict[str, str]], options: Optional[Dict[str, Any]] = None) -> str:
+    """Builds a stable key for a chat request from its model, messages and options."""
+    payload = json.dumps(
+        {"model": model_id, "messages": messages, "options": options or {}},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """
+    Records chat requests and responses to a JSONL file, or replays them back.
+
+    In record mode every call is appended as one line holding the request key,
+    model, messages, options, response and the time the call took. In replay
+    mode the file is loaded once and identical requests are answered from it,
+    either instantly (speed=0) or after the recorded duration divided by speed.
+    """
+
+    def __init__(self, path: str, mode: str = REPLAY, speed: float = 0.0):
+        """
+        Args:
+            path: Location of the JSONL cassette file
+            mode: Either "record" or "replay"
+            speed: Replay speed-up factor; 0 serves responses without delay
+        """
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.speed = speed
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Deque[Dict[str, Any]]] = defaultdict(deque)
+        if mode == REPLAY:
+            self._load()
+
+    def _load(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._entries[entry["key"]].append(entry)
+        logger.info(f"Loaded {sum(len(v) for v in self._entries.values())} recorded responses from {self.path}")
+
+    def record(self, model_id: str, messages: List[Dict[str, str]], options: Optional[Dict[str, Any]],
+               response: Dict[str, Any], elapsed: float):
+        """Appends a completed request to the cassette file."""
+        entry = {
+            "key": request_key(model_id, messages, options),
+            "model": model_id,
+            "messages": messages,
+            "options": options or {},
+            "response": response,
+            "elapsed": round(elapsed, 4),
+        }
+        line = json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def replay(self, model_id: str, messages: List[Dict[str, str]], options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Returns the recorded response for a request.
+
+        Identical requests recorded several times are served in recording
+        order; once exhausted the last one keeps being served.
+
+        Raises:
+            KeyError: If the request was never recorded
+        """
+        key = request_key(model_id, messages, options)
+        with self._lock:
+            recorded = self._entries.get(key)
+            if not recorded:
+                raise KeyError(f"No recorded response for request {key[:12]} (model {model_id})")
+            entry = recorded.popleft() if len(recorded) > 1 else recorded[0]
+        if self.speed > 0:
+            time.sleep(entry["elapsed"] / self.speed)
+        return entry["response"]
+
+
+_default_cassette: Optional[Cassette] = None
+_default_loaded = False
+
+
+def set_default_cassette(cassette: Optional[Cassette]):
+    """Sets the cassette used by create_llm when none is passed explicitly."""
+    global _default_cassette, _default_loaded
+    _default_cassette = cassette
+    _default_loaded = True
+
+
+def get_default_cassette() -> Optional[Cassette]:
+    """
+    Returns the process-wide cassette.
+
+    Unless set_default_cassette was called, it is configured once from the
+    PAA_CASSETTE, PAA_CASSETTE_MODE and PAA_REPLAY_SPEED environment variables.
+    """
+    global _default_cassette, _default_loaded
+    if not _default_loaded:
+        path = os.environ.get("PAA_CASSETTE")
+        if path:
+            _default_cassette = Cassette(
+                path,
+                mode=os.environ.get("PAA_CASSETTE_MODE", REPLAY),
+                speed=float(os.environ.get("PAA_REPLAY_SPEED", "0")),
+            )
+        _default_loaded = True
+    return _default_cassette
@@ -0,0 +1,231 @@
+"""
+In-memory contact directory with prefix and fuzzy name lookup.
+
+Contacts are loaded from a CSV file (name, email and phone columns) or a
+vCard file. Every contact is indexed under its full name, each name word and
+the local part of its email address:
+
+    keys      sorted search keys, for prefix matching by binary search
+    trigrams  trigram -> ids of the keys containing it, for fuzzy matching
+
+The index is immutable; reloading builds a new one and swaps the reference,
+so lookups never wait for a reload.
+"""
+import csv
+import logging
+import os
+import re
+import threading
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MIN_SIMILARITY = 0.3
+
+
+class Contact(NamedTuple):
+    name: str
+    email: str
+    phone: str
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def trigrams(text: str) -> List[str]:
+    padded = f"  {text} "
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+def _first(row: Dict[str, str], *names: str) -> str:
+    for name in names:
+        if row.get(name):
+            return row[name].strip()
+    return ""
+
+
+def load_csv(path: str) -> List[Contact]:
+    with open(path, "r", encoding="utf-8", errors="replace", newline="") as f:
+        reader = csv.DictReader(f)
+        contacts = []
+        for row in reader:
+            row = {(k or "").strip().lower(): v or "" for k, v in row.items()}
+            name = _first(row, "name", "full name", "fn")
+            if name:
+                contacts.append(Contact(name, _first(row, "email", "e-mail"), _first(row, "phone", "telephone", "tel")))
+        return contacts
+
+
+def load_vcard(path: str) -> List[Contact]:
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        text = f.read()
+    contacts = []
+    card: Optional[Dict[str, str]] = None
+    # Unfold continuation lines (RFC 6350 3.2)
+    for line in re.sub(r"\r?\n[ \t]", "", text).splitlines():
+        if line.upper() == "BEGIN:VCARD":
+            card = {}
+        elif line.upper() == "END:VCARD":
+            if card and card.get("FN"):
+                contacts.append(Contact(card["FN"], card.get("EMAIL", ""), card.get("TEL", "")))
+            card = None
+        elif card is not None:
+            name, _, value = line.partition(":")
+            key = name.split(";")[0].split(".")[-1].upper()
+            if key == "N" and "FN" not in card:
+                parts = value.split(";")
+                card["FN"] = " ".join(p for p in parts[1:2] + parts[:1] if p)
+            elif key in ("FN", "EMAIL", "TEL"):
+                # Keep the first email and phone number
+                if key == "FN" or key not in card:
+                    card[key] = value.strip()
+    return contacts
+
+
+def load_contacts(path: str) -> List[Contact]:
+    """Loads contacts from a .vcf/.vcard file or a CSV file."""
+    if path.lower().endswith((".vcf", ".vcard")):
+        return load_vcard(path)
+    return load_csv(path)
+
+
+class ContactIndex:
+    """Immutable prefix and trigram index over a list of contacts."""
+
+    def __init__(self, contacts: List[Contact]):
+        self.contacts = contacts
+        entries = set()
+        for contact_id, contact in enumerate(contacts):
+            name = normalize(contact.name)
+            keys = {name, *name.split()}
+            if contact.email:
+                keys.add(contact.email.lower().split("@")[0])
+            entries.update((key, contact_id) for key in keys if key)
+        ordered = sorted(entries)
+        self.keys = [key for key, _ in ordered]
+        self.key_contacts = [contact_id for _, contact_id in ordered]
+        self.key_trigram_counts = []
+        self.trigrams: Dict[str, List[int]] = {}
+        for key_id, key in enumerate(self.keys):
+            grams = set(trigrams(key))
+            self.key_trigram_counts.append(len(grams))
+            for gram in grams:
+                self.trigrams.setdefault(gram, []).append(key_id)
+
+    def prefix_matches(self, prefix: str) -> Dict[int, float]:
+        """Scores contacts with a key starting with prefix; exact keys score 2."""
+        scores: Dict[int, float] = {}
+        i = bisect_left(self.keys, prefix)
+        while i < len(self.keys) and self.keys[i].startswith(prefix):
+            contact_id = self.key_contacts[i]
+            score = 1 + len(prefix) / len(self.keys[i])
+            scores[contact_id] = max(score, scores.get(contact_id, 0))
+            i += 1
+        return scores
+
+    def fuzzy_matches(self, query: str, min_similarity: float = MIN_SIMILARITY) -> Dict[int, float]:
+        """Scores contacts by the best trigram Jaccard similarity of any of their keys."""
+        grams = set(trigrams(query))
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.trigrams.get(gram, ()))
+        scores: Dict[int, float] = {}
+        for key_id, count in shared.items():
+            similarity = count / (len(grams) + self.key_trigram_counts[key_id] - count)
+            if similarity >= min_similarity:
+                contact_id = self.key_contacts[key_id]
+                scores[contact_id] = max(similarity, scores.get(contact_id, 0))
+        return scores
+
+
+class ContactDirectory:
+    """
+    Ranked contact lookup backed by a file that is reloaded when it changes.
+
+    Args:
+        path: CSV or vCard file
+        poll_interval: Seconds between file change checks; 0 disables watching
+    """
+
+    def __init__(self, path: str, poll_interval: float = 2.0):
+        self.path = path
+        self.poll_interval = poll_interval
+        self._signature: Optional[Tuple[int, int]] = None
+        self._index = ContactIndex([])
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+        self.reload()
+        if poll_interval > 0:
+            self._watcher = threading.Thread(target=self._watch, name="paa-contacts-watch", daemon=True)
+            self._watcher.start()
+
+    def __len__(self):
+        return len(self._index.contacts)
+
+    def _file_signature(self) -> Tuple[int, int]:
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def reload(self) -> bool:
+        """
+        Rebuilds the index if the file changed since the last load.
+
+        A file that fails to load leaves the current index in place.
+
+        Returns:
+            Whether a new index was swapped in
+        """
+        try:
+            signature = self._file_signature()
+            if signature == self._signature:
+                return False
+            index = ContactIndex(load_contacts(self.path))
+        except Exception as e:
+            logger.error(f"Error loading contacts from {self.path}: {str(e)}")
+            return False
+        self._index = index
+        self._signature = signature
+        logger.info(f"Loaded {len(index.contacts)} contacts from {self.path}")
+        return True
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            self.reload()
+
+    def search(self, query: str, k: int = 5) -> List[Dict[str, object]]:
+        """
+        Returns the k best matching contacts, best first.
+
+        Prefix matches on a name word, the full name or the email local part
+        always rank above fuzzy matches.
+        """
+        index = self._index
+        query = normalize(query)
+        if not query:
+            return []
+        scores = index.prefix_matches(query)
+        if len(scores) < k:
+            # Fuzzy scores stay below 1, so they only fill the remaining places
+            scores = {**index.fuzzy_matches(query), **scores}
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], index.contacts[item[0]].name))[:k]
+        return [{**index.contacts[i]._asdict(), "score": round(score, 4)} for i, score in ranked]
+
+    def close(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+
+
+_directories: Dict[str, ContactDirectory] = {}
+_directories_lock = threading.Lock()
+
+
+def get_contact_directory(path: str) -> ContactDirectory:
+    """Returns a shared, watched ContactDirectory for path."""
+    with _directories_lock:
+        if path not in _directories:
+            _directories[path] = ContactDirectory(path)
+        return _directories[path]
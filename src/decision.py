@@ -0,0 +1,114 @@
+"""
+Deterministic replanning decisions for the cases that don't need a model.
+
+The replanner asks the LLM whether to continue, replan or finish after every
+pass over the plan. Often the answer is obvious from the state alone: every
+step ran without errors, or a step failed with a transient error and should
+simply run again. A DecisionPolicy answers those cases with rules and leaves
+the ambiguous ones to the LLM.
+"""
+import logging
+import re
+from typing import Callable, Dict, List, NamedTuple, Optional
+from state import State
+from transcripts import resolve_actions
+
+logger = logging.getLogger(__name__)
+
+COMPLETE = "complete"
+RETRY = "retry"
+
+# Step results that mark a failed step or tool call
+ERROR_PATTERN = re.compile(r"^Error (occurred|using tool)", re.MULTILINE)
+
+# Errors that are likely gone when the step runs again
+TRANSIENT_ERRORS = re.compile(
+    r"circuit open|did not finish within|timed? ?out|failed to connect|connection (refused|reset|error)"
+    r"|no healthy ollama hosts|\b(429|502|503|504)\b",
+    re.IGNORECASE,
+)
+
+
+class Verdict(NamedTuple):
+    """A replanning decision made without the LLM."""
+
+    action: str
+    reason: str
+    # Step to run again, for RETRY
+    task: Optional[str] = None
+
+
+Rule = Callable[[State], Optional[Verdict]]
+
+
+def step_error(result: str) -> Optional[str]:
+    """Returns the first error line of a step result, or None if the step succeeded."""
+    match = ERROR_PATTERN.search(result or "")
+    if not match:
+        return None
+    return result[match.start():].split("\n", 1)[0]
+
+
+def latest_results(state: State) -> Dict[str, str]:
+    """Returns the result of the last execution of every task."""
+    return {task: result for task, result in resolve_actions(state)}
+
+
+def all_steps_succeeded(state: State) -> Optional[Verdict]:
+    """Completes the run when every plan step ran and none of them failed."""
+    plan = state.get("plan", [])
+    if not plan or state.get("next_task"):
+        return None
+    results = latest_results(state)
+    if all(task in results and step_error(results[task]) is None for task in plan):
+        return Verdict(COMPLETE, f"All {len(plan)} steps completed without errors")
+    return None
+
+
+def transient_error_retry(max_retries: int = 2) -> Rule:
+    """
+    Returns a rule rerunning the plan from the first step that failed with a transient error.
+
+    A step is retried at most max_retries times; after that, or for any other
+    error, the LLM decides.
+    """
+    def rule(state: State) -> Optional[Verdict]:
+        plan = state.get("plan", [])
+        results = latest_results(state)
+        for task in plan:
+            error = step_error(results.get(task, ""))
+            if error is None:
+                continue
+            if not TRANSIENT_ERRORS.search(error):
+                return None
+            failures = sum(1 for t, r in resolve_actions(state) if t == task and step_error(r))
+            if failures > max_retries:
+                return None
+            return Verdict(RETRY, f"Retrying '{task}' after a transient error: {error}", task)
+        return None
+
+    return rule
+
+
+class DecisionPolicy:
+    """
+    Applies replanning rules in order; the first verdict wins.
+
+    Args:
+        rules: Rules returning a Verdict, or None when they don't apply.
+            Defaults to completing successful runs and retrying transient
+            errors up to max_retries times.
+        max_retries: Retries per step for the default transient error rule
+    """
+
+    def __init__(self, rules: Optional[List[Rule]] = None, max_retries: int = 2):
+        self.rules = rules if rules is not None else [all_steps_succeeded, transient_error_retry(max_retries)]
+
+    def decide(self, state: State) -> Optional[Verdict]:
+        """Returns the verdict for state, or None if the LLM has to decide."""
+        for rule in self.rules:
+            verdict = rule(state)
+            if verdict is not None:
+                logger.info(f"Replanning decided without the LLM: {verdict.reason}")
+                return verdict
+        return None
@@ -0,0 +1,113 @@
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+INLINE = "inline"
+PROCESS = "process"
+
+
+def _warm_worker(delay: float) -> int:
+    """Imports the node module in a worker so the first real task is not slowed down."""
+    import task_manager  # noqa: F401
+    time.sleep(delay)
+    return os.getpid()
+
+
+class PureExecutor:
+    """
+    Runs pure, CPU-bound helpers either inline or in a process pool.
+
+    Offloading moves parsing and serialization work off the GIL shared with
+    the Streamlit server thread, at the cost of pickling arguments and results.
+    Calls whose size_hint is below min_payload therefore always run inline.
+    """
+
+    def __init__(self, mode: str = INLINE, workers: Optional[int] = None, min_payload: int = 0):
+        """
+        Args:
+            mode: "inline" or "process"
+            workers: Number of worker processes; defaults to the CPU count
+            min_payload: Smallest size_hint (in characters) worth offloading
+        """
+        if mode not in (INLINE, PROCESS):
+            raise ValueError(f"Unknown executor mode: {mode}")
+        self.mode = mode
+        self.workers = workers or os.cpu_count() or 1
+        self.min_payload = min_payload
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn avoids forking the threads of a running Streamlit server
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._pool
+
+    def warm(self):
+        """Starts every worker process and preloads its imports."""
+        if self.mode != PROCESS:
+            return
+        pool = self._get_pool()
+        pids = {f.result() for f in [pool.submit(_warm_worker, 0.05) for _ in range(self.workers)]}
+        logger.info(f"Warmed {len(pids)} executor worker processes")
+
+    def run(self, fn: Callable[..., Any], *args: Any, size_hint: int = 0) -> Any:
+        """Calls fn(*args), in a worker process when offloading is enabled and worthwhile."""
+        if self.mode == INLINE or size_hint < self.min_payload:
+            return fn(*args)
+        return self._get_pool().submit(fn, *args).result()
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+                self._pool = None
+
+
+_executor: Optional[PureExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def set_executor(executor: Optional[PureExecutor]):
+    """Replaces the process-wide executor."""
+    global _executor
+    with _executor_lock:
+        _executor = executor
+
+
+def get_executor() -> PureExecutor:
+    """
+    Returns the process-wide executor.
+
+    It is configured on first use from PAA_EXECUTOR ("inline" or "process"),
+    PAA_EXECUTOR_WORKERS and PAA_OFFLOAD_MIN_CHARS; process mode workers are
+    warmed on a background thread.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            return _executor
+        _executor = PureExecutor(
+            mode=os.environ.get("PAA_EXECUTOR", INLINE),
+            workers=int(os.environ["PAA_EXECUTOR_WORKERS"]) if os.environ.get("PAA_EXECUTOR_WORKERS") else None,
+            min_payload=int(os.environ.get("PAA_OFFLOAD_MIN_CHARS", "1000000")),
+        )
+        executor = _executor
+    # Warm in the background so concurrent runs are not held up behind the lock
+    threading.Thread(target=executor.warm, name="paa-executor-warm", daemon=True).start()
+    return executor
+
+
+def offload(fn: Callable[..., Any], *args: Any, size_hint: int = 0) -> Any:
+    """Runs a pure function through the process-wide executor."""
+    return get_executor().run(fn, *args, size_hint=size_hint)
@@ -0,0 +1,188 @@
+"""
+Compiled LangGraph engine for the planner -> task_executor -> project_updater
+-> replanner flow.
+"""
+import logging
+import uuid
+from typing import Any, AsyncGenerator, Dict, Optional
+from langchain.schema import AgentFinish
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.graph import END, StateGraph
+from state import State
+import task_manager
+
+logger = logging.getLogger(__name__)
+
+# Enough hops for a 10-step plan replanned a few times
+DEFAULT_RECURSION_LIMIT = 100
+# Config key carrying the run context, whose objects can't be checkpointed
+RUN_CONTEXT = "paa_context"
+
+
+def _new_actions(state: State, result: Dict[str, Any]) -> list:
+    """Returns the actions a node appended, so the operator.add reducer doesn't double them."""
+    before = len(state.get("past_actions", []))
+    return result.get("past_actions", [])[before:]
+
+
+def _with_run_context(state: State, config: Optional[RunnableConfig]) -> State:
+    """Puts the full run context (router, prefetcher, ...) back into the node's state."""
+    context = ((config or {}).get("configurable") or {}).get(RUN_CONTEXT)
+    return {**state, "context": context} if context is not None else state
+
+
+def plan_node(state: State, config: Optional[RunnableConfig] = None) -> Dict[str, Any]:
+    result = task_manager.run_node("planner", task_manager.planner, _with_run_context(state, config))
+    return {
+        "plan": result["plan"],
+        "goals": result["goals"],
+        "current_task": result["current_task"],
+        "response": result["response"],
+        "current_node": "planner",
+    }
+
+
+def execute_node(state: State, config: Optional[RunnableConfig] = None) -> Dict[str, Any]:
+    result = task_manager.run_node("task_executor", task_manager.task_executor, _with_run_context(state, config))
+    next_task = result.get("next_task")
+    return {
+        "past_actions": _new_actions(state, result),
+        "response": result["response"],
+        "current_task": next_task or result["current_task"],
+        "next_task": next_task,
+        "current_node": "task_executor",
+    }
+
+
+def update_node(state: State, config: Optional[RunnableConfig] = None) -> Dict[str, Any]:
+    result = task_manager.run_node("project_updater", task_manager.project_updater, _with_run_context(state, config))
+    return {"response": result["response"], "current_node": "project_updater"}
+
+
+def replan_node(state: State, config: Optional[RunnableConfig] = None) -> Dict[str, Any]:
+    result = task_manager.run_node("replanner", task_manager.replanner, _with_run_context(state, config))
+    if isinstance(result, AgentFinish):
+        return {
+            "response": result.return_values.get("output", "Task completed"),
+            "current_task": "",
+            "current_node": "end",
+        }
+    if "error" in result:
+        return {
+            "past_actions": _new_actions(state, result),
+            "response": result["response"],
+            "current_node": "end",
+        }
+    if not result.get("plan"):
+        # "continue" without a new plan has nothing left to run; end like the loop engine does
+        return {"current_task": "", "current_node": "end"}
+    return {
+        "plan": result["plan"],
+        "current_task": result["current_task"],
+        "next_task": None,
+        "current_node": "replanner",
+    }
+
+
+def route_after_planner(state: State) -> str:
+    return "task_executor" if state.get("plan") else END
+
+
+def route_after_executor(state: State) -> str:
+    return "task_executor" if state.get("next_task") else "project_updater"
+
+
+def route_after_replanner(state: State) -> str:
+    # Only a new plan (or a step to retry) is executed
+    if state.get("current_node") == "replanner" and state.get("current_task"):
+        return "task_executor"
+    return END
+
+
+def build_graph() -> StateGraph:
+    """
+    Builds the uncompiled workflow graph.
+
+    Callers can add nodes or extra edges (e.g. parallel branches fanning out
+    from a node) before compiling it.
+    """
+    workflow = StateGraph(State)
+    workflow.add_node("planner", plan_node)
+    workflow.add_node("task_executor", execute_node)
+    workflow.add_node("project_updater", update_node)
+    workflow.add_node("replanner", replan_node)
+    workflow.set_entry_point("planner")
+    workflow.add_conditional_edges("planner", route_after_planner)
+    workflow.add_conditional_edges("task_executor", route_after_executor)
+    workflow.add_edge("project_updater", "replanner")
+    workflow.add_conditional_edges("replanner", route_after_replanner)
+    return workflow
+
+
+_compiled = None
+
+
+def compile_graph(checkpointer: Optional[BaseCheckpointSaver] = None):
+    """Returns the compiled graph; the checkpointer-less one is compiled once and reused."""
+    global _compiled
+    if checkpointer is not None:
+        return build_graph().compile(checkpointer=checkpointer)
+    if _compiled is None:
+        _compiled = build_graph().compile()
+    return _compiled
+
+
+async def run_paa_graph(
+    question: str,
+    context: Dict[str, Any],
+    checkpointer: Optional[BaseCheckpointSaver] = None,
+    thread_id: Optional[str] = None,
+    recursion_limit: Optional[int] = None,
+) -> AsyncGenerator[Dict, None]:
+    """
+    Runs the workflow on the compiled graph, yielding a status event per node.
+
+    Args:
+        question: The user request
+        context: Run context, at least {"model_id": ...}
+        checkpointer: Optional LangGraph checkpointer saving state after every node
+        thread_id: Checkpoint thread to write to; a new one is used if omitted
+        recursion_limit: Most node hops before LangGraph gives up; defaults
+            to DEFAULT_RECURSION_LIMIT
+    """
+    initial_state: State = {
+        "messages": [
+            SystemMessage(content="You are a helpful personal AI assistant."),
+            HumanMessage(content=question)
+        ],
+        "plan": [],
+        "goals": "",
+        "past_actions": [],
+        "current_task": "",
+        "response": "",
+        # Only plain data goes into the (checkpointed) state
+        "context": {"model_id": context["model_id"]},
+        "current_node": "planner",
+        "next_task": None,
+    }
+    config = {"recursion_limit": recursion_limit or DEFAULT_RECURSION_LIMIT, "configurable": {RUN_CONTEXT: context}}
+    if checkpointer is not None:
+        config["configurable"]["thread_id"] = thread_id or uuid.uuid4().hex
+
+    graph = compile_graph(checkpointer)
+    first = True
+    async for values in graph.astream(initial_state, config, stream_mode="values"):
+        if first:
+            # The first value is the input state, before any node ran
+            first = False
+            continue
+        yield {
+            "current_node": values.get("current_node", "unknown"),
+            "response": values.get("response", ""),
+            "plan": values.get("plan", []),
+            "goals": values.get("goals", ""),
+            "current_task": values.get("current_task", ""),
+            "past_actions": values.get("past_actions", []),
+        }
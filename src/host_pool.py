@@ -0,0 +1,225 @@
+"""
+Pool of Ollama servers with least-outstanding-requests routing.
+
+Every host's available models (/api/tags) and loaded models (/api/ps) are
+refreshed by periodic health checks. A request goes to the healthy host
+serving the model with the fewest requests in flight, preferring hosts
+that already have the model loaded. Hosts that fail are ejected until a
+health check succeeds again.
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set
+import httpx
+import ollama
+
+logger = logging.getLogger(__name__)
+
+# Requests a host with the model loaded may have in flight before an idle
+# host that still has to load it is preferred
+LOAD_PENALTY = 2
+
+
+class OllamaHost:
+    """One Ollama server and what the pool knows about it."""
+
+    def __init__(self, url: str, timeout: float = 300.0, health_timeout: float = 2.0):
+        self.url = url
+        self.client = ollama.Client(host=url, timeout=timeout)
+        self.health_client = ollama.Client(host=url, timeout=health_timeout)
+        self.healthy = True
+        self.outstanding = 0
+        self.failures = 0
+        self.models: Set[str] = set()
+        self.loaded: Set[str] = set()
+        self.checked_at: Optional[float] = None
+
+    def serves(self, model_id: str) -> bool:
+        return model_id in self.models or f"{model_id}:latest" in self.models
+
+    def is_loaded(self, model_id: str) -> bool:
+        return model_id in self.loaded or f"{model_id}:latest" in self.loaded
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "failures": self.failures,
+            "models": sorted(self.models),
+            "loaded": sorted(self.loaded),
+        }
+
+
+class NoHealthyHostError(ConnectionError):
+    """Raised when every host of the pool is ejected or has failed the request."""
+
+
+def _is_connection_error(error: Exception) -> bool:
+    return isinstance(error, (httpx.TransportError, ConnectionError, TimeoutError))
+
+
+class HostPool:
+    """
+    Routes Ollama requests across several servers.
+
+    Args:
+        urls: Base URLs of the Ollama servers
+        health_interval: Seconds between background health checks; 0 disables them
+        failure_threshold: Consecutive failed checks or requests before a host is ejected
+        timeout: Request timeout in seconds
+    """
+
+    def __init__(self, urls: List[str], health_interval: float = 10.0, failure_threshold: int = 1,
+                 timeout: float = 300.0):
+        if not urls:
+            raise ValueError("HostPool needs at least one host")
+        self.hosts = [OllamaHost(url, timeout=timeout) for url in urls]
+        self.failure_threshold = failure_threshold
+        self.health_interval = health_interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.check_health()
+        self._thread: Optional[threading.Thread] = None
+        if health_interval > 0:
+            self._thread = threading.Thread(target=self._health_loop, name="paa-ollama-health", daemon=True)
+            self._thread.start()
+
+    def _record_failure(self, host: OllamaHost, error: Exception):
+        with self._lock:
+            host.failures += 1
+            if host.healthy and host.failures >= self.failure_threshold:
+                host.healthy = False
+                logger.warning(f"Ejecting Ollama host {host.url}: {str(error)}")
+
+    def check_host(self, host: OllamaHost) -> bool:
+        """Refreshes a host's model lists, readmitting or ejecting it."""
+        try:
+            models = {m.get("name", m.get("model")) for m in host.health_client.list()["models"]}
+            loaded = {m.get("name", m.get("model")) for m in host.health_client.ps()["models"]}
+        except Exception as e:
+            self._record_failure(host, e)
+            return False
+        with self._lock:
+            if not host.healthy:
+                logger.info(f"Readmitting Ollama host {host.url}")
+            host.healthy = True
+            host.failures = 0
+            host.models = models
+            host.loaded = loaded
+            host.checked_at = time.time()
+        return True
+
+    def check_health(self):
+        """Checks every host once."""
+        for host in self.hosts:
+            self.check_host(host)
+
+    def _health_loop(self):
+        while not self._stop.wait(self.health_interval):
+            self.check_health()
+
+    def _pick(self, model_id: str, exclude: Set[str], prefer: Optional[str] = None) -> OllamaHost:
+        with self._lock:
+            healthy = [h for h in self.hosts if h.healthy and h.url not in exclude]
+            if not healthy:
+                raise NoHealthyHostError("No healthy Ollama hosts available")
+            pinned = [h for h in healthy if h.url == prefer]
+            if pinned:
+                pinned[0].outstanding += 1
+                return pinned[0]
+            # Hosts whose model list is unknown or lacks the model are a last resort
+            candidates = [h for h in healthy if h.serves(model_id)] or healthy
+            host = min(candidates, key=lambda h: h.outstanding + (0 if h.is_loaded(model_id) else LOAD_PENALTY))
+            host.outstanding += 1
+            return host
+
+    @contextmanager
+    def acquire(self, model_id: str, exclude: Set[str] = frozenset(),
+                prefer: Optional[str] = None) -> Iterator[OllamaHost]:
+        """
+        Reserves the best host for model_id for the duration of one request.
+
+        The host with URL prefer is used whenever it is healthy and not excluded.
+        """
+        host = self._pick(model_id, set(exclude), prefer)
+        try:
+            yield host
+        finally:
+            with self._lock:
+                host.outstanding -= 1
+
+    def request(self, model_id: str, call: Callable[[ollama.Client], Any], prefer: Optional[str] = None,
+                on_host: Optional[Callable[[str], None]] = None) -> Any:
+        """
+        Runs call(client) on the best host, failing over on connection errors.
+
+        Errors returned by a reachable server (e.g. an unknown model) are not
+        retried on other hosts.
+
+        Args:
+            model_id: Model the request is for
+            call: Sends the request with the given client
+            prefer: URL of the host to use while it is healthy
+            on_host: Called with the URL of the host that served the request
+        """
+        tried: Set[str] = set()
+        while True:
+            with self.acquire(model_id, tried, prefer) as host:
+                try:
+                    result = call(host.client)
+                except Exception as e:
+                    if not _is_connection_error(e):
+                        raise
+                    self._record_failure(host, e)
+                    tried.add(host.url)
+                    logger.warning(f"Ollama host {host.url} failed, trying another: {str(e)}")
+                    continue
+                with self._lock:
+                    host.failures = 0
+                    host.loaded.add(model_id)
+                if on_host is not None:
+                    on_host(host.url)
+                return result
+
+    def chat(self, model_id: str, messages: List[Dict[str, str]], prefer: Optional[str] = None,
+             on_host: Optional[Callable[[str], None]] = None, **kwargs: Any) -> Any:
+        return self.request(model_id, lambda client: client.chat(model=model_id, messages=messages, **kwargs),
+                            prefer=prefer, on_host=on_host)
+
+    def models_by_host(self) -> Dict[str, List[str]]:
+        """Returns the models available on each healthy host."""
+        with self._lock:
+            return {h.url: sorted(h.models) for h in self.hosts if h.healthy}
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {h.url: h.snapshot() for h in self.hosts}
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+_pool: Optional[HostPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_host_pool() -> Optional[HostPool]:
+    """
+    Returns the process-wide host pool, or None to use the single default host.
+
+    The pool is configured from PAA_OLLAMA_HOSTS, a comma-separated list of
+    server URLs, and PAA_OLLAMA_HEALTH_INTERVAL in seconds.
+    """
+    global _pool
+    hosts = [h.strip() for h in os.environ.get("PAA_OLLAMA_HOSTS", "").split(",") if h.strip()]
+    if not hosts:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = HostPool(hosts, health_interval=float(os.environ.get("PAA_OLLAMA_HEALTH_INTERVAL", "10")))
+        return _pool
@@ -1,75 +1,298 @@
 import ollama
 import logging
-from typing import Dict, Any
+import os
+import threading
+import time
+from typing import Dict, Any, List, Optional
+from cancellation import CancelledRunError, current_cancel_token
+from cassette import Cassette, REPLAY, get_default_cassette
+from host_pool import HostPool, get_host_pool
+from resilience import ResilientCaller, get_resilient_caller
 
 logger = logging.getLogger(__name__)
 
-def create_llm(model_id: str):
+def to_ollama_messages(messages: list) -> list[Dict[str, str]]:
+    """
+    Converts LangChain messages or raw dictionaries to the Ollama chat format.
+    
+    Args:
+        messages: List of LangChain messages or dictionaries with 'role' and 'content'
+        
+    Returns:
+        List of dictionaries with 'role' and 'content'
+    """
+    ollama_messages = []
+    for msg in messages:
+        if isinstance(msg, dict):
+            # For raw dictionaries, ensure role is set
+            if 'content' in msg:
+                ollama_messages.append({
+                    'role': msg.get('role', 'user'),  # Default to user if role not specified
+                    'content': msg['content']
+                })
+        else:
+            # For LangChain messages, convert type to role
+            content = msg.content if hasattr(msg, 'content') else str(msg)
+            role = 'assistant' if hasattr(msg, 'type') and msg.type == 'ai' else \
+                  'system' if hasattr(msg, 'type') and msg.type == 'system' else 'user'
+            ollama_messages.append({
+                'role': role,
+                'content': content
+            })
+    return ollama_messages
+
+def canonical_content(content: str) -> str:
+    """Normalizes line endings and trailing whitespace so equal prompts are byte-identical."""
+    lines = content.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip("\n")
+
+def shared_prefix_length(previous: List[Dict[str, str]], messages: List[Dict[str, str]]) -> int:
+    """Number of characters of messages' contents that previous starts with."""
+    shared = 0
+    for before, now in zip(previous, messages):
+        if before["role"] != now["role"]:
+            break
+        if before["content"] == now["content"]:
+            shared += len(now["content"])
+            continue
+        shared += len(os.path.commonprefix([before["content"], now["content"]]))
+        break
+    return shared
+
+class PromptSession:
+    """
+    Session affinity for the Ollama calls of one run.
+
+    Ollama reuses the evaluated prompt of a loaded model when the next prompt
+    starts with the same tokens. A session makes that likely: message
+    contents are canonicalized so that stable prefixes are byte-identical
+    across calls, every model is pinned to the host that served its first
+    call, and keep_alive keeps the model loaded between steps.
+
+    Tokens saved are estimated per model from the tokens per character of
+    its first call in the session, which starts cold: every later call
+    would have evaluated its whole prompt at that rate, and whatever
+    prompt_eval_count reports below that was served from the cache.
+
+    Args:
+        keep_alive: How long Ollama keeps a model loaded after a call
+    """
+
+    def __init__(self, keep_alive: str = "30m"):
+        self.keep_alive = keep_alive
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, str] = {}
+        self._last: Dict[str, List[Dict[str, str]]] = {}
+        self._tokens_per_char: Dict[str, float] = {}
+        self.calls = 0
+        self.prompt_chars = 0
+        self.shared_chars = 0
+        self.prompt_eval_tokens = 0
+        self.tokens_saved = 0
+
+    def prepare(self, messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """Returns messages with canonical contents."""
+        return [{"role": m["role"], "content": canonical_content(m["content"])} for m in messages]
+
+    def host_for(self, model_id: str) -> Optional[str]:
+        with self._lock:
+            return self._hosts.get(model_id)
+
+    def pin(self, model_id: str, url: str):
+        """Pins model_id to the host at url, e.g. after it served a call."""
+        with self._lock:
+            previous = self._hosts.get(model_id)
+            if previous != url:
+                if previous is not None:
+                    logger.info(f"Re-pinning {model_id} from {previous} to {url}")
+                self._hosts[model_id] = url
+
+    def record(self, model_id: str, messages: List[Dict[str, str]], prompt_eval_count: Optional[int]):
+        """Accounts for a completed call."""
+        chars = sum(len(m["content"]) for m in messages)
+        with self._lock:
+            self.calls += 1
+            self.prompt_chars += chars
+            self.shared_chars += shared_prefix_length(self._last.get(model_id, []), messages)
+            self._last[model_id] = messages
+            if prompt_eval_count is None or not chars:
+                return
+            self.prompt_eval_tokens += prompt_eval_count
+            rate = self._tokens_per_char.get(model_id)
+            if rate is None:
+                self._tokens_per_char[model_id] = prompt_eval_count / chars
+            else:
+                self.tokens_saved += max(0, round(chars * rate) - prompt_eval_count)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "prompt_eval_tokens": self.prompt_eval_tokens,
+                "prompt_eval_tokens_saved": self.tokens_saved,
+                "shared_prefix_ratio": round(self.shared_chars / self.prompt_chars, 4) if self.prompt_chars else 0.0,
+                "pinned_hosts": dict(self._hosts),
+            }
+
+def create_llm(model_id: str, cassette: Optional[Cassette] = None, pool: Optional[HostPool] = None,
+               resilience: Optional[ResilientCaller] = None, session: Optional[PromptSession] = None):
     """
     Creates an Ollama chat instance for the specified model.
     
     Args:
         model_id (str): The name of the Ollama model to use
+        cassette (Cassette, optional): Records or replays responses instead of
+            relying on Ollama alone. Defaults to the process-wide cassette
+            configured through PAA_CASSETTE, if any.
+        pool (HostPool, optional): Ollama servers to balance requests over.
+            Defaults to the pool configured through PAA_OLLAMA_HOSTS, if any,
+            and otherwise the single default Ollama host.
+        resilience (ResilientCaller, optional): Timeout, retry and circuit
+            breaker policy. Defaults to the process-wide one configured
+            through PAA_LLM_TIMEOUT and related variables.
+        session (PromptSession, optional): Session affinity for the calls of
+            one run, so Ollama can reuse the evaluated prompt prefix.
         
     Returns:
         A callable that implements the chat interface
     """
+    if cassette is None:
+        cassette = get_default_cassette()
+    if pool is None:
+        pool = get_host_pool()
+    if resilience is None:
+        resilience = get_resilient_caller()
+
+    def send(ollama_messages: list[Dict[str, str]], chat_kwargs: Dict[str, Any]):
+        if pool is not None:
+            if session is not None:
+                chat_kwargs = {
+                    **chat_kwargs,
+                    "prefer": session.host_for(model_id),
+                    "on_host": lambda url: session.pin(model_id, url),
+                }
+            return pool.chat(model_id, ollama_messages, stream=False, **chat_kwargs)
+        return ollama.chat(
+            model=model_id,
+            messages=ollama_messages,
+            stream=False,
+            **chat_kwargs
+        )
+
     def chat_with_ollama(messages: list[Dict[str, str]], **kwargs: Any) -> Dict[str, Any]:
         """
         Implements chat functionality using Ollama.
         
         Args:
             messages: List of message dictionaries with 'role' and 'content'
-            kwargs: Additional arguments for Ollama chat
+            kwargs: Additional arguments for Ollama chat; 'options' is
+                forwarded to the model
             
         Returns:
             Dict containing the response message
+
+        Raises:
+            CancelledRunError: If the calling run is cancelled or out of time,
+                including while the request is in flight
+            RuntimeError: If Ollama fails
         """
+        token = current_cancel_token.get()
         try:
             # Convert LangChain messages to Ollama format
-            ollama_messages = []
-            for msg in messages:
-                if isinstance(msg, dict):
-                    # For raw dictionaries, ensure role is set
-                    if 'content' in msg:
-                        ollama_messages.append({
-                            'role': msg.get('role', 'user'),  # Default to user if role not specified
-                            'content': msg['content']
-                        })
-                else:
-                    # For LangChain messages, convert type to role
-                    content = msg.content if hasattr(msg, 'content') else str(msg)
-                    role = 'assistant' if hasattr(msg, 'type') and msg.type == 'ai' else \
-                          'system' if hasattr(msg, 'type') and msg.type == 'system' else 'user'
-                    ollama_messages.append({
-                        'role': role,
-                        'content': content
-                    })
-
-            response = ollama.chat(
-                model=model_id,
-                messages=ollama_messages,
-                stream=False
-            )
-            return {
+            ollama_messages = to_ollama_messages(messages)
+            if session is not None:
+                ollama_messages = session.prepare(ollama_messages)
+            options = kwargs.get("options")
+
+            if cassette is not None and cassette.mode == REPLAY:
+                return cassette.replay(model_id, ollama_messages, options)
+
+            started = time.perf_counter()
+            chat_kwargs = {"options": options} if options else {}
+            if session is not None:
+                chat_kwargs["keep_alive"] = session.keep_alive
+            if token is None:
+                response = resilience.call(model_id, lambda: send(ollama_messages, chat_kwargs))
+            else:
+                # Every attempt checks the token, so an abandoned call stops retrying
+                def attempt():
+                    token.check()
+                    return send(ollama_messages, chat_kwargs)
+
+                response = token.run(lambda: resilience.call(model_id, attempt))
+            result = {
                 "content": response["message"]["content"],
                 "role": "assistant"
             }
+            # Token accounting, when the server reports it
+            for key in ("prompt_eval_count", "eval_count"):
+                if response.get(key) is not None:
+                    result[key] = response[key]
+            if session is not None:
+                session.record(model_id, ollama_messages, response.get("prompt_eval_count"))
+            if cassette is not None:
+                cassette.record(model_id, ollama_messages, options, result, time.perf_counter() - started)
+            return result
+        except CancelledRunError:
+            raise
         except Exception as e:
             raise RuntimeError(f"Error communicating with Ollama: {str(e)}")
     
     return chat_with_ollama
 
+def embed_text(text: str, model_id: str) -> list[float]:
+    """
+    Embeds text with an Ollama embedding model.
+    
+    Args:
+        text: The text to embed
+        model_id: The Ollama embedding model, e.g. nomic-embed-text
+        
+    Returns:
+        The embedding vector
+    """
+    try:
+        pool = get_host_pool()
+
+        def send():
+            if pool is not None:
+                return pool.request(model_id, lambda client: client.embeddings(model=model_id, prompt=text))
+            return ollama.embeddings(model=model_id, prompt=text)
+
+        response = get_resilient_caller().call(model_id, send)
+        return list(response["embedding"])
+    except Exception as e:
+        raise RuntimeError(f"Error communicating with Ollama: {str(e)}")
+
 def list_available_models() -> list[str]:
     """
     Lists all available Ollama models.
     
+    With a host pool configured, these are the models available on any
+    healthy host; see list_models_by_host for the per-host lists.
+    
     Returns:
         List of model names
     """
+    pool = get_host_pool()
+    if pool is not None:
+        return sorted({model for models in pool.models_by_host().values() for model in models})
     try:
         models = ollama.list()
         return [model.get("name", model.get("model", "unknown")) for model in models["models"]]
     except Exception as e:
         logger.error(f"Failed to list Ollama models: {str(e)}", exc_info=True)
         raise RuntimeError(f"Error listing Ollama models: {str(e)}")
+
+def list_models_by_host() -> Dict[str, list[str]]:
+    """
+    Lists the models available on each Ollama host.
+    
+    Returns:
+        Dictionary of host URL to model names; a single entry for the default
+        host when no host pool is configured
+    """
+    pool = get_host_pool()
+    if pool is not None:
+        return pool.models_by_host()
+    return {os.environ.get("OLLAMA_HOST", "default"): list_available_models()}
@@ -0,0 +1,264 @@
+"""
+Durable outbox for outgoing email, drained by a background SMTP sender.
+
+Messages are written to a SQLite database and sent later, so send_email
+returns as soon as the message is stored. The sender sends due messages in
+batches over one reused SMTP connection, retries temporary failures with
+exponential backoff and spaces out messages to the same recipient.
+"""
+import logging
+import os
+import random
+import smtplib
+import sqlite3
+import threading
+import time
+import uuid
+from email.message import EmailMessage
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+SENT = "sent"
+FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id TEXT PRIMARY KEY,
+    recipient TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    body TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL,
+    created_at REAL NOT NULL,
+    sent_at REAL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS messages_due ON messages (status, next_attempt);
+"""
+
+
+class Outbox:
+    """
+    SQLite-backed email queue with a background SMTP sender.
+
+    Args:
+        path: SQLite database file
+        smtp_host: SMTP server host
+        smtp_port: SMTP server port
+        sender: From address
+        username: SMTP login user, if the server needs authentication
+        password: SMTP login password
+        starttls: Whether to upgrade the connection with STARTTLS
+        batch_size: Most messages sent per pass over one connection
+        max_attempts: Attempts before a message is marked failed
+        backoff: Base retry delay in seconds, doubled on every attempt
+        recipient_interval: Minimum seconds between messages to one recipient
+        idle_timeout: Seconds an unused SMTP connection is kept open
+        start: Whether to start the background sender thread
+    """
+
+    def __init__(self, path: str, smtp_host: str, smtp_port: int = 25, sender: str = "assistant@localhost",
+                 username: Optional[str] = None, password: Optional[str] = None, starttls: bool = False,
+                 batch_size: int = 20, max_attempts: int = 5, backoff: float = 2.0,
+                 recipient_interval: float = 1.0, idle_timeout: float = 30.0, start: bool = True,
+                 clock: Callable[[], float] = time.time):
+        self.smtp_host = smtp_host
+        self.smtp_port = smtp_port
+        self.sender = sender
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.recipient_interval = recipient_interval
+        self.idle_timeout = idle_timeout
+        self.clock = clock
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        self._db_lock = threading.Lock()
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._smtp_used_at = 0.0
+        self._last_sent: Dict[str, float] = {}
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        if start:
+            self._thread = threading.Thread(target=self._run, name="paa-outbox", daemon=True)
+            self._thread.start()
+
+    def _execute(self, sql: str, params: tuple = ()) -> List[tuple]:
+        with self._db_lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def enqueue(self, to: str, subject: str, body: str) -> str:
+        """Stores a message for sending and returns its message id."""
+        message_id = uuid.uuid4().hex
+        now = self.clock()
+        self._execute(
+            "INSERT INTO messages (id, recipient, subject, body, status, next_attempt, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (message_id, to.strip(), subject, body, QUEUED, now, now),
+        )
+        self._wakeup.set()
+        logger.info(f"Queued email {message_id} to {to}")
+        return message_id
+
+    def status(self, message_id: str) -> Optional[Dict[str, Any]]:
+        rows = self._execute(
+            "SELECT status, attempts, sent_at, last_error FROM messages WHERE id = ?", (message_id,)
+        )
+        if not rows:
+            return None
+        status, attempts, sent_at, last_error = rows[0]
+        return {"status": status, "attempts": attempts, "sent_at": sent_at, "last_error": last_error}
+
+    def pending(self) -> int:
+        return self._execute("SELECT COUNT(*) FROM messages WHERE status = ?", (QUEUED,))[0][0]
+
+    def _connection(self) -> smtplib.SMTP:
+        if self._smtp is not None and self.clock() - self._smtp_used_at > self.idle_timeout:
+            self._close_connection()
+        if self._smtp is None:
+            smtp = smtplib.SMTP(self.smtp_host, self.smtp_port, timeout=30)
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password or "")
+            self._smtp = smtp
+        return self._smtp
+
+    def _close_connection(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                pass
+            self._smtp = None
+
+    def _build_message(self, to: str, subject: str, body: str) -> EmailMessage:
+        message = EmailMessage()
+        message["From"] = self.sender
+        message["To"] = to
+        message["Subject"] = subject
+        message.set_content(body)
+        return message
+
+    def _retry(self, message_id: str, attempts: int, error: str, permanent: bool = False):
+        if permanent or attempts >= self.max_attempts:
+            self._execute(
+                "UPDATE messages SET status = ?, attempts = ?, last_error = ? WHERE id = ?",
+                (FAILED, attempts, error, message_id),
+            )
+            logger.error(f"Giving up on email {message_id} after {attempts} attempts: {error}")
+            return
+        delay = self.backoff * 2 ** (attempts - 1) * random.uniform(0.5, 1.0)
+        self._execute(
+            "UPDATE messages SET attempts = ?, next_attempt = ?, last_error = ? WHERE id = ?",
+            (attempts, self.clock() + delay, error, message_id),
+        )
+        logger.warning(f"Email {message_id} failed, retrying in {delay:.1f}s: {error}")
+
+    def send_due(self) -> int:
+        """
+        Sends one batch of due messages.
+
+        Returns:
+            Number of messages sent
+        """
+        now = self.clock()
+        rows = self._execute(
+            "SELECT id, recipient, subject, body, attempts FROM messages "
+            "WHERE status = ? AND next_attempt <= ? ORDER BY next_attempt LIMIT ?",
+            (QUEUED, now, self.batch_size),
+        )
+        sent = 0
+        for message_id, recipient, subject, body, attempts in rows:
+            allowed_at = self._last_sent.get(recipient, float("-inf")) + self.recipient_interval
+            if allowed_at > self.clock():
+                # Rate limited; keep the message queued until the recipient's slot
+                self._execute("UPDATE messages SET next_attempt = ? WHERE id = ?", (allowed_at, message_id))
+                continue
+            try:
+                self._connection().send_message(self._build_message(recipient, subject, body))
+            except smtplib.SMTPResponseException as e:
+                # 5xx replies are permanent, 4xx replies are worth retrying
+                self._retry(message_id, attempts + 1, f"{e.smtp_code} {e.smtp_error!r}", permanent=e.smtp_code >= 500)
+                continue
+            except smtplib.SMTPRecipientsRefused as e:
+                permanent = all(code >= 500 for code, _ in e.recipients.values())
+                self._retry(message_id, attempts + 1, str(e.recipients), permanent=permanent)
+                continue
+            except (smtplib.SMTPException, OSError) as e:
+                self._close_connection()
+                self._retry(message_id, attempts + 1, str(e))
+                continue
+            self._smtp_used_at = self._last_sent[recipient] = self.clock()
+            self._execute(
+                "UPDATE messages SET status = ?, attempts = ?, sent_at = ? WHERE id = ?",
+                (SENT, attempts + 1, self._smtp_used_at, message_id),
+            )
+            sent += 1
+        if sent:
+            logger.info(f"Sent {sent} queued emails")
+        return sent
+
+    def _next_due(self) -> Optional[float]:
+        return self._execute("SELECT MIN(next_attempt) FROM messages WHERE status = ?", (QUEUED,))[0][0]
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.send_due()
+                next_due = self._next_due()
+            except Exception as e:
+                logger.error(f"Error in outbox sender: {str(e)}")
+                next_due = None
+            wait = self.idle_timeout if next_due is None else max(0.0, next_due - self.clock())
+            if self._smtp is not None:
+                wait = min(wait, max(0.0, self._smtp_used_at + self.idle_timeout - self.clock()))
+            if self._wakeup.wait(wait):
+                self._wakeup.clear()
+            elif self._smtp is not None and self.clock() - self._smtp_used_at >= self.idle_timeout:
+                self._close_connection()
+
+    def close(self):
+        """Stops the sender and closes the SMTP connection; queued messages stay stored."""
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._close_connection()
+        with self._db_lock:
+            self._db.close()
+
+
+_outbox: Optional[Outbox] = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox() -> Outbox:
+    """
+    Returns the process-wide outbox, configured from the environment.
+
+    PAA_SMTP_HOST and PAA_SMTP_PORT select the server, PAA_SMTP_SENDER the
+    From address, PAA_SMTP_USER/PAA_SMTP_PASSWORD the login and
+    PAA_SMTP_STARTTLS=1 enables TLS. Messages are stored in PAA_OUTBOX_DB.
+    """
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = Outbox(
+                os.environ.get("PAA_OUTBOX_DB", "outbox.db"),
+                os.environ["PAA_SMTP_HOST"],
+                int(os.environ.get("PAA_SMTP_PORT", "25")),
+                sender=os.environ.get("PAA_SMTP_SENDER", "assistant@localhost"),
+                username=os.environ.get("PAA_SMTP_USER"),
+                password=os.environ.get("PAA_SMTP_PASSWORD"),
+                starttls=os.environ.get("PAA_SMTP_STARTTLS") == "1",
+            )
+        return _outbox
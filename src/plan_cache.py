@@ -0,0 +1,199 @@
+"""
+Semantic cache of planner results, keyed by the embedding of the request.
+
+Requests are embedded with an Ollama embedding model and stored as rows of
+a normalized float32 matrix, so a lookup is a single matrix-vector product.
+A request similar enough to a cached one for the same model reuses its plan
+instead of calling the planner. When a path is given, the matrix is a
+memory-mapped .npy file and the plans are kept next to it in JSON.
+"""
+import json
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+from llm import embed_text
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EMBED_MODEL = "nomic-embed-text"
+EMBEDDINGS_FILE = "embeddings.npy"
+ENTRIES_FILE = "entries.json"
+TOP_K = 5
+# Rows at least this similar are treated as the same request and replaced
+DUPLICATE_SIMILARITY = 0.999
+
+
+class PlanCache:
+    """
+    Bounded plan cache with cosine similarity lookup and LRU eviction.
+
+    Args:
+        path: Directory to persist the cache in; in memory only if None
+        capacity: Most plans kept; the least recently used one is evicted
+        threshold: Minimum cosine similarity for a cached plan to be reused
+        embed: Function returning the embedding of a text; defaults to
+            Ollama embeddings with embed_model
+        embed_model: Ollama embedding model used by the default embed
+    """
+
+    def __init__(self, path: Optional[str] = None, capacity: int = 1024, threshold: float = 0.95,
+                 embed: Optional[Callable[[str], List[float]]] = None,
+                 embed_model: str = DEFAULT_EMBED_MODEL):
+        self.path = path
+        self.capacity = capacity
+        self.threshold = threshold
+        self.embed = embed or (lambda text: embed_text(text, embed_model))
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._matrix: Optional[np.ndarray] = None
+        self._entries: List[Dict[str, Any]] = []
+        self._last_used = np.zeros(capacity, dtype=np.int64)
+        self._tick = 0
+        if path:
+            os.makedirs(path, exist_ok=True)
+            self._load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _load(self):
+        matrix_path = os.path.join(self.path, EMBEDDINGS_FILE)
+        entries_path = os.path.join(self.path, ENTRIES_FILE)
+        if not (os.path.exists(matrix_path) and os.path.exists(entries_path)):
+            return
+        try:
+            matrix = np.load(matrix_path, mmap_mode="r+")
+            with open(entries_path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            if matrix.shape[0] != self.capacity or len(saved["entries"]) > self.capacity:
+                logger.warning(f"Plan cache at {self.path} has a different capacity, starting empty")
+                return
+        except Exception as e:
+            logger.error(f"Error loading plan cache from {self.path}: {str(e)}")
+            return
+        self._matrix = matrix
+        self._entries = saved["entries"]
+        self._last_used[:len(self._entries)] = saved["last_used"]
+        self._tick = int(self._last_used.max(initial=0))
+        logger.info(f"Loaded {len(self._entries)} cached plans from {self.path}")
+
+    def _save(self):
+        if not self.path:
+            return
+        if isinstance(self._matrix, np.memmap):
+            self._matrix.flush()
+        entries_path = os.path.join(self.path, ENTRIES_FILE)
+        tmp_path = entries_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"entries": self._entries, "last_used": self._last_used[:len(self._entries)].tolist()}, f)
+        os.replace(tmp_path, entries_path)
+
+    def _allocate(self, dim: int):
+        if self.path:
+            self._matrix = np.lib.format.open_memmap(
+                os.path.join(self.path, EMBEDDINGS_FILE), mode="w+", dtype=np.float32, shape=(self.capacity, dim)
+            )
+        else:
+            self._matrix = np.zeros((self.capacity, dim), dtype=np.float32)
+        self._entries = []
+        self._last_used[:] = 0
+
+    def embed_query(self, text: str) -> np.ndarray:
+        """Returns the normalized embedding of a request."""
+        vector = np.asarray(self.embed(text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _top(self, vector: np.ndarray) -> List[tuple]:
+        size = len(self._entries)
+        if self._matrix is None or size == 0 or self._matrix.shape[1] != len(vector):
+            return []
+        similarities = self._matrix[:size] @ vector
+        k = min(TOP_K, size)
+        best = np.argpartition(similarities, -k)[-k:]
+        return sorted(((float(similarities[i]), int(i)) for i in best), reverse=True)
+
+    def lookup(self, vector: np.ndarray, model_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the most similar cached plan of model_id above the threshold.
+
+        Returns:
+            Dict with text, goals, plan and similarity, or None on a miss
+        """
+        with self._lock:
+            for similarity, slot in self._top(vector):
+                if similarity < self.threshold:
+                    break
+                entry = self._entries[slot]
+                if entry["model_id"] == model_id:
+                    self._tick += 1
+                    self._last_used[slot] = self._tick
+                    self.hits += 1
+                    # Recency is saved with the next insert, keeping disk writes off the hit path
+                    return {**entry, "similarity": similarity}
+            self.misses += 1
+            return None
+
+    def insert(self, vector: np.ndarray, text: str, model_id: str, goals: str, plan: List[str]):
+        """Caches a plan under the embedding of its request."""
+        with self._lock:
+            if self._matrix is None or self._matrix.shape[1] != len(vector):
+                self._allocate(len(vector))
+            slot = None
+            for similarity, i in self._top(vector):
+                if similarity >= DUPLICATE_SIMILARITY and self._entries[i]["model_id"] == model_id:
+                    slot = i
+                    break
+            entry = {"text": text, "model_id": model_id, "goals": goals, "plan": plan}
+            if slot is None and len(self._entries) < self.capacity:
+                slot = len(self._entries)
+                self._entries.append(entry)
+            else:
+                if slot is None:
+                    slot = int(np.argmin(self._last_used[:len(self._entries)]))
+                    logger.debug(f"Evicting cached plan for: {self._entries[slot]['text']}")
+                self._entries[slot] = entry
+            self._matrix[slot] = vector
+            self._tick += 1
+            self._last_used[slot] = self._tick
+            self._save()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+_plan_cache: Optional[PlanCache] = None
+_plan_cache_lock = threading.Lock()
+
+
+def get_plan_cache() -> Optional[PlanCache]:
+    """
+    Returns the process-wide plan cache, or None if caching is disabled.
+
+    The cache is enabled by PAA_PLAN_CACHE, the directory to persist it in.
+    PAA_PLAN_CACHE_THRESHOLD sets the reuse threshold, PAA_PLAN_CACHE_SIZE
+    the capacity and PAA_EMBED_MODEL the Ollama embedding model.
+    """
+    global _plan_cache
+    path = os.environ.get("PAA_PLAN_CACHE")
+    if not path:
+        return None
+    with _plan_cache_lock:
+        if _plan_cache is None:
+            _plan_cache = PlanCache(
+                path,
+                capacity=int(os.environ.get("PAA_PLAN_CACHE_SIZE", "1024")),
+                threshold=float(os.environ.get("PAA_PLAN_CACHE_THRESHOLD", "0.95")),
+                embed_model=os.environ.get("PAA_EMBED_MODEL", DEFAULT_EMBED_MODEL),
+            )
+        return _plan_cache
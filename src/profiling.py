@@ -0,0 +1,129 @@
+"""
+Per-run profiling of workflow nodes with cProfile and tracemalloc.
+
+A RunProfiler wraps every node of one run: cProfile records where the time
+goes, split into the time spent waiting on Ollama and the rest, and
+tracemalloc snapshots taken before and after the node show which lines
+allocated memory. Runs without a profiler don't touch either module.
+"""
+import cProfile
+import logging
+import pstats
+import threading
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Functions whose cumulative time is time spent waiting on Ollama
+LLM_FUNCTIONS = {"chat_with_ollama", "embed_text"}
+
+# tracemalloc is process-wide; it runs while any profiler needs it
+_tracing_users = 0
+_tracing_lock = threading.Lock()
+
+
+def _start_tracing(frames: int):
+    global _tracing_users
+    with _tracing_lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        _tracing_users += 1
+
+
+def _stop_tracing():
+    global _tracing_users
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+class RunProfiler:
+    """
+    Profiles the nodes of one run.
+
+    Args:
+        top: Number of functions and allocation sites reported
+        trace_frames: Frames tracemalloc keeps per allocation
+    """
+
+    def __init__(self, top: int = 20, trace_frames: int = 1):
+        self.top = top
+        self.trace_frames = trace_frames
+        self._stats: Optional[pstats.Stats] = None
+        self._nodes: Dict[str, Dict[str, float]] = {}
+        self._allocations: Dict[str, List[int]] = {}
+        self._lock = threading.Lock()
+        self._tracing = False
+
+    def call(self, node: str, fn: Callable[..., Any], *args: Any) -> Any:
+        """Runs fn(*args) as the given node under the profilers."""
+        if not self._tracing:
+            _start_tracing(self.trace_frames)
+            self._tracing = True
+        profile = cProfile.Profile()
+        before = tracemalloc.take_snapshot()
+        started = time.perf_counter()
+        profile.enable()
+        try:
+            return fn(*args)
+        finally:
+            profile.disable()
+            elapsed = time.perf_counter() - started
+            after = tracemalloc.take_snapshot()
+            self._record(node, profile, elapsed, after.compare_to(before, "lineno"))
+
+    def _record(self, node: str, profile: cProfile.Profile, elapsed: float, differences: list):
+        with self._lock:
+            if self._stats is None:
+                self._stats = pstats.Stats(profile)
+            else:
+                self._stats.add(profile)
+            totals = self._nodes.setdefault(node, {"calls": 0, "wall_time": 0.0})
+            totals["calls"] += 1
+            totals["wall_time"] += elapsed
+            for difference in differences:
+                if difference.size_diff <= 0:
+                    continue
+                frame = difference.traceback[0]
+                site = self._allocations.setdefault(f"{frame.filename}:{frame.lineno}", [0, 0])
+                site[0] += difference.size_diff
+                site[1] += difference.count_diff
+
+    def report(self) -> Dict[str, Any]:
+        """Returns the per-node times, top functions and top allocation sites so far."""
+        with self._lock:
+            functions = []
+            llm_time = 0.0
+            if self._stats is not None:
+                for (filename, line, name), (_, calls, tottime, cumtime, _) in self._stats.stats.items():
+                    if name in LLM_FUNCTIONS:
+                        llm_time += cumtime
+                    functions.append({
+                        "function": f"{filename}:{line}({name})",
+                        "calls": calls,
+                        "tottime": round(tottime, 6),
+                        "cumtime": round(cumtime, 6),
+                    })
+            functions.sort(key=lambda f: f["cumtime"], reverse=True)
+            allocations = sorted(self._allocations.items(), key=lambda item: item[1][0], reverse=True)
+            wall_time = sum(totals["wall_time"] for totals in self._nodes.values())
+            return {
+                "nodes": {node: {**totals, "wall_time": round(totals["wall_time"], 6)} for node, totals in self._nodes.items()},
+                "wall_time": round(wall_time, 6),
+                "llm_time": round(llm_time, 6),
+                "python_time": round(max(0.0, wall_time - llm_time), 6),
+                "top_functions": functions[:self.top],
+                "top_allocations": [
+                    {"site": site, "size_kb": round(size / 1024, 1), "count": count}
+                    for site, (size, count) in allocations[:self.top]
+                ],
+            }
+
+    def close(self):
+        """Stops tracemalloc unless another profiler still uses it."""
+        if self._tracing:
+            self._tracing = False
+            _stop_tracing()
@@ -0,0 +1,72 @@
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# Status fields rendered as individual slots; past_actions is append-only
+FIELD_KEYS = ("current_task", "goals", "plan", "response")
+
+
+class IncrementalRenderer:
+    """
+    Turns the full status events yielded by run_paa into minimal UI updates.
+
+    For every node it remembers what has already been shown, so an update
+    carries only the fields whose value changed and the past actions that were
+    appended since the last redraw. Updates are buffered and released at most
+    max_fps times per second; flush() releases whatever is still pending.
+    """
+
+    def __init__(self, max_fps: float = 10, clock: Callable[[], float] = time.monotonic):
+        self.min_interval = 1.0 / max_fps if max_fps and max_fps > 0 else 0.0
+        self._clock = clock
+        self._last_flush: Optional[float] = None
+        self._shown: Dict[str, Dict[str, Any]] = {}
+        self._actions_shown: Dict[str, int] = {}
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._last_plan: Optional[List[str]] = None
+
+    def update(self, node: str, status: Dict[str, Any]) -> Optional[Dict[str, Dict[str, Any]]]:
+        """
+        Records a status event for a node.
+
+        Returns:
+            The pending updates keyed by node if a redraw is due, else None
+        """
+        shown = self._shown.setdefault(node, {})
+        pending = self._pending.setdefault(node, {"fields": {}, "new_actions": []})
+
+        for key in FIELD_KEYS:
+            if key in status and shown.get(key) != status[key]:
+                shown[key] = status[key]
+                pending["fields"][key] = status[key]
+
+        actions = status.get("past_actions", [])
+        already = self._actions_shown.get(node, 0)
+        if len(actions) < already:
+            # The run restarted its history; show it again from the start
+            already = 0
+        if len(actions) > already:
+            pending["new_actions"].extend(actions[already:])
+            self._actions_shown[node] = len(actions)
+
+        now = self._clock()
+        if self._last_flush is None or now - self._last_flush >= self.min_interval:
+            return self.flush()
+        return None
+
+    def flush(self) -> Dict[str, Dict[str, Any]]:
+        """Returns and clears all pending, non-empty updates."""
+        self._last_flush = self._clock()
+        updates = {
+            node: pending
+            for node, pending in self._pending.items()
+            if pending["fields"] or pending["new_actions"]
+        }
+        self._pending = {}
+        return updates
+
+    def plan_changed(self, plan: List[str]) -> bool:
+        """Returns True the first time a given plan is seen."""
+        if plan == self._last_plan:
+            return False
+        self._last_plan = list(plan)
+        return True
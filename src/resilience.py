@@ -0,0 +1,265 @@
+"""
+Timeouts, retries and circuit breaking for Ollama calls.
+
+Transient failures (connection errors, timeouts, 429 and 5xx responses) are
+retried with jittered exponential backoff. Repeated failures open a circuit
+breaker per key (the model id), after which calls fail immediately until a
+trial call succeeds, so runs don't queue up behind an Ollama that is down.
+"""
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+import httpx
+import ollama
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+# Most timed calls running at once, abandoned ones included (PAA_LLM_MAX_PENDING)
+MAX_PENDING_CALLS = int(os.environ.get("PAA_LLM_MAX_PENDING", "32"))
+_pending_calls = threading.BoundedSemaphore(MAX_PENDING_CALLS)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling Ollama while a circuit breaker is open."""
+
+
+class CallTimeoutError(TimeoutError):
+    """Raised when a call doesn't finish within its timeout."""
+
+
+def is_retryable(error: Exception) -> bool:
+    """Whether error is transient, i.e. the same call may succeed later."""
+    if isinstance(error, ollama.ResponseError):
+        return error.status_code in RETRYABLE_STATUS
+    return isinstance(error, (httpx.TransportError, ConnectionError, TimeoutError))
+
+
+class CircuitBreaker:
+    """
+    Fails fast after failure_threshold consecutive failures.
+
+    After reset_timeout seconds one trial call is let through; its outcome
+    closes the breaker again or reopens it.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and self.clock() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = OPEN
+                self.opened_at = self.clock()
+
+
+class CallMetrics:
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.backoff_seconds = 0.0
+
+
+def call_with_timeout(fn: Callable[[], Any], timeout: float) -> Any:
+    """
+    Runs fn, raising CallTimeoutError if it takes longer than timeout seconds.
+
+    fn runs on a daemon thread that is abandoned on timeout; the HTTP
+    client's own timeout eventually ends it. At most MAX_PENDING_CALLS such
+    threads exist at once; a call that can't get one within timeout fails
+    with CallTimeoutError as well, so abandoned calls can't pile up.
+    """
+    if not _pending_calls.acquire(timeout=timeout):
+        raise CallTimeoutError(f"{MAX_PENDING_CALLS} calls still running, none finished within {timeout}s")
+    outcome: Dict[str, Any] = {}
+    done = threading.Event()
+
+    def target():
+        try:
+            outcome["result"] = fn()
+        except BaseException as e:
+            outcome["error"] = e
+        finally:
+            _pending_calls.release()
+            done.set()
+
+    threading.Thread(target=target, name="paa-llm-call", daemon=True).start()
+    if not done.wait(timeout):
+        raise CallTimeoutError(f"Call did not finish within {timeout}s")
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["result"]
+
+
+class ResilientCaller:
+    """
+    Wraps calls with a timeout, retries and a circuit breaker per key.
+
+    Args:
+        timeout: Seconds allowed per attempt; unlimited if None
+        max_attempts: Attempts per call, including the first
+        base_delay: Backoff before the first retry, doubled on every retry
+        max_delay: Upper bound of a single backoff
+        failure_threshold: Consecutive failed calls that open a breaker
+        reset_timeout: Seconds an open breaker waits before a trial call
+    """
+
+    def __init__(self, timeout: Optional[float] = None, max_attempts: int = 3, base_delay: float = 0.5,
+                 max_delay: float = 8.0, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 sleep: Callable[[float], None] = time.sleep, clock: Callable[[], float] = time.monotonic):
+        self.timeout = timeout
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.sleep = sleep
+        self.clock = clock
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._metrics: Dict[str, CallMetrics] = {}
+        self._lock = threading.Lock()
+
+    def _state(self, key: str):
+        with self._lock:
+            if key not in self._breakers:
+                self._breakers[key] = CircuitBreaker(self.failure_threshold, self.reset_timeout, self.clock)
+                self._metrics[key] = CallMetrics()
+            return self._breakers[key], self._metrics[key]
+
+    def backoff(self, retry: int) -> float:
+        """Jittered delay before the given retry (1 for the first)."""
+        cap = min(self.max_delay, self.base_delay * 2 ** (retry - 1))
+        return random.uniform(cap / 2, cap)
+
+    def call(self, key: str, fn: Callable[[], Any]) -> Any:
+        """
+        Calls fn, retrying transient failures.
+
+        Raises:
+            CircuitOpenError: If the breaker for key is open
+            Exception: The last error of fn once retries are exhausted, or
+                the first non-retryable one
+        """
+        breaker, metrics = self._state(key)
+        for attempt in range(1, self.max_attempts + 1):
+            if not breaker.allow():
+                with self._lock:
+                    metrics.rejected += 1
+                raise CircuitOpenError(f"Circuit open for {key}: Ollama failed {breaker.failures} times in a row")
+            with self._lock:
+                metrics.calls += 1
+            try:
+                result = call_with_timeout(fn, self.timeout) if self.timeout else fn()
+            except Exception as e:
+                if not is_retryable(e):
+                    # The server answered, so it is not down
+                    breaker.record_success()
+                    raise
+                breaker.record_failure()
+                with self._lock:
+                    metrics.failures += 1
+                    metrics.timeouts += isinstance(e, TimeoutError)
+                if attempt == self.max_attempts:
+                    raise
+                delay = self.backoff(attempt)
+                logger.warning(f"Retrying {key} in {delay:.2f}s after attempt {attempt} failed: {str(e)}")
+                with self._lock:
+                    metrics.retries += 1
+                    metrics.backoff_seconds += delay
+                self.sleep(delay)
+                continue
+            breaker.record_success()
+            return result
+
+    def reset(self):
+        """Forgets all breakers and counters, closing every circuit."""
+        with self._lock:
+            self._breakers.clear()
+            self._metrics.clear()
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Returns per-key counters, backoff time and breaker state."""
+        with self._lock:
+            return {
+                key: {
+                    "calls": m.calls,
+                    "failures": m.failures,
+                    "retries": m.retries,
+                    "timeouts": m.timeouts,
+                    "rejected": m.rejected,
+                    "backoff_seconds": round(m.backoff_seconds, 3),
+                    "breaker": self._breakers[key].state,
+                }
+                for key, m in self._metrics.items()
+            }
+
+
+_caller: Optional[ResilientCaller] = None
+_caller_lock = threading.Lock()
+
+
+def get_resilient_caller() -> ResilientCaller:
+    """
+    Returns the process-wide caller used by create_llm.
+
+    It is configured from PAA_LLM_TIMEOUT (seconds per attempt),
+    PAA_LLM_MAX_ATTEMPTS, PAA_LLM_BREAKER_THRESHOLD and PAA_LLM_BREAKER_RESET.
+    """
+    global _caller
+    with _caller_lock:
+        if _caller is None:
+            _caller = ResilientCaller(
+                timeout=float(os.environ["PAA_LLM_TIMEOUT"]) if os.environ.get("PAA_LLM_TIMEOUT") else None,
+                max_attempts=int(os.environ.get("PAA_LLM_MAX_ATTEMPTS", "3")),
+                failure_threshold=int(os.environ.get("PAA_LLM_BREAKER_THRESHOLD", "5")),
+                reset_timeout=float(os.environ.get("PAA_LLM_BREAKER_RESET", "30")),
+            )
+        return _caller
+
+
+def reset_resilient_caller():
+    """
+    Drops the process-wide caller, so the next get_resilient_caller() builds a fresh one.
+
+    Breakers and counters otherwise carry over between runs that share the
+    process; tests reset them so one test's failures can't open a breaker
+    for the next.
+    """
+    global _caller
+    with _caller_lock:
+        if _caller is not None:
+            _caller.reset()
+        _caller = None
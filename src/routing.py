@@ -0,0 +1,152 @@
+"""
+Per-node model routing with escalation and per-route cost accounting.
+"""
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional, Tuple
+from llm import create_llm
+
+logger = logging.getLogger(__name__)
+
+PLANNER = "planner"
+TASK_EXECUTOR = "task_executor"
+REPLANNER = "replanner"
+SUMMARIZER = "summarizer"
+ROUTED_NODES = (PLANNER, TASK_EXECUTOR, REPLANNER, SUMMARIZER)
+
+# Router of the run invoking a tool, set by the task executor
+current_router: ContextVar[Optional["ModelRouter"]] = ContextVar("current_router", default=None)
+
+
+def parse_routes(spec: str) -> Dict[str, str]:
+    """
+    Parses a route specification like "replanner=llama3.2:1b,planner=llama3.1:8b".
+
+    Raises:
+        ValueError: If an entry has no '=' or names an unknown node
+    """
+    routes = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        node, sep, model = entry.partition("=")
+        node, model = node.strip(), model.strip()
+        if not sep or not model:
+            raise ValueError(f"Invalid route '{entry}', expected node=model")
+        if node not in ROUTED_NODES:
+            raise ValueError(f"Unknown node '{node}', expected one of {', '.join(ROUTED_NODES)}")
+        routes[node] = model
+    return routes
+
+
+class RouteStats:
+    """Latency and token totals of one (node, model) route."""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.escalations = 0
+        self.latency = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "escalations": self.escalations,
+            "avg_latency": round(self.latency / self.calls, 4) if self.calls else 0.0,
+            "total_latency": round(self.latency, 4),
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+        }
+
+
+class ModelRouter:
+    """
+    Maps workflow nodes to Ollama models.
+
+    Nodes without a route use the default model, i.e. the model selected for
+    the run. When a node's output cannot be parsed, complete() retries once
+    with the escalation model.
+
+    Args:
+        default_model: Model for nodes without a route
+        routes: Node name -> model id
+        escalation_model: Larger model to retry unparseable outputs with
+        llm_factory: Creates the chat callable for a model id
+    """
+
+    def __init__(self, default_model: str, routes: Optional[Dict[str, str]] = None,
+                 escalation_model: Optional[str] = None,
+                 llm_factory: Callable[[str], Callable] = create_llm):
+        self.default_model = default_model
+        self.routes = dict(routes or {})
+        self.escalation_model = escalation_model
+        self.llm_factory = llm_factory
+        self._stats: Dict[Tuple[str, str], RouteStats] = {}
+        self._lock = threading.Lock()
+
+    def model_for(self, node: str) -> str:
+        return self.routes.get(node, self.default_model)
+
+    def _route_stats(self, node: str, model_id: str) -> RouteStats:
+        with self._lock:
+            return self._stats.setdefault((node, model_id), RouteStats())
+
+    def llm(self, node: str, model_id: Optional[str] = None) -> Callable[..., Dict[str, Any]]:
+        """Returns a chat callable for node that records the route's latency and tokens."""
+        model_id = model_id or self.model_for(node)
+        chat = self.llm_factory(model_id)
+        stats = self._route_stats(node, model_id)
+
+        def routed_chat(messages, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = chat(messages, **kwargs)
+            except Exception:
+                with self._lock:
+                    stats.calls += 1
+                    stats.errors += 1
+                    stats.latency += time.perf_counter() - started
+                raise
+            with self._lock:
+                stats.calls += 1
+                stats.latency += time.perf_counter() - started
+                stats.prompt_tokens += int(result.get("prompt_eval_count") or 0)
+                stats.completion_tokens += int(result.get("eval_count") or 0)
+            return result
+
+        return routed_chat
+
+    def complete(self, node: str, messages: list, parse: Callable[[Dict[str, Any]], Any],
+                 accept: Callable[[Any], bool] = lambda parsed: True) -> Tuple[Dict[str, Any], Any]:
+        """
+        Calls the node's model and parses the result, escalating unusable output.
+
+        Args:
+            node: Workflow node name
+            messages: Chat messages
+            parse: Parses the raw result
+            accept: Whether a parsed result is usable; if not, the call is
+                repeated once with the escalation model
+
+        Returns:
+            (raw result, parsed result) of the last call made
+        """
+        model_id = self.model_for(node)
+        result = self.llm(node, model_id)(messages)
+        parsed = parse(result)
+        if accept(parsed) or not self.escalation_model or self.escalation_model == model_id:
+            return result, parsed
+        logger.warning(f"Unusable {node} output from {model_id}, escalating to {self.escalation_model}")
+        stats = self._route_stats(node, model_id)
+        with self._lock:
+            stats.escalations += 1
+        result = self.llm(node, self.escalation_model)(messages)
+        return result, parse(result)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Returns statistics per route, keyed "node:model"."""
+        with self._lock:
+            return {f"{node}:{model}": stats.as_dict() for (node, model), stats in self._stats.items()}
@@ -0,0 +1,236 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
+from cancellation import CANCELLED, CancellationToken
+from task_manager import run_paa
+
+logger = logging.getLogger(__name__)
+
+RUNNING = "running"
+FINISHED = "finished"
+FAILED = "failed"
+
+
+def normalize_question(question: str) -> str:
+    """Collapses whitespace and case, so trivially different prompts coalesce."""
+    return re.sub(r"\s+", " ", question).strip().casefold()
+
+
+def coalesce_key(question: str, model_id: str, run_options: Dict[str, Any]) -> Tuple[str, str, str]:
+    """Identifies runs whose events are interchangeable."""
+    # Option objects (e.g. a DecisionPolicy) compare by type
+    options = json.dumps(run_options, sort_keys=True, default=lambda value: type(value).__name__)
+    return model_id, normalize_question(question), options
+
+
+class RunRecord:
+    """Progress of one run_paa execution, shared between the worker and readers."""
+
+    def __init__(self, run_id: str, question: str, model_id: str):
+        self.run_id = run_id
+        self.question = question
+        self.model_id = model_id
+        self.status = RUNNING
+        self.events: List[Dict[str, Any]] = []
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        # Submissions beyond the first that were attached to this run
+        self.coalesced = 0
+        # Submissions still attached; cancelling only stops the run once none are left
+        self.submitters = 1
+        self.cancel_token = CancellationToken()
+        # Reason the run ended early, from its final event
+        self.stopped: Optional[str] = None
+        # Message of the error event the run reported, if any
+        self.error: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def append(self, event: Dict[str, Any]):
+        with self._lock:
+            self.events.append(event)
+            if event.get("stopped"):
+                self.stopped = event["stopped"]
+            if "error" in event:
+                self.error = event["error"]
+
+    def finish(self, status: str):
+        with self._lock:
+            self.status = status
+            self.finished_at = time.time()
+
+    def events_since(self, cursor: int) -> Tuple[List[Dict[str, Any]], bool]:
+        """Returns the events after cursor and whether the run has ended."""
+        with self._lock:
+            return self.events[cursor:], self.status != RUNNING
+
+
+class RunManager:
+    """
+    Owns run_paa executions on a background thread with its own event loop.
+
+    Runs are identified by run id and keep going independently of the
+    Streamlit script that submitted them, so a rerun can reattach to a run
+    and several runs can be in flight at once. Finished runs are kept for
+    retention seconds so late readers can still replay them.
+
+    With coalescing on, submitting the same question with the same model and
+    options as a run that is in flight, or that finished less than
+    coalesce_window seconds ago, returns that run's id instead of starting a
+    new one; following it replays the events emitted so far. Failed and
+    stopped runs are never reused. Cancelling a shared run detaches one
+    submission; the run only stops when the last one cancels.
+    """
+
+    def __init__(self, retention: float = 3600.0, coalesce: bool = False, coalesce_window: float = 30.0):
+        self.retention = retention
+        self.coalesce = coalesce
+        self.coalesce_window = coalesce_window
+        self.coalesced = 0
+        self._runs: Dict[str, RunRecord] = {}
+        self._by_key: Dict[Tuple[str, str, str], RunRecord] = {}
+        self._lock = threading.Lock()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="paa-run-worker", daemon=True)
+        self._thread.start()
+
+    def submit(self, question: str, model_id: str, **run_options: Any) -> str:
+        """
+        Starts a run in the background.
+
+        Args:
+            question: The user request
+            model_id: The Ollama model to use
+            run_options: Extra keyword arguments forwarded to run_paa
+
+        Returns:
+            The id of the new run, or of the identical run it was attached to
+        """
+        self._prune()
+        key = coalesce_key(question, model_id, run_options) if self.coalesce else None
+        with self._lock:
+            existing = self._by_key.get(key) if key else None
+            if existing is not None and self._reusable(existing):
+                existing.coalesced += 1
+                existing.submitters += 1
+                self.coalesced += 1
+                logger.info(f"Attached submission to identical run {existing.run_id}")
+                return existing.run_id
+            record = RunRecord(uuid.uuid4().hex, question, model_id)
+            self._runs[record.run_id] = record
+            if key:
+                self._by_key[key] = record
+        asyncio.run_coroutine_threadsafe(self._drive(record, run_options), self._loop)
+        logger.info(f"Submitted run {record.run_id} with model {model_id}")
+        return record.run_id
+
+    async def _drive(self, record: RunRecord, run_options: Dict[str, Any]):
+        try:
+            options = {**run_options, "cancel_token": record.cancel_token}
+            async for status in run_paa(record.question, record.model_id, **options):
+                record.append(status)
+            # run_paa reports most failures as an error event rather than raising
+            record.finish(FAILED if record.error is not None else FINISHED)
+        except Exception as e:
+            logger.error(f"Run {record.run_id} failed: {str(e)}", exc_info=True)
+            record.append({"error": str(e)})
+            record.finish(FAILED)
+
+    def cancel(self, run_id: str) -> bool:
+        """
+        Stops a run, abandoning its in-flight calls; it ends with a partial final event.
+
+        If other submissions were coalesced into the run, only the cancelling
+        one is detached and the run keeps going for the rest.
+
+        Returns:
+            False if the run is unknown or has already ended
+        """
+        record = self.get(run_id)
+        if record is None or record.status != RUNNING:
+            return False
+        with self._lock:
+            record.submitters -= 1
+            remaining = record.submitters
+        if remaining > 0:
+            logger.info(f"Detached a submission from run {run_id}; {remaining} still attached")
+            return True
+        record.cancel_token.cancel()
+        logger.info(f"Cancelling run {run_id}")
+        return True
+
+    def _reusable(self, record: RunRecord) -> bool:
+        if record.stopped or record.cancel_token.reason == CANCELLED:
+            return False
+        if record.status == RUNNING:
+            return True
+        finished_at = record.finished_at
+        return record.status == FINISHED and finished_at is not None and time.time() - finished_at < self.coalesce_window
+
+    def get(self, run_id: str) -> Optional[RunRecord]:
+        with self._lock:
+            return self._runs.get(run_id)
+
+    def active_runs(self) -> List[RunRecord]:
+        with self._lock:
+            return [record for record in self._runs.values() if record.status == RUNNING]
+
+    async def follow(self, run_id: str, poll_interval: float = 0.1) -> AsyncGenerator[Dict[str, Any], None]:
+        """Yields every event of a run, replaying past ones first, until it ends."""
+        record = self.get(run_id)
+        if record is None:
+            raise KeyError(f"Unknown run id: {run_id}")
+        cursor = 0
+        while True:
+            events, done = record.events_since(cursor)
+            for event in events:
+                yield event
+            cursor += len(events)
+            if done and not events:
+                break
+            if not events:
+                await asyncio.sleep(poll_interval)
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        with self._lock:
+            expired = [
+                run_id for run_id, record in self._runs.items()
+                if record.finished_at is not None and record.finished_at < cutoff
+            ]
+            for run_id in expired:
+                del self._runs[run_id]
+            self._by_key = {
+                key: record for key, record in self._by_key.items()
+                if record.run_id in self._runs and self._reusable(record)
+            }
+
+    def shutdown(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+
+_manager: Optional[RunManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_run_manager() -> RunManager:
+    """
+    Returns the process-wide RunManager, creating it on first use.
+
+    PAA_COALESCE_RUNS=1 turns on coalescing of identical submissions, and
+    PAA_COALESCE_WINDOW sets how many seconds a finished run stays reusable.
+    """
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = RunManager(
+                coalesce=os.environ.get("PAA_COALESCE_RUNS", "").lower() in ("1", "true", "yes"),
+                coalesce_window=float(os.environ.get("PAA_COALESCE_WINDOW", "30")),
+            )
+        return _manager
@@ -0,0 +1,362 @@
+"""
+On-disk BM25 inverted index for searching a local document corpus.
+
+The index is a directory of immutable segments plus a manifest. Each call to
+add_documents writes a new segment, so indexing is incremental and never
+rewrites existing data. Once there are more than max_segments segments they
+are merged into one, so query cost doesn't keep growing with every add. A
+segment holds:
+
+    lexicon.json  term -> [offset, document frequency] into the postings
+    postings.bin  uint32 (document, term frequency) pairs, grouped by term
+    doclens.bin   uint32 length of every document in the segment
+    docs.json     [doc id, title, snippet] of every document in the segment
+
+Postings and lengths are memory-mapped, so queries only touch the pages of
+the terms they look up. Several processes can share an index: segment names
+are unique, manifest updates happen under a file lock, and a SearchIndex
+picks up segments written by others when the manifest changes.
+"""
+import argparse
+import json
+import logging
+import mmap
+import os
+import re
+import shutil
+import threading
+import uuid
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    # No inter-process locking without fcntl; segment names are still unique
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"\w+")
+MANIFEST = "manifest.json"
+LOCK_FILE = "index.lock"
+EMPTY_MANIFEST = {"segments": [], "num_docs": 0, "total_length": 0, "retired": []}
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def _write_json(path: str, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _map_array(path: str) -> np.ndarray:
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=np.uint32)
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return np.frombuffer(mapped, dtype=np.uint32)
+
+
+class Segment:
+    """A read-only, memory-mapped index segment."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "lexicon.json"), "r", encoding="utf-8") as f:
+            self.lexicon: Dict[str, List[int]] = json.load(f)
+        self.postings = _map_array(os.path.join(path, "postings.bin"))
+        self.doclens = _map_array(os.path.join(path, "doclens.bin"))
+        self._docs: Optional[List[List[str]]] = None
+
+    @property
+    def docs(self) -> List[List[str]]:
+        # Metadata is only needed to present results, so load it lazily
+        if self._docs is None:
+            with open(os.path.join(self.path, "docs.json"), "r", encoding="utf-8") as f:
+                self._docs = json.load(f)
+        return self._docs
+
+    def postings_for(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        entry = self.lexicon.get(term)
+        if entry is None:
+            return None
+        offset, df = entry
+        pairs = self.postings[offset:offset + 2 * df]
+        return pairs[0::2], pairs[1::2]
+
+    @staticmethod
+    def write(path: str, documents: List[Tuple[str, str, str]], token_lists: List[List[str]]):
+        term_postings: Dict[str, List[int]] = defaultdict(list)
+        for doc_index, tokens in enumerate(token_lists):
+            for term, tf in Counter(tokens).items():
+                term_postings[term].extend((doc_index, tf))
+        Segment.write_postings(path, [list(d) for d in documents], [len(t) for t in token_lists], term_postings)
+
+    @staticmethod
+    def write_postings(path: str, docs: List[List[str]], doclens: Iterable[int],
+                       term_postings: Dict[str, List[int]]):
+        """Writes a segment from flat (document, term frequency) postings per term."""
+        os.makedirs(path)
+        lexicon = {}
+        offset = 0
+        with open(os.path.join(path, "postings.bin"), "wb") as f:
+            for term in sorted(term_postings):
+                pairs = np.asarray(term_postings[term], dtype=np.uint32)
+                f.write(pairs.tobytes())
+                lexicon[term] = [offset, len(pairs) // 2]
+                offset += len(pairs)
+        with open(os.path.join(path, "doclens.bin"), "wb") as f:
+            f.write(np.asarray(list(doclens), dtype=np.uint32).tobytes())
+        _write_json(os.path.join(path, "docs.json"), docs)
+        _write_json(os.path.join(path, "lexicon.json"), lexicon)
+
+
+def merge_segments(path: str, segments: List[Segment]):
+    """Writes the documents of segments, in order, as one new segment at path."""
+    term_postings: Dict[str, List[np.ndarray]] = defaultdict(list)
+    docs: List[List[str]] = []
+    doclens: List[np.ndarray] = []
+    base = 0
+    for segment in segments:
+        for term in segment.lexicon:
+            doc_ids, tfs = segment.postings_for(term)
+            term_postings[term].append(np.column_stack((doc_ids + base, tfs)).ravel())
+        docs.extend(segment.docs)
+        doclens.append(segment.doclens)
+        base += len(segment.doclens)
+    Segment.write_postings(
+        path,
+        docs,
+        np.concatenate(doclens) if doclens else [],
+        {term: np.concatenate(parts) for term, parts in term_postings.items()},
+    )
+
+
+class SearchIndex:
+    """
+    BM25 search over an on-disk, segmented inverted index.
+
+    Args:
+        path: Index directory; created if missing
+        k1: BM25 term frequency saturation
+        b: BM25 length normalization
+        max_segments: Segments allowed before add_documents merges them into one
+    """
+
+    def __init__(self, path: str, k1: float = 1.5, b: float = 0.75, max_segments: int = 8):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.max_segments = max_segments
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        # Manifest and segments are swapped together so readers see a consistent view
+        self._view = (dict(EMPTY_MANIFEST), [])
+        self._stamp: Optional[Tuple[int, int]] = None
+        self._refresh()
+
+    def _manifest_stamp(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(os.path.join(self.path, MANIFEST))
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _read_manifest(self) -> Dict:
+        manifest_path = os.path.join(self.path, MANIFEST)
+        if not os.path.exists(manifest_path):
+            return dict(EMPTY_MANIFEST)
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return {**EMPTY_MANIFEST, **json.load(f)}
+
+    def _refresh(self):
+        """Reloads the manifest if another SearchIndex or process changed it."""
+        stamp = self._manifest_stamp()
+        if stamp == self._stamp:
+            return
+        with self._lock:
+            if stamp == self._stamp:
+                return
+            self._load(self._read_manifest(), stamp)
+
+    def _load(self, manifest: Dict, stamp: Optional[Tuple[int, int]]):
+        # Segments are immutable, so the ones already open are reused
+        opened = {os.path.basename(segment.path): segment for segment in self._view[1]}
+        segments = [opened.get(name) or Segment(os.path.join(self.path, name)) for name in manifest["segments"]]
+        self._view = (manifest, segments)
+        self._stamp = stamp
+
+    @contextmanager
+    def _manifest_lock(self) -> Iterator[Dict]:
+        """Holds the thread and file locks and yields the latest manifest for updating."""
+        with self._lock:
+            with open(os.path.join(self.path, LOCK_FILE), "a") as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield self._read_manifest()
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _commit(self, manifest: Dict):
+        # The manifest is replaced atomically, so readers see whole segments only
+        _write_json(os.path.join(self.path, MANIFEST), manifest)
+        self._load(manifest, self._manifest_stamp())
+
+    @property
+    def num_docs(self) -> int:
+        self._refresh()
+        return self._view[0]["num_docs"]
+
+    @property
+    def num_segments(self) -> int:
+        self._refresh()
+        return len(self._view[1])
+
+    def add_documents(self, documents: Iterable[Tuple[str, str, str]]) -> int:
+        """
+        Indexes documents as a new segment.
+
+        Args:
+            documents: (doc id, title, text) tuples
+
+        Returns:
+            Number of documents added
+        """
+        metadata, token_lists = [], []
+        for doc_id, title, text in documents:
+            metadata.append((doc_id, title, " ".join(text.split())[:200]))
+            token_lists.append(tokenize(f"{title} {text}"))
+        if not metadata:
+            return 0
+
+        # Unique names, so concurrent writers never write into the same segment
+        name = f"seg_{uuid.uuid4().hex}"
+        Segment.write(os.path.join(self.path, name), metadata, token_lists)
+        with self._manifest_lock() as current:
+            self._commit({
+                **current,
+                "segments": current["segments"] + [name],
+                "num_docs": current["num_docs"] + len(metadata),
+                "total_length": current["total_length"] + sum(len(t) for t in token_lists),
+            })
+        logger.info(f"Indexed {len(metadata)} documents into segment {name}")
+        if len(self._view[1]) > self.max_segments:
+            self.compact()
+        return len(metadata)
+
+    def compact(self) -> bool:
+        """
+        Merges all segments into one.
+
+        The replaced segments are deleted by the next compaction, so readers
+        still holding the previous manifest can finish with them.
+
+        Returns:
+            False if there was nothing to merge
+        """
+        self._refresh()
+        manifest, segments = self._view
+        if len(segments) < 2:
+            return False
+        name = f"seg_{uuid.uuid4().hex}"
+        merge_segments(os.path.join(self.path, name), segments)
+        merged = set(manifest["segments"])
+        with self._manifest_lock() as current:
+            for retired in current["retired"]:
+                shutil.rmtree(os.path.join(self.path, retired), ignore_errors=True)
+            # Segments added while merging stay as they are
+            added = [segment for segment in current["segments"] if segment not in merged]
+            self._commit({
+                **current,
+                "segments": [name] + added,
+                "retired": [segment for segment in current["segments"] if segment in merged],
+            })
+        logger.info(f"Merged {len(segments)} segments into {name}")
+        return True
+
+    def search(self, query: str, k: int = 5) -> List[Dict[str, object]]:
+        """Returns the top k documents for query, best first."""
+        self._refresh()
+        manifest, segments = self._view
+        num_docs = manifest["num_docs"]
+        terms = set(tokenize(query))
+        if not terms or not num_docs:
+            return []
+        avg_length = manifest["total_length"] / num_docs
+
+        per_segment = [{t: seg.postings_for(t) for t in terms} for seg in segments]
+        df = Counter()
+        for postings in per_segment:
+            for term, entry in postings.items():
+                if entry is not None:
+                    df[term] += len(entry[0])
+
+        candidates = []
+        for seg, postings in zip(segments, per_segment):
+            scores = np.zeros(len(seg.doclens), dtype=np.float32)
+            for term, entry in postings.items():
+                if entry is None:
+                    continue
+                doc_ids, tfs = entry
+                idf = np.log(1 + (num_docs - df[term] + 0.5) / (df[term] + 0.5))
+                tf = tfs.astype(np.float32)
+                norm = self.k1 * (1 - self.b + self.b * seg.doclens[doc_ids] / avg_length)
+                # Each document appears once per term, so fancy-index += is safe
+                scores[doc_ids] += idf * tf * (self.k1 + 1) / (tf + norm)
+            hits = np.flatnonzero(scores)
+            if len(hits) > k:
+                hits = hits[np.argpartition(scores[hits], -k)[-k:]]
+            candidates.extend((float(scores[i]), seg, int(i)) for i in hits)
+
+        candidates.sort(key=lambda c: c[0], reverse=True)
+        results = []
+        for score, seg, doc_index in candidates[:k]:
+            doc_id, title, snippet = seg.docs[doc_index]
+            results.append({"id": doc_id, "title": title, "snippet": snippet, "score": round(score, 4)})
+        return results
+
+
+_indexes: Dict[str, SearchIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_search_index(path: str) -> SearchIndex:
+    """Returns a shared SearchIndex for path, opening it on first use."""
+    with _indexes_lock:
+        if path not in _indexes:
+            _indexes[path] = SearchIndex(path)
+        return _indexes[path]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Add text files to a local search index.")
+    parser.add_argument("index", help="Index directory")
+    parser.add_argument("files", nargs="*", help="Text files to index; the file name is used as title")
+    parser.add_argument("--compact", action="store_true", help="Merge all segments into one afterwards")
+    args = parser.parse_args()
+    index = SearchIndex(args.index)
+
+    def read_documents():
+        for file_path in args.files:
+            with open(file_path, "r", encoding="utf-8", errors="replace") as f:
+                yield os.path.abspath(file_path), os.path.basename(file_path), f.read()
+
+    if args.files:
+        added = index.add_documents(read_documents())
+        print(f"Indexed {added} documents into {args.index}")
+    if args.compact:
+        index.compact()
+        print(f"{args.index} has {index.num_segments} segment(s) and {index.num_docs} documents")
+
+
+if __name__ == "__main__":
+    main()
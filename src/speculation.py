@@ -0,0 +1,103 @@
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _tokens(result: Any) -> int:
+    if not isinstance(result, dict):
+        return 0
+    return int(result.get("prompt_eval_count") or 0) + int(result.get("eval_count") or 0)
+
+
+class SpeculativePrefetcher:
+    """
+    Issues LLM completions for upcoming plan steps ahead of time.
+
+    The task executor prompt for a step only depends on the step and the
+    goals, so it can be sent while the previous step's tools are still running.
+    Prefetched completions are keyed by (model, task, goals); any that the run
+    never consumes, e.g. because the replanner changed the plan, are counted
+    as wasted together with the tokens they cost.
+    """
+
+    def __init__(self, max_workers: int = 1):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="paa-prefetch")
+        self._pending: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.prefetched = 0
+        self.hits = 0
+        self.wasted = 0
+        self.wasted_tokens = 0
+
+    def prefetch(self, key: Hashable, call: Callable[[], Dict[str, Any]]):
+        """Starts call in the background unless key is already in flight."""
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending[key] = self._pool.submit(call)
+            self.prefetched += 1
+        logger.debug(f"Prefetching completion for {key}")
+
+    def take(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        """
+        Returns the prefetched completion for key, waiting for it if needed.
+
+        Returns None on a miss or if the prefetched call failed, in which case
+        the caller should issue the completion itself.
+        """
+        with self._lock:
+            future = self._pending.pop(key, None)
+        if future is None:
+            return None
+        try:
+            result = future.result()
+        except Exception as e:
+            logger.warning(f"Prefetched completion failed, falling back: {str(e)}")
+            return None
+        with self._lock:
+            self.hits += 1
+        return result
+
+    def discard_except(self, keep: Iterable[Hashable]):
+        """Drops prefetched completions whose key is not in keep."""
+        keep = set(keep)
+        with self._lock:
+            stale = [key for key in self._pending if key not in keep]
+            futures = [self._pending.pop(key) for key in stale]
+        for future in futures:
+            self._count_waste(future)
+
+    def _count_waste(self, future: Future):
+        with self._lock:
+            self.wasted += 1
+        if not future.cancel():
+            future.add_done_callback(self._add_wasted_tokens)
+
+    def _add_wasted_tokens(self, future: Future):
+        if future.exception() is None:
+            with self._lock:
+                self.wasted_tokens += _tokens(future.result())
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns prefetch counters.
+
+        wasted_tokens is best-effort: discarded calls still in flight add
+        their tokens only once they finish.
+        """
+        with self._lock:
+            return {
+                "prefetched": self.prefetched,
+                "hits": self.hits,
+                "wasted": self.wasted,
+                "hit_rate": self.hits / self.prefetched if self.prefetched else 0.0,
+                "wasted_tokens": self.wasted_tokens,
+            }
+
+    def close(self, wait: bool = True):
+        """Discards everything still pending, optionally waiting for in-flight calls."""
+        self.discard_except(())
+        self._pool.shutdown(wait=wait)
@@ -1,4 +1,4 @@
-from typing import Annotated, TypedDict, List, Tuple, Dict
+from typing import Annotated, TypedDict, List, Tuple, Dict, Optional
 from langchain_core.messages import BaseMessage
 import operator
 
@@ -12,3 +12,4 @@ class State(TypedDict):
     response: str
     context: Annotated[Dict[str, str], "Additional context information"]
     current_node: str
+    next_task: Optional[str]
@@ -0,0 +1,146 @@
+"""
+Map-reduce summarization of documents too large for a single prompt.
+"""
+import asyncio
+import logging
+import os
+import tempfile
+from typing import Callable, Dict, Iterator, List, Optional
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from llm import create_llm
+
+logger = logging.getLogger(__name__)
+
+MAP_PROMPT = "Summarize the key points of the following part of a document in a few sentences.\n\n{text}"
+REDUCE_PROMPT = "Combine the following partial summaries of one document into a single concise summary of its key points.\n\n{text}"
+
+
+def upload_dir() -> str:
+    """
+    Returns the directory attached documents are saved in, creating it if needed.
+
+    PAA_UPLOAD_DIR overrides the default paa_uploads folder in the temp directory.
+    """
+    path = os.path.realpath(os.environ.get("PAA_UPLOAD_DIR") or os.path.join(tempfile.gettempdir(), "paa_uploads"))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def resolve_upload(path: str) -> Optional[str]:
+    """Returns the real path of an attached document, or None if path points outside the upload directory."""
+    root = upload_dir()
+    real = os.path.realpath(path)
+    return real if os.path.commonpath([real, root]) == root and real != root else None
+
+
+def iter_chunks(path: str, chunk_size: int = 4000, chunk_overlap: int = 200, read_size: int = 65536) -> Iterator[str]:
+    """
+    Streams a text file as bounded chunks.
+
+    The file is read read_size characters at a time; the last chunk of every
+    block is carried over into the next one so chunks are not cut at block
+    boundaries. At most about chunk_size + read_size characters are held.
+    """
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    carry = ""
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        while True:
+            block = f.read(read_size)
+            if not block:
+                break
+            chunks = splitter.split_text(carry + block)
+            yield from chunks[:-1]
+            carry = chunks[-1] if chunks else ""
+    if carry.strip():
+        yield from splitter.split_text(carry)
+
+
+class MapReduceSummarizer:
+    """
+    Summarizes chunks concurrently and reduces the summaries hierarchically.
+
+    Chunk summaries are collected in groups of fan_in; every full group is
+    reduced into one summary of the level above, like carrying digits in a
+    counter. Only a group of chunks and fan_in summaries per level are ever
+    held, so memory stays flat as the document grows.
+    """
+
+    def __init__(self, model_id: str, max_concurrency: int = 4, fan_in: int = 8,
+                 llm: Optional[Callable[[List[Dict[str, str]]], Dict[str, str]]] = None):
+        if fan_in < 2:
+            raise ValueError("fan_in must be at least 2")
+        self.llm = llm or create_llm(model_id)
+        self.max_concurrency = max_concurrency
+        self.fan_in = fan_in
+        self.llm_calls = 0
+
+    async def _complete(self, semaphore: asyncio.Semaphore, template: str, text: str) -> str:
+        async with semaphore:
+            self.llm_calls += 1
+            result = await asyncio.to_thread(self.llm, [{"role": "user", "content": template.format(text=text)}])
+            return result.get("content", "").strip()
+
+    async def _reduce(self, semaphore: asyncio.Semaphore, summaries: List[str]) -> str:
+        if len(summaries) == 1:
+            return summaries[0]
+        return await self._complete(semaphore, REDUCE_PROMPT, "\n\n".join(summaries))
+
+    async def _push(self, semaphore: asyncio.Semaphore, levels: List[List[str]], summary: str, level: int = 0):
+        while True:
+            if level == len(levels):
+                levels.append([])
+            levels[level].append(summary)
+            if len(levels[level]) < self.fan_in:
+                return
+            summary = await self._reduce(semaphore, levels[level])
+            levels[level] = []
+            level += 1
+
+    async def summarize_chunks(self, chunks: Iterator[str]) -> str:
+        """Summarizes an iterable of chunks into a single summary."""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        levels: List[List[str]] = []
+        group: List[str] = []
+
+        async def flush_group():
+            summaries = await asyncio.gather(*(self._complete(semaphore, MAP_PROMPT, c) for c in group))
+            group.clear()
+            for summary in summaries:
+                await self._push(semaphore, levels, summary)
+
+        for chunk in chunks:
+            group.append(chunk)
+            if len(group) == self.fan_in:
+                await flush_group()
+        if group:
+            await flush_group()
+
+        # Collapse the partially filled levels from the bottom up
+        carry: Optional[str] = None
+        for pending in levels:
+            summaries = pending + ([carry] if carry is not None else [])
+            if summaries:
+                carry = await self._reduce(semaphore, summaries)
+        return carry or ""
+
+
+async def summarize_document(path: str, model_id: str, max_concurrency: int = 4, fan_in: int = 8,
+                             chunk_size: int = 4000, llm: Optional[Callable] = None) -> str:
+    """
+    Summarizes a text file with bounded memory.
+
+    Args:
+        path: Path of the UTF-8 text file
+        model_id: The Ollama model to summarize with
+        max_concurrency: Maximum number of concurrent Ollama calls
+        fan_in: Number of summaries combined by each reduce call
+        chunk_size: Maximum chunk size in characters
+        llm: Chat callable to use instead of a new one for model_id
+
+    Returns:
+        The summary of the whole document
+    """
+    summarizer = MapReduceSummarizer(model_id, max_concurrency=max_concurrency, fan_in=fan_in, llm=llm)
+    summary = await summarizer.summarize_chunks(iter_chunks(path, chunk_size=chunk_size))
+    logger.info(f"Summarized {path} with {summarizer.llm_calls} LLM calls")
+    return summary
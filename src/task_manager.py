@@ -1,3 +1,5 @@
+import asyncio
+import contextlib
 import logging
 import json
 import re
@@ -7,9 +9,18 @@ from langchain_core.prompts import ChatPromptTemplate
 from langchain.schema import AgentAction, AgentFinish
 from langchain.pydantic_v1 import BaseModel, Field
 from enum import Enum
-from llm import create_llm
-from tools import TOOLS
+from llm import PromptSession, create_llm
+from executor import offload
+from speculation import SpeculativePrefetcher
+from plan_cache import get_plan_cache
+from profiling import RunProfiler
+from batching import StepBatcher
+from cancellation import MAX_HOPS, CancellationToken, CancelledRunError, check_cancelled, current_cancel_token
+from decision import COMPLETE, DecisionPolicy
+from routing import PLANNER, REPLANNER, TASK_EXECUTOR, ModelRouter, current_router
+from tools import TOOLS, current_model_id
 from state import State
+from transcripts import get_transcript_store, resolve_actions, resolve_text
 
 logger = logging.getLogger(__name__)
 
@@ -41,6 +52,8 @@ def get_last_human_message(messages: List[BaseMessage]) -> Optional[HumanMessage
             return message
     return None
 
+UNPARSED_GOALS = "Could not parse goals"
+
 def parse_llm_result(result):
     """Parses the result from the LLM."""
     if isinstance(result, dict) and "content" in result:
@@ -58,10 +71,56 @@ def parse_llm_result(result):
 
     # If no valid JSON found, return a structured dict with raw content
     return {
-        "goals": "Could not parse goals",
+        "goals": UNPARSED_GOALS,
         "plan": content.split("\n"),  # Split content into lines as a fallback plan
     }
 
+def extract_tool_calls(response: str) -> List[tuple]:
+    """Extracts (tool name, raw JSON arguments) pairs from an LLM response."""
+    tool_pattern = r"Tool: (\w+)\nArgs: (.+)"
+    return [(match.group(1), match.group(2)) for match in re.finditer(tool_pattern, response)]
+
+def build_update_summary(last_action: tuple, plan: List[str]) -> str:
+    """Builds the project update text with a checklist of the plan."""
+    checklist_summary = "\n".join([f"- {task}" for task in plan])
+    return f"Completed task: {last_action[0]}. Action taken: {last_action[1]}\n\nChecklist:\n{checklist_summary}"
+
+def _content_size(result) -> int:
+    return len(result.get("content", "")) if isinstance(result, dict) else 0
+
+def get_router(state: State) -> ModelRouter:
+    """Returns the run's model router, or one sending every node to the run's model."""
+    router = state["context"].get("router")
+    if router is None:
+        router = ModelRouter(state["context"]["model_id"], llm_factory=create_llm)
+    return router
+
+def run_node(node: str, fn, state: State):
+    """
+    Runs a node function, under the run's profiler if it has one.
+
+    The run's cancellation token is made current for the node, so the Ollama
+    and tool calls it makes are abandoned when the run is stopped.
+
+    Raises:
+        CancelledRunError: If the run is stopped before or during the node
+    """
+    context = state.get("context", {})
+    token = context.get("cancel_token")
+    if token is not None:
+        token.check()
+    reset = current_cancel_token.set(token)
+    try:
+        profiler = context.get("profiler")
+        return profiler.call(node, fn, state) if profiler else fn(state)
+    finally:
+        current_cancel_token.reset(reset)
+
+def record_action(state: State, task: str, result: str) -> tuple:
+    """Returns a past_actions entry, keeping the result in the run's transcript store if it has one."""
+    store = state.get("context", {}).get("transcripts")
+    return (task, store.put(result) if store is not None else result)
+
 def create_new_state(state: State, **kwargs) -> State:
     """Creates a new state with updated values."""
     new_state = state.copy()
@@ -71,12 +130,33 @@ def create_new_state(state: State, **kwargs) -> State:
 def planner(state: State) -> State:
     """Planner function to generate a step-by-step plan."""
     logger.info("Executing Planner")
-    llm = create_llm(state["context"]["model_id"])
+    router = get_router(state)
+    model_id = router.model_for(PLANNER)
 
     last_human_message = get_last_human_message(state["messages"])
     if not last_human_message:
         raise ValueError("No human message found in the conversation history")
 
+    plan_cache = get_plan_cache()
+    request_embedding = None
+    if plan_cache is not None:
+        try:
+            request_embedding = plan_cache.embed_query(last_human_message.content)
+            cached = plan_cache.lookup(request_embedding, model_id)
+        except Exception as e:
+            logger.warning(f"Plan cache unavailable: {str(e)}")
+            cached = None
+        if cached:
+            logger.info(f"Reusing cached plan of a similar request (similarity {cached['similarity']:.3f})")
+            return create_new_state(
+                state,
+                plan=cached["plan"],
+                goals=cached["goals"],
+                current_task=cached["plan"][0] if cached["plan"] else "",
+                response="",
+                current_node="planner",
+            )
+
     prompt = ChatPromptTemplate.from_messages(
         [
             SystemMessage(content="You are a planning expert. Create a concise step-by-step minimum required plan with no more than 10 steps."),
@@ -101,10 +181,18 @@ def planner(state: State) -> State:
     )
 
     try:
-        result = llm(prompt.format_messages())
+        result, parsed_result = router.complete(
+            PLANNER,
+            prompt.format_messages(),
+            lambda r: offload(parse_llm_result, r, size_hint=_content_size(r)),
+            accept=lambda parsed: parsed.get("goals") != UNPARSED_GOALS,
+        )
         logger.debug(f"Raw LLM output: {result}")
-        parsed_result = parse_llm_result(result)
         core_tasks = parsed_result["plan"]
+        # A fallback plan from unparseable output would be served to every similar request
+        if request_embedding is not None and parsed_result["goals"] != UNPARSED_GOALS:
+            plan_cache.insert(request_embedding, last_human_message.content, model_id,
+                              parsed_result["goals"], core_tasks)
 
         return create_new_state(
             state,
@@ -118,6 +206,83 @@ def planner(state: State) -> State:
         logger.error(f"Error in planner: {str(e)}", exc_info=True)
         raise
 
+TOOL_INSTRUCTIONS = (
+    "Available tools:\n"
+    + "\n".join(f"- {t.name}({', '.join(t.args)}): {t.description}" for t in TOOLS)
+    + "\nTo use a tool, reply with a line 'Tool: <name>' followed by a line 'Args: <JSON object of arguments>'."
+)
+
+EXECUTOR_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        ("system", "You are a helpful AI assistant. Use the available tools to complete tasks.\n\n" + TOOL_INSTRUCTIONS.replace("{", "{{").replace("}", "}}")),
+        # The goal is the same for every step of a run, so it goes before the task
+        ("human", "Goal: {goal}\nTask: {task}\n\nPlease complete this task using the available tools if necessary.")
+    ]
+)
+
+def build_executor_messages(task: str, goals: str) -> List[BaseMessage]:
+    """Builds the task executor prompt for one plan step."""
+    return EXECUTOR_PROMPT.format_messages(task=task, goal=goals)
+
+def prefetch_key(state: State, task: str) -> tuple:
+    """Identifies a task executor completion for speculative prefetching."""
+    return (get_router(state).model_for(TASK_EXECUTOR), task, state.get("goals", "unknown"))
+
+def run_tool_calls(tool_calls: List[tuple]) -> List[str]:
+    """Invokes (tool name, raw JSON arguments) pairs and returns their outputs."""
+    tools_by_name = {tool.name: tool for tool in TOOLS}
+    tool_outputs = []
+    for tool_name, raw_args in tool_calls:
+        check_cancelled()
+        try:
+            tool_args = json.loads(raw_args)
+            if tool_name in tools_by_name:
+                tool_output = tools_by_name[tool_name].invoke(tool_args)
+                tool_outputs.append(f"Tool {tool_name} output: {tool_output}")
+        except CancelledRunError:
+            raise
+        except Exception as tool_error:
+            logger.error(f"Error using tool {tool_name}: {str(tool_error)}")
+            tool_outputs.append(f"Error using tool {tool_name}: {str(tool_error)}")
+    return tool_outputs
+
+def with_tool_outputs(response: str, tool_calls: List[tuple]) -> str:
+    tool_outputs = run_tool_calls(tool_calls)
+    if tool_outputs:
+        response += "\n\n" + "\n".join(tool_outputs)
+    return response
+
+def build_batch_messages(batcher: StepBatcher, group: List[str], goals: str) -> List[BaseMessage]:
+    """Builds the task executor prompt answering several plan steps at once."""
+    system = EXECUTOR_PROMPT.format_messages(task="", goal="")[0]
+    return [system, HumanMessage(content=batcher.prompt(group, goals))]
+
+def execute_batch(state: State, llm, batcher: StepBatcher, group: List[str]) -> Optional[Dict]:
+    """Executes a group of trivial steps with one completion; None if its answer doesn't parse."""
+    goals = state.get("goals", "unknown")
+    result = llm(build_batch_messages(batcher, group, goals))
+    answers = batcher.parse(result.get("content", ""), group)
+    if answers is None:
+        batcher.record_fallback(group)
+        return None
+    batcher.record_batch(group)
+    logger.info(f"Executed {len(group)} steps in one completion")
+
+    results = [with_tool_outputs(response, tool_calls) for response, tool_calls in answers]
+    next_task_index = state["plan"].index(group[-1]) + 1
+    return {
+        "past_actions": state.get("past_actions", []) + [
+            record_action(state, task, result) for task, result in zip(group, results)
+        ],
+        "current_node": "task_executor",
+        "response": results[-1],
+        "next_task": state["plan"][next_task_index] if next_task_index < len(state["plan"]) else None,
+        "plan": state.get("plan", []),
+        "goals": state.get("goals", ""),
+        "context": state.get("context", {}),
+        "current_task": group[-1],
+    }
+
 def task_executor(state: State) -> Union[Dict, AgentFinish]:
     logger.info("Executing Task Executor")
 
@@ -125,45 +290,29 @@ def task_executor(state: State) -> Union[Dict, AgentFinish]:
         logger.error("Missing context or model_id in state")
         return handle_error(state, "Missing context or model_id")
 
-    llm = create_llm(state["context"]["model_id"])
+    router = get_router(state)
+    llm = router.llm(TASK_EXECUTOR)
     agent = create_agent(llm)
-
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            SystemMessage(content="You are a helpful AI assistant. Use the available tools to complete tasks."),
-            HumanMessage(content="Task: {task}\nGoal: {goal}\n\nPlease complete this task using the available tools if necessary.")
-        ]
-    )
-
-    tools_by_name = {tool.name: tool for tool in TOOLS}
+    prefetcher = state["context"].get("prefetcher")
+    batcher = state["context"].get("batcher")
 
     try:
-        messages = prompt.format_messages(
-            task=state.get("current_task", "unknown"),
-            goal=state.get("goals", "unknown")
-        )
-        result = llm(messages)
+        task = state.get("current_task", "unknown")
+        goals = state.get("goals", "unknown")
+        current_model_id.set(state["context"]["model_id"])
+        current_router.set(router)
 
-        response = result.get("content", "")
+        group = batcher.group(state.get("plan", []), task) if batcher else []
+        if group:
+            batched = execute_batch(state, llm, batcher, group)
+            if batched is not None:
+                return batched
 
-        # Extract tool calls from response if any
-        tool_pattern = r"Tool: (\w+)\nArgs: (.+)"
-        tool_matches = re.finditer(tool_pattern, response)
-        
-        tool_outputs = []
-        for match in tool_matches:
-            tool_name = match.group(1)
-            try:
-                tool_args = json.loads(match.group(2))
-                if tool_name in tools_by_name:
-                    tool_output = tools_by_name[tool_name].invoke(tool_args)
-                    tool_outputs.append(f"Tool {tool_name} output: {tool_output}")
-            except Exception as tool_error:
-                logger.error(f"Error using tool {tool_name}: {str(tool_error)}")
-                tool_outputs.append(f"Error using tool {tool_name}: {str(tool_error)}")
+        result = prefetcher.take(prefetch_key(state, task)) if prefetcher else None
+        if result is None:
+            result = llm(build_executor_messages(task, goals))
 
-        if tool_outputs:
-            response += "\n\n" + "\n".join(tool_outputs)
+        response = result.get("content", "")
 
         next_task_index = state["plan"].index(state.get("current_task", "")) + 1
         next_task = (
@@ -172,8 +321,18 @@ def task_executor(state: State) -> Union[Dict, AgentFinish]:
             else None
         )
 
+        # The next step's prompt does not depend on this step's output, so its
+        # completion can run while this step's tools do
+        if prefetcher and next_task:
+            next_messages = build_executor_messages(next_task, goals)
+            prefetcher.prefetch(prefetch_key(state, next_task), lambda: llm(next_messages))
+
+        # Extract tool calls from response if any
+        tool_calls = offload(extract_tool_calls, response, size_hint=len(response))
+        response = with_tool_outputs(response, tool_calls)
+
         return {
-            "past_actions": state.get("past_actions", []) + [(state.get("current_task", "unknown"), response)],
+            "past_actions": state.get("past_actions", []) + [record_action(state, state.get("current_task", "unknown"), response)],
             "current_node": "task_executor",
             "response": response,
             "next_task": next_task,
@@ -182,6 +341,8 @@ def task_executor(state: State) -> Union[Dict, AgentFinish]:
             "context": state.get("context", {}),
             "current_task": state.get("current_task", "unknown")
         }
+    except CancelledRunError:
+        raise
     except Exception as e:
         logger.error(f"Error in task_executor: {str(e)}", exc_info=True)
         return handle_error(state, str(e))
@@ -190,7 +351,7 @@ def handle_error(state: State, error_message: str) -> Dict:
     """Handle errors by creating a state update with error information."""
     return {
         "past_actions": state.get("past_actions", [])
-        + [(state.get("current_task", "unknown"), f"Error occurred: {error_message}")],
+        + [record_action(state, state.get("current_task", "unknown"), f"Error occurred: {error_message}")],
         "current_node": "task_executor",
         "response": f"Error occurred while executing the task: {error_message}",
         "error": error_message,
@@ -209,13 +370,17 @@ def project_updater(state: State) -> State:
         if state.get("past_actions", [])
         else ("No action", "No details")
     )
+    last_action = (last_action[0], resolve_text(state, last_action[1]))
 
     # Include checklist in the update summary
-    checklist_summary = "\n".join([f"- {task}" for task in state.get("plan", [])])
-    summary = f"Completed task: {last_action[0]}. Action taken: {last_action[1]}\n\nChecklist:\n{checklist_summary}"
+    summary = offload(build_update_summary, last_action, state.get("plan", []), size_hint=len(str(last_action[1])))
 
     return create_new_state(state, response=summary, current_node="project_updater")
 
+def format_past_actions(past_actions: List[tuple]) -> str:
+    """Renders completed actions one per line, so the text only grows at the end."""
+    return "\n".join(f"- {task}: {result}" for task, result in past_actions) or "None"
+
 class Decision(str, Enum):
     COMPLETE = "complete"
     REPLAN = "replan"
@@ -230,14 +395,36 @@ class ReplannerOutput(BaseModel):
 
 def replanner(state: State) -> Union[Dict, AgentFinish]:
     logger.info("Executing Replanner")
-    llm = create_llm(state["context"]["model_id"])
+    router = get_router(state)
+
+    policy = state["context"].get("decision_policy")
+    stats = state["context"].get("replan_stats")
+    verdict = policy.decide(state) if policy else None
+    if stats is not None:
+        if verdict is None:
+            stats["llm_calls"] += 1
+        else:
+            stats["llm_calls_avoided"] += 1
+            stats["rules"][verdict.action] = stats["rules"].get(verdict.action, 0) + 1
+    if verdict is not None:
+        if verdict.action == COMPLETE:
+            return AgentFinish(
+                return_values={"output": f"{verdict.reason}.\n\n{state.get('response', '')}"},
+                log="Task completed",
+            )
+        return {
+            "plan": state.get("plan", []),
+            "current_task": verdict.task,
+            "current_node": "replanner",
+        }
 
     prompt = ChatPromptTemplate.from_messages(
         [
-            SystemMessage(content="You are a replanning expert. Evaluate the current progress and decide if the plan needs to be updated or if the task is complete."),
-            HumanMessage(content="Original goal: {goals}\n"
-                "Current plan:\n{plan}\n"
+            ("system", "You are a replanning expert. Evaluate the current progress and decide if the plan needs to be updated or if the task is complete."),
+            # Ordered from most to least stable across a run's replanner calls
+            ("human", "Original goal: {goals}\n"
                 "Completed actions:\n{past_actions}\n"
+                "Current plan:\n{plan}\n"
                 "Last update:\n{response}\n\n"
                 "Please provide your decision on whether the plan should be continued, updated, or marked as complete. "
                 "If you decide to replan, provide a new step-by-step plan.")
@@ -248,12 +435,16 @@ def replanner(state: State) -> Union[Dict, AgentFinish]:
         messages = prompt.format_messages(
             goals=state.get("goals", ""),
             plan=state.get("plan", []),
-            past_actions=state.get("past_actions", []),
+            past_actions=format_past_actions(resolve_actions(state)),
             response=state.get("response", "")
         )
 
-        result = llm(messages)
-        content = result.get("content", "")
+        result, content = router.complete(
+            REPLANNER,
+            messages,
+            lambda r: r.get("content", ""),
+            accept=lambda content: any(d.value.upper() in content.upper() for d in Decision),
+        )
 
         # Parse decision from content
         if "COMPLETE" in content.upper():
@@ -273,12 +464,117 @@ def replanner(state: State) -> Union[Dict, AgentFinish]:
             return {
                 "current_node": "replanner",
             }
+    except CancelledRunError:
+        raise
     except Exception as e:
         logger.error(f"Error in replanner: {str(e)}", exc_info=True)
         return handle_error(state, str(e))
 
-async def run_paa(question: str, model_id: str) -> AsyncGenerator[Dict, None]:
+def _attach_run_stats(status: Dict, context: Dict):
+    """Adds the run's routing, batching, replanning, session, prefetch and profiling statistics to its final event."""
+    status["routing"] = context["router"].stats()
+    if context.get("profiler"):
+        status["profile"] = context["profiler"].report()
+    if context.get("batcher"):
+        status["batching"] = context["batcher"].stats()
+    if context.get("replan_stats"):
+        status["replanning"] = dict(context["replan_stats"])
+    if context.get("session"):
+        status["session"] = context["session"].stats()
+    prefetcher = context.get("prefetcher")
+    if prefetcher:
+        # Don't make the user wait for completions nobody will read
+        prefetcher.close(wait=False)
+        status["speculation"] = prefetcher.stats()
+
+def _stopped_status(reason: str, state: Dict, context: Dict) -> Dict:
+    """Builds the final event of a run stopped early, carrying whatever it completed."""
+    plan = state.get("plan", [])
+    executed = {task for task, _ in state.get("past_actions", [])}
+    completed = sum(1 for task in plan if task in executed)
+    response = f"Run stopped ({reason}) after {completed} of {len(plan)} steps."
+    if state.get("response"):
+        response += f"\n\nLast update:\n{state['response']}"
+    status = {
+        "current_node": "end",
+        "stopped": reason,
+        "response": response,
+        "plan": plan,
+        "goals": state.get("goals", ""),
+        "current_task": state.get("current_task", ""),
+        "past_actions": state.get("past_actions", []),
+    }
+    _attach_run_stats(status, context)
+    return status
+
+# Node hops a run may take unless run_paa is told otherwise
+DEFAULT_MAX_HOPS = 100
+
+async def run_paa(
+    question: str,
+    model_id: str,
+    speculative: bool = False,
+    engine: str = "loop",
+    checkpointer=None,
+    routes: Optional[Dict[str, str]] = None,
+    escalation_model: Optional[str] = None,
+    session_affinity: bool = False,
+    decision_policy: Optional[DecisionPolicy] = None,
+    batch_steps: int = 0,
+    profile: bool = False,
+    deadline: Optional[float] = None,
+    max_hops: Optional[int] = DEFAULT_MAX_HOPS,
+    cancel_token: Optional[CancellationToken] = None,
+    store_transcripts: bool = False,
+) -> AsyncGenerator[Dict, None]:
+    """
+    Runs the planner, task executor, project updater and replanner loop.
+
+    Nodes run in worker threads so the event loop driving the run stays free
+    for other runs and for the code consuming the status events.
+
+    Args:
+        question: The user request
+        model_id: The Ollama model to use
+        speculative: Issue each step's completion while the previous step's
+            tools run; the final event then reports the prefetch statistics
+        engine: "loop" for the hand-written loop below, or "graph" for the
+            compiled LangGraph workflow in graph.py
+        checkpointer: LangGraph checkpointer, only used by the graph engine
+        routes: Models for individual nodes (planner, task_executor,
+            replanner, summarizer); other nodes use model_id. The final event
+            reports latency and tokens per route.
+        escalation_model: Model to retry a planner or replanner call with
+            when the routed model's output cannot be parsed
+        session_affinity: Send the run's calls through one PromptSession, so
+            Ollama can reuse the evaluated prompt prefixes of earlier steps;
+            the final event then reports the prompt-eval tokens saved
+        decision_policy: Rules answering obvious replanning cases without
+            the LLM; the final event then reports the replanner calls avoided
+        batch_steps: Most consecutive trivial steps answered by one task
+            executor completion; 0 or 1 executes every step on its own. The
+            final event then reports the round trips saved.
+        profile: Profile every node with cProfile and tracemalloc; the final
+            event then carries the top functions and allocation sites
+        deadline: Seconds the run may take. Ollama and tool calls still in
+            flight when it passes are abandoned.
+        max_hops: Most nodes the run may execute; None for no limit
+        cancel_token: Token whose cancel() stops the run, including the
+            calls in flight
+        store_transcripts: Keep step results in the process-wide transcript
+            store; past_actions in the state and in the events then hold
+            references, resolved with transcripts.resolve_actions
+
+    When the run is stopped by any of these, its final event carries a
+    "stopped" reason and the plan steps completed so far.
+    """
     logger.info(f"Running Personal AI Assistant with question: {question}")
+    token = cancel_token
+    if deadline is not None:
+        token = token or CancellationToken()
+        token.set_deadline(deadline)
+    session = PromptSession() if session_affinity else None
+    llm_factory = (lambda m: create_llm(m, session=session)) if session else create_llm
 
     initial_state: State = {
         "messages": [
@@ -290,48 +586,109 @@ async def run_paa(question: str, model_id: str) -> AsyncGenerator[Dict, None]:
         "past_actions": [],
         "current_task": "",
         "response": "",
-        "context": {"model_id": model_id},
+        "context": {
+            "model_id": model_id,
+            "router": ModelRouter(model_id, routes, escalation_model, llm_factory=llm_factory),
+            "session": session,
+            "decision_policy": decision_policy,
+            "batcher": StepBatcher(batch_steps) if batch_steps > 1 else None,
+            "profiler": RunProfiler() if profile else None,
+            "replan_stats": {"llm_calls": 0, "llm_calls_avoided": 0, "rules": {}} if decision_policy else None,
+            "cancel_token": token,
+            "transcripts": get_transcript_store() if store_transcripts else None,
+        },
         "current_node": "planner",
+        "next_task": None,
     }
+    prefetcher = SpeculativePrefetcher() if speculative else None
+    if prefetcher:
+        initial_state["context"]["prefetcher"] = prefetcher
 
     try:
+        if engine == "graph":
+            from graph import run_paa_graph  # graph imports this module
+
+            last_status: Dict = {}
+            try:
+                # Let the graph run one hop past the limit, so the check below stops it with its state
+                recursion_limit = max_hops + 1 if max_hops is not None else None
+                async with contextlib.aclosing(
+                    run_paa_graph(question, initial_state["context"], checkpointer, recursion_limit=recursion_limit)
+                ) as statuses:
+                    hops = 0
+                    async for status in statuses:
+                        hops += 1
+                        if status["current_node"] == "end":
+                            _attach_run_stats(status, initial_state["context"])
+                        yield status
+                        last_status = status
+                        if status["current_node"] != "end":
+                            if token is not None:
+                                token.check()
+                            if max_hops is not None and hops >= max_hops:
+                                raise CancelledRunError(MAX_HOPS)
+            except CancelledRunError as e:
+                logger.warning(f"Run stopped: {e.reason}")
+                yield _stopped_status(e.reason, last_status, initial_state["context"])
+            logger.info("Workflow completed")
+            return
+
         current_state = initial_state
+        hops = 0
         while current_state["current_node"] != "end":
             logger.info(f"Current node: {current_state['current_node']}")
+            if max_hops is not None and hops >= max_hops:
+                logger.warning(f"Run stopped: {MAX_HOPS}")
+                yield _stopped_status(MAX_HOPS, current_state, current_state["context"])
+                return
+            hops += 1
 
             if current_state["current_node"] == "planner":
-                current_state = planner(current_state)
+                current_state = await asyncio.to_thread(run_node, "planner", planner, current_state)
                 if current_state.get("plan", []):
                     current_state["current_task"] = current_state["plan"][0]
                     current_state["current_node"] = "task_executor"
                 else:
                     current_state["current_node"] = "end"
             elif current_state["current_node"] == "task_executor":
-                current_state = task_executor(current_state)
+                current_state = await asyncio.to_thread(run_node, "task_executor", task_executor, current_state)
                 if current_state.get("next_task"):
                     current_state["current_task"] = current_state["next_task"]
                     current_state["current_node"] = "task_executor"
                 else:
                     current_state["current_node"] = "project_updater"
             elif current_state["current_node"] == "project_updater":
-                current_state = project_updater(current_state)
+                current_state = await asyncio.to_thread(run_node, "project_updater", project_updater, current_state)
                 current_state["current_node"] = "replanner"
             elif current_state["current_node"] == "replanner":
-                result = replanner(current_state)
-                if isinstance(result, AgentFinish):
-                    yield {
+                result = await asyncio.to_thread(run_node, "replanner", replanner, current_state)
+                if isinstance(result, AgentFinish) or not result.get("plan") or "error" in result:
+                    # Without a new plan to execute, "continue" has nothing left to run
+                    past_actions = current_state.get("past_actions", [])
+                    if isinstance(result, AgentFinish):
+                        response = result.return_values.get("output", "Task completed")
+                    else:
+                        response = result.get("response", current_state.get("response", ""))
+                        past_actions = result.get("past_actions", past_actions)
+                    final_status = {
                         "current_node": "end",
-                        "response": result.return_values.get(
-                            "output", "Task completed"
-                        ),
+                        "response": response,
                         "plan": current_state.get("plan", []),
                         "goals": current_state.get("goals", ""),
                         "current_task": "",
-                        "past_actions": current_state.get("past_actions", []),
+                        "past_actions": past_actions,
                     }
+                    _attach_run_stats(final_status, current_state["context"])
+                    yield final_status
                     break
                 else:
                     current_state.update(result)
+                    current_state["current_node"] = "task_executor"
+                    if prefetcher:
+                        # Completions prefetched for steps of the old plan are stale
+                        prefetcher.discard_except(
+                            prefetch_key(current_state, task) for task in current_state["plan"]
+                        )
             yield {
                 "current_node": current_state.get("current_node", "unknown"),
                 "response": current_state.get("response", ""),
@@ -344,6 +701,15 @@ async def run_paa(question: str, model_id: str) -> AsyncGenerator[Dict, None]:
         logger.info("Workflow completed")
         yield {"final_answer": current_state.get("response", "Task completed")}
 
+    except CancelledRunError as e:
+        # Only the loop engine gets here; the graph engine handles its own stops
+        logger.warning(f"Run stopped: {e.reason}")
+        yield _stopped_status(e.reason, current_state, current_state["context"])
     except Exception as e:
         logger.error(f"Error occurred in run_paa: {str(e)}", exc_info=True)
         yield {"error": str(e)}
+    finally:
+        if prefetcher:
+            prefetcher.close(wait=False)
+        if initial_state["context"]["profiler"]:
+            initial_state["context"]["profiler"].close()
@@ -1,30 +1,88 @@
+import asyncio
+import os
+from contextvars import ContextVar
+from typing import Optional
 from langchain.tools import tool
 from langchain_core.pydantic_v1 import BaseModel
+from summarizer import resolve_upload, summarize_document as summarize_file
+from search_index import get_search_index
+from calendar_store import answer_free_slot_query, get_calendar_store
+from contacts import get_contact_directory
+from outbox import get_outbox
+from routing import SUMMARIZER, current_router
+
+# Model of the run invoking a tool, set by the task executor
+current_model_id: ContextVar[Optional[str]] = ContextVar("current_model_id", default=None)
 
 
 @tool
 def call_calendar(query: str) -> str:
     """Calls the Google Calendar API to perform various calendar operations."""
+    calendar_dir = os.environ.get("PAA_CALENDAR_DIR")
+    if calendar_dir:
+        answer = answer_free_slot_query(get_calendar_store(calendar_dir), query)
+        if answer is not None:
+            return answer
     return f"Calendar operation performed: {query}"
 
 
 @tool
 def get_contact(name: str) -> str:
     """Retrieves contact information for a given name."""
+    contacts_file = os.environ.get("PAA_CONTACTS_FILE")
+    if contacts_file:
+        matches = get_contact_directory(contacts_file).search(name, k=3)
+        if not matches:
+            return f"No contact found for {name}"
+        best = matches[0]
+        result = f"Contact info for {best['name']}: {best['email']}, {best['phone']}"
+        if len(matches) > 1:
+            result += "\nOther matches: " + ", ".join(m["name"] for m in matches[1:])
+        return result
     return f"Contact info for {name}: email@example.com, 123-456-7890"
 
 
 @tool
 def send_email(to: str, subject: str, body: str) -> str:
     """Sends an email to a specified recipient with a subject and message body."""
+    if os.environ.get("PAA_SMTP_HOST"):
+        message_id = get_outbox().enqueue(to, subject, body)
+        return f"Email to {to} queued for sending with message id {message_id}"
     return f"Email sent to {to} with subject: {subject}\nbody: {body}"
 
 
 @tool
 def web_search(query: str) -> str:
     """Performs a web search based on the given query string."""
-    return f"Web search results for: {query}"
+    index_path = os.environ.get("PAA_SEARCH_INDEX")
+    if not index_path:
+        return f"Web search results for: {query}"
+    results = get_search_index(index_path).search(query, k=5)
+    if not results:
+        return f"No results found for: {query}"
+    return f"Search results for: {query}\n" + "\n".join(
+        f"{i}. {r['title']} ({r['id']}): {r['snippet']}" for i, r in enumerate(results, 1)
+    )
+
+
+@tool
+def summarize_document(path: str) -> str:
+    """Summarizes an attached text document of any size, given its file path."""
+    router = current_router.get()
+    model_id = os.environ.get("PAA_SUMMARY_MODEL") or (
+        router.model_for(SUMMARIZER) if router else current_model_id.get()
+    )
+    if not model_id:
+        return "Error: no model configured for summarization"
+    # The path comes from the model, so only the documents the user attached may be read
+    document = resolve_upload(path)
+    if document is None:
+        return f"Error: only attached documents can be summarized, not {path}"
+    if not os.path.isfile(document):
+        return f"Error: document not found: {path}"
+    llm = router.llm(SUMMARIZER, model_id) if router else None
+    return asyncio.run(summarize_file(document, model_id, llm=llm))
 
 
 # List of available tools
-TOOLS = [call_calendar, get_contact, send_email, web_search]
+TOOLS = [call_calendar, get_contact, send_email, web_search, summarize_document]
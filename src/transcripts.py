@@ -0,0 +1,230 @@
+"""
+Content-addressed, compressed store for step results.
+
+Every executed step adds its full result to past_actions, and every status
+event a run yields carries all of them again. With a TranscriptStore, a
+result is stored once, compressed and keyed by its SHA-256, and past_actions
+holds a short "transcript:<hash>" reference in its place. Code that needs
+the text (the replanner prompt, the decision rules, the UI) resolves the
+reference when it reads it. Results shorter than min_size stay inline, since
+their reference would be about as long.
+
+zlib is always available; zstd is used when the zstandard package is
+installed and the codec is "zstd" or "auto".
+
+With a path, blobs live only on disk. Without one they are kept in memory up
+to max_bytes, evicting the least recently used; a reference to an evicted
+blob can no longer be resolved, so long-lived processes should set a path.
+"""
+import hashlib
+import logging
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+REF_PREFIX = "transcript:"
+ZLIB = "zlib"
+ZSTD = "zstd"
+
+# First byte of a stored blob, so a store can read blobs written with either codec
+_CODEC_MARKERS = {ZLIB: b"z", ZSTD: b"s"}
+
+
+def is_ref(value: Any) -> bool:
+    """Whether value is a transcript reference rather than the text itself."""
+    return isinstance(value, str) and value.startswith(REF_PREFIX)
+
+
+class TranscriptStore:
+    """
+    Stores texts once, compressed, under a reference derived from their content.
+
+    Args:
+        path: Directory to persist blobs in; in memory only if None
+        max_bytes: Most compressed bytes kept in memory when path is None
+        codec: "zlib", "zstd" or "auto" (zstd if installed, else zlib)
+        level: Compression level; the codec's default if None
+        min_size: Texts shorter than this are not stored; put() returns them as is
+        cache_size: Decompressed texts kept for repeated reads
+    """
+
+    def __init__(self, path: Optional[str] = None, codec: str = "auto", level: Optional[int] = None,
+                 min_size: int = 256, cache_size: int = 64, max_bytes: int = 64 * 1024 * 1024):
+        if codec == "auto":
+            codec = ZSTD if zstandard is not None else ZLIB
+        if codec not in _CODEC_MARKERS:
+            raise ValueError(f"Unknown transcript codec '{codec}'")
+        if codec == ZSTD and zstandard is None:
+            raise ValueError("The zstd codec needs the zstandard package")
+        self.path = path
+        self.codec = codec
+        self.level = level
+        self.min_size = min_size
+        self.cache_size = cache_size
+        self.max_bytes = max_bytes
+        self._blobs: "OrderedDict[str, bytes]" = OrderedDict()
+        self._blob_bytes = 0
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stored = 0
+        self.deduplicated = 0
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+        self.evicted = 0
+        if path:
+            os.makedirs(path, exist_ok=True)
+
+    def _compress(self, data: bytes) -> bytes:
+        if self.codec == ZSTD:
+            compressor = zstandard.ZstdCompressor(**({"level": self.level} if self.level is not None else {}))
+            return _CODEC_MARKERS[ZSTD] + compressor.compress(data)
+        return _CODEC_MARKERS[ZLIB] + zlib.compress(data, self.level if self.level is not None else -1)
+
+    @staticmethod
+    def _decompress(blob: bytes) -> bytes:
+        marker, payload = blob[:1], blob[1:]
+        if marker == _CODEC_MARKERS[ZSTD]:
+            if zstandard is None:
+                raise ValueError("Transcript was stored with zstd, but zstandard is not installed")
+            return zstandard.ZstdDecompressor().decompress(payload)
+        return zlib.decompress(payload)
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.path, digest[:2], digest)
+
+    def _has(self, digest: str) -> bool:
+        return digest in self._blobs or (self.path is not None and os.path.exists(self._blob_path(digest)))
+
+    def put(self, text: str) -> str:
+        """Stores text and returns its reference, or text itself if it is short or already a reference."""
+        if not isinstance(text, str) or len(text) < self.min_size or is_ref(text):
+            return text
+        data = text.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            if self._has(digest):
+                self.deduplicated += 1
+                return REF_PREFIX + digest
+            blob = self._compress(data)
+            if self.path is not None:
+                blob_path = self._blob_path(digest)
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                tmp_path = f"{blob_path}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(blob)
+                os.replace(tmp_path, blob_path)
+            else:
+                self._blobs[digest] = blob
+                self._blob_bytes += len(blob)
+                self._evict()
+            self.stored += 1
+            self.raw_bytes += len(data)
+            self.stored_bytes += len(blob)
+        return REF_PREFIX + digest
+
+    def _evict(self):
+        """Drops the least recently used in-memory blobs until they fit in max_bytes."""
+        while self._blob_bytes > self.max_bytes and len(self._blobs) > 1:
+            digest, blob = self._blobs.popitem(last=False)
+            self._blob_bytes -= len(blob)
+            self._cache.pop(digest, None)
+            self.evicted += 1
+            logger.warning(f"Evicted transcript {digest[:12]} from memory; set PAA_TRANSCRIPT_DIR to keep transcripts")
+
+    def get(self, ref: str) -> str:
+        """
+        Returns the text a reference points to.
+
+        Raises:
+            KeyError: If the store has no text for ref
+        """
+        digest = ref[len(REF_PREFIX):]
+        with self._lock:
+            if digest in self._cache:
+                self._cache.move_to_end(digest)
+                return self._cache[digest]
+            blob = self._blobs.get(digest)
+            if blob is not None:
+                self._blobs.move_to_end(digest)
+        if blob is None and self.path is not None:
+            try:
+                with open(self._blob_path(digest), "rb") as f:
+                    blob = f.read()
+            except FileNotFoundError:
+                blob = None
+        if blob is None:
+            raise KeyError(f"Unknown transcript reference: {ref}")
+        text = self._decompress(blob).decode("utf-8")
+        with self._lock:
+            self._cache[digest] = text
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return text
+
+    def resolve(self, value: Any) -> Any:
+        """Returns the text behind value if it is a reference, else value unchanged."""
+        return self.get(value) if is_ref(value) else value
+
+    def resolve_actions(self, actions: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """Returns past_actions with every result resolved to its text."""
+        return [(task, self.resolve(result)) for task, result in actions]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "codec": self.codec,
+                "stored": self.stored,
+                "deduplicated": self.deduplicated,
+                "raw_bytes": self.raw_bytes,
+                "stored_bytes": self.stored_bytes,
+                "memory_bytes": self._blob_bytes,
+                "evicted": self.evicted,
+                "compression_ratio": round(self.raw_bytes / self.stored_bytes, 2) if self.stored_bytes else 0.0,
+            }
+
+
+def resolve_text(state: Dict[str, Any], value: Any) -> Any:
+    """Returns the text behind value using the run's store, or the process-wide one."""
+    if not is_ref(value):
+        return value
+    store = (state.get("context") or {}).get("transcripts") or get_transcript_store()
+    return store.get(value)
+
+
+def resolve_actions(state: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """Returns the past_actions of state with their results as text."""
+    return [(task, resolve_text(state, result)) for task, result in state.get("past_actions", [])]
+
+
+_store: Optional[TranscriptStore] = None
+_store_lock = threading.Lock()
+
+
+def get_transcript_store() -> TranscriptStore:
+    """
+    Returns the process-wide transcript store, creating it on first use.
+
+    PAA_TRANSCRIPT_DIR persists blobs in a directory instead of memory,
+    PAA_TRANSCRIPT_MAX_BYTES caps the memory they use otherwise (default
+    64 MiB), and PAA_TRANSCRIPT_CODEC picks "zlib", "zstd" or "auto" (the
+    default).
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = TranscriptStore(
+                path=os.environ.get("PAA_TRANSCRIPT_DIR") or None,
+                codec=os.environ.get("PAA_TRANSCRIPT_CODEC", "auto"),
+                max_bytes=int(os.environ.get("PAA_TRANSCRIPT_MAX_BYTES", str(64 * 1024 * 1024))),
+            )
+            logger.info(f"Transcript store using {_store.codec} in {_store.path or 'memory'}")
+        return _store
@@ -39,6 +39,14 @@ def setup_test_logging():
     logger.info("Test logging initialized")
     return logger
 
+@pytest.fixture(autouse=True)
+def reset_resilience():
+    """Give every test closed circuit breakers, whatever earlier tests did."""
+    from resilience import reset_resilient_caller
+    reset_resilient_caller()
+    yield
+    reset_resilient_caller()
+
 @pytest.fixture
 def mock_ollama_response():
     """Mock response from Ollama API."""
@@ -1,5 +1,58 @@
+import asyncio
+import copy
+import io
+import json
+import threading
+import time
 import unittest
-from src.architect import generate_yaml, run_aws_architect_agent
+import yaml
+from src.architect import ArchitectAgent, YamlGenerator, generate_yaml, merge_components, run_aws_architect_agent
+
+REQUIREMENTS = {
+    "namespace": "shop",
+    "services": [
+        {"name": f"svc{i}", "image": f"repo/svc{i}:1.0", "port": 8080, "replicas": 2,
+         "env": {"AWS_REGION": "us-west-2"}}
+        for i in range(5)
+    ] + [{"name": "web", "image": "repo/web:1.0", "ingress": {"host": "shop.example.com"}}],
+    "resources": [
+        {"type": "s3_bucket", "name": "Assets", "properties": {"VersioningConfiguration": {"Status": "Enabled"}}},
+        {"type": "rds_instance", "name": "Orders"},
+    ],
+}
+
+COMPONENT_RESOURCES = {
+    "network": {"Vpc": {"Type": "AWS::EC2::VPC", "Properties": {"CidrBlock": "10.0.0.0/16"}}},
+    "compute": {"Web": {"Type": "AWS::EC2::Instance", "Properties": {"InstanceType": "t3.micro"}}},
+    "database": {"Orders": {"Type": "AWS::RDS::DBInstance", "Properties": {"Engine": "mysql"}}},
+}
+
+
+class FakeArchitectLLM:
+    """Plans the COMPONENT_RESOURCES components and answers each after delay seconds."""
+
+    def __init__(self, delay: float = 0.0, plan: str = None):
+        self.delay = delay
+        self.plan = plan
+        self.component_calls = 0
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, messages):
+        content = messages[-1]["content"]
+        if "Split the architecture" in content:
+            components = [{"name": name, "prompt": f"The {name} part"} for name in COMPONENT_RESOURCES]
+            return {"content": self.plan if self.plan is not None else json.dumps({"components": components})}
+        with self._lock:
+            self.component_calls += 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        name = next(n for n in COMPONENT_RESOURCES if f"the {n} component" in content)
+        return {"content": json.dumps({"Resources": COMPONENT_RESOURCES[name]})}
 
 
 class TestArchitect(unittest.TestCase):
@@ -8,13 +61,87 @@ class TestArchitect(unittest.TestCase):
         yaml_content = generate_yaml(question)
         self.assertIn("AWS::S3::Bucket", yaml_content)
 
+    def test_generate_yaml_documents(self):
+        documents = list(yaml.safe_load_all(generate_yaml(REQUIREMENTS)))
+        kinds = [d.get("kind", "CloudFormation") for d in documents]
+        self.assertEqual(kinds, ["Deployment", "Service"] * 5 + ["Deployment", "Service", "Ingress", "CloudFormation"])
+        self.assertEqual(documents[0]["spec"]["replicas"], 2)
+        self.assertEqual(documents[0]["metadata"]["namespace"], "shop")
+        self.assertEqual(documents[-1]["Resources"]["Orders"]["Type"], "AWS::RDS::DBInstance")
+        self.assertEqual(documents[-1]["Resources"]["Assets"]["Properties"]["VersioningConfiguration"]["Status"], "Enabled")
+
+    def test_rerender_only_touches_changed_fragments(self):
+        generator = YamlGenerator()
+        first = io.StringIO()
+        generator.render(REQUIREMENTS, first)
+        self.assertEqual(generator.stats()["rendered"], 15)
+
+        changed = copy.deepcopy(REQUIREMENTS)
+        changed["services"][2]["replicas"] = 4
+        second = io.StringIO()
+        generator.render(changed, second)
+        # Only svc2's Deployment and Service depend on its subtree
+        self.assertEqual(generator.stats()["rendered"], 17)
+        self.assertIn("replicas: 4", second.getvalue())
+        self.assertEqual(first.getvalue().count("replicas: 2"), second.getvalue().count("replicas: 2") + 1)
+
+    def test_generate_yaml_streams_to_file(self):
+        out = io.StringIO()
+        self.assertEqual(generate_yaml(REQUIREMENTS, out=out), "")
+        self.assertEqual(out.getvalue(), generate_yaml(REQUIREMENTS))
+
+    def test_generate_yaml_rejects_incomplete_service(self):
+        with self.assertRaises(ValueError):
+            generate_yaml({"services": [{"name": "api"}]})
+
     def test_run_aws_architect_agent(self):
         question = "EC2 인스턴스와 RDS 데이터베이스를 연결하는 아키텍처를 설계해주세요."
-        messages = run_aws_architect_agent(question)
-        self.assertTrue(len(messages) > 1)
-        self.assertIn("AWS::EC2::Instance", messages[-2].content)
-        self.assertIn("AWS::RDS::DBInstance", messages[-2].content)
+        template = run_aws_architect_agent(question, model_id="test-model", llm=FakeArchitectLLM())
+        types = {resource["Type"] for resource in template["Resources"].values()}
+        self.assertIn("AWS::EC2::Instance", types)
+        self.assertIn("AWS::RDS::DBInstance", types)
+        self.assertEqual(template["Metadata"]["Components"]["database"], ["Orders"])
+
+    def test_components_are_generated_concurrently(self):
+        llm = FakeArchitectLLM(delay=0.3)
+        agent = ArchitectAgent(max_concurrency=3)
+        started = time.perf_counter()
+        template = asyncio.run(agent.generate("Web shop on AWS", "test-model", llm=llm))
+        elapsed = time.perf_counter() - started
+        self.assertEqual(set(template["Resources"]), {"Vpc", "Web", "Orders"})
+        self.assertEqual(llm.max_active, 3)
+        # About the slowest component rather than the sum of all three
+        self.assertLess(elapsed, 0.8)
+
+    def test_concurrency_limit(self):
+        llm = FakeArchitectLLM(delay=0.05)
+        asyncio.run(ArchitectAgent(max_concurrency=1).generate("Web shop on AWS", "test-model", llm=llm))
+        self.assertEqual(llm.max_active, 1)
+
+    def test_component_outputs_are_cached_by_normalized_prompt(self):
+        llm = FakeArchitectLLM()
+        agent = ArchitectAgent()
+        first = asyncio.run(agent.generate("Web shop on AWS", "test-model", llm=llm))
+        second = asyncio.run(agent.generate("web  shop on AWS!", "test-model", llm=llm))
+        self.assertEqual(llm.component_calls, 3)
+        self.assertEqual(first["Resources"], second["Resources"])
+        self.assertEqual(agent.stats(), {"generated": 3, "reused": 3, "cached": 3})
+
+    def test_unusable_plan_falls_back_to_service_keywords(self):
+        llm = FakeArchitectLLM(plan="I cannot help with that")
+        template = asyncio.run(ArchitectAgent().generate("An EC2 web server with an RDS database", "test-model", llm=llm))
+        self.assertEqual(set(template["Metadata"]["Components"]), {"compute", "database"})
 
+    def test_merge_renames_conflicting_resources(self):
+        template = merge_components("prompt", {
+            "compute": {"Role": {"Type": "AWS::IAM::Role"}, "Web": {"Type": "AWS::EC2::Instance"}},
+            "iam": {"Role": {"Type": "AWS::IAM::Role", "Properties": {"Path": "/"}},
+                    "Profile": {"Type": "AWS::IAM::InstanceProfile", "Properties": {"Roles": [{"Ref": "Missing"}]}}},
+        })
+        self.assertEqual(set(template["Resources"]), {"Role", "Web", "RoleIam", "Profile"})
+        self.assertEqual(template["Metadata"]["UnresolvedReferences"], ["Missing"])
+        with self.assertRaises(ValueError):
+            merge_components("prompt", {})
 
 if __name__ == "__main__":
     unittest.main()
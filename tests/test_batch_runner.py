@@ -0,0 +1,164 @@
+import pytest
+import asyncio
+import json
+import logging
+import batch_runner
+from batch_runner import completed_ids, main, parse_model_limits, percentile, run_batch
+
+logger = logging.getLogger(__name__)
+
+def write_tasks(path, tasks):
+    path.write_text("".join(json.dumps(task) + "\n" for task in tasks))
+    return str(path)
+
+def read_results(path):
+    return [json.loads(line) for line in open(path)]
+
+class FakeRun:
+    """Stands in for run_paa, tracking how many runs are active per model."""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.active = {}
+        self.max_active = {}
+        self.questions = []
+        self.options = []
+
+    async def __call__(self, question, model_id, **options):
+        self.questions.append(question)
+        self.options.append(options)
+        self.active[model_id] = self.active.get(model_id, 0) + 1
+        self.max_active[model_id] = max(self.max_active.get(model_id, 0), self.active[model_id])
+        try:
+            await asyncio.sleep(self.delay)
+            if "fail" in question:
+                yield {"error": "Ollama is down"}
+                return
+            if "endless" in question:
+                yield {"current_node": "end", "response": "Stopped after 1 of 3 steps", "stopped": "max_hops"}
+                return
+            yield {"current_node": "planner", "plan": ["Step 1"]}
+            yield {"current_node": "end", "response": f"Answer to {question}", "plan": ["Step 1"],
+                   "goals": "Goal", "past_actions": [["Step 1", "done"]], "routing": {"planner:m": {"calls": 1}}}
+        finally:
+            self.active[model_id] -= 1
+
+def test_percentile():
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 99) == 99.0
+    assert percentile([3.0], 95) == 3.0
+    assert percentile([], 50) == 0.0
+
+def test_parse_model_limits():
+    assert parse_model_limits(["llama3.1:70b=2", "mistral=1"]) == {"llama3.1:70b": 2, "mistral": 1}
+    with pytest.raises(ValueError):
+        parse_model_limits(["llama3=0"])
+    with pytest.raises(ValueError):
+        parse_model_limits(["llama3"])
+
+@pytest.mark.asyncio
+async def test_run_batch_concurrency_and_model_limits(tmp_path):
+    """Test that tasks run concurrently within the per-model limits and stream their results."""
+    logger.info("Testing batch runner concurrency")
+    tasks = [{"id": f"t{i}", "question": f"Question {i}"} for i in range(8)]
+    tasks += [{"id": f"big{i}", "question": f"Hard question {i}", "model_id": "big"} for i in range(4)]
+    tasks.append({"question": "This one will fail"})
+    input_path = write_tasks(tmp_path / "tasks.jsonl", tasks)
+    output_path = str(tmp_path / "results.jsonl")
+    run = FakeRun()
+    try:
+        summary = await run_batch(input_path, output_path, "small", workers=4, model_limits={"big": 1}, run=run)
+        logger.debug(f"Batch summary: {summary}")
+        assert summary["completed"] == 12
+        assert summary["failed"] == 1
+        assert run.max_active["small"] > 1
+        assert run.max_active["big"] == 1
+        assert summary["p50"] >= 0.05 and summary["p99"] >= summary["p50"]
+
+        results = {r["id"]: r for r in read_results(output_path)}
+        assert results["t3"]["response"] == "Answer to Question 3"
+        assert results["t3"]["routing"] == {"planner:m": {"calls": 1}}
+        assert results["big0"]["model_id"] == "big"
+        assert results["line-13"] == {**results["line-13"], "status": "error", "error": "Ollama is down"}
+    except Exception as e:
+        logger.error(f"Error in batch runner test: {str(e)}")
+        raise
+
+@pytest.mark.asyncio
+async def test_run_batch_resume(tmp_path):
+    """Test that a resumed batch only runs the tasks that did not succeed."""
+    input_path = write_tasks(tmp_path / "tasks.jsonl", [
+        {"id": "a", "question": "First"}, {"id": "b", "question": "Second"}, {"id": "c", "question": "Third"},
+    ])
+    output_path = tmp_path / "results.jsonl"
+    output_path.write_text(
+        json.dumps({"id": "a", "status": "ok"}) + "\n"
+        + json.dumps({"id": "b", "status": "error"}) + "\n"
+        + '{"id": "c", "sta'
+    )
+    assert completed_ids(str(output_path)) == {"a"}
+
+    run = FakeRun(delay=0)
+    summary = await run_batch(input_path, str(output_path), "m", resume=True, run=run)
+    assert sorted(run.questions) == ["Second", "Third"]
+    assert summary["skipped"] == 1
+    assert completed_ids(str(output_path)) == {"a", "b", "c"}
+
+@pytest.mark.asyncio
+async def test_run_batch_timeout_and_options(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch_runner, "TIMEOUT_GRACE", 0)
+    input_path = write_tasks(tmp_path / "tasks.jsonl", [
+        {"id": "slow", "question": "Slow", "options": {"engine": "graph", "unknown": 1}},
+    ])
+    output_path = str(tmp_path / "results.jsonl")
+    slow = FakeRun(delay=1)
+    summary = await run_batch(input_path, output_path, "m", timeout=0.01, run=slow)
+    assert summary["failed"] == 1
+    assert read_results(output_path)[0]["error"].startswith("Timed out")
+    assert slow.options[0]["deadline"] == 0.01
+
+    run = FakeRun(delay=0)
+    await run_batch(input_path, output_path, "m", fast_replan=True, overwrite=True, run=run)
+    assert read_results(output_path)[0]["status"] == "ok"
+    assert sorted(run.options[0]) == ["decision_policy", "engine"]
+
+@pytest.mark.asyncio
+async def test_run_batch_keeps_existing_output(tmp_path):
+    input_path = write_tasks(tmp_path / "tasks.jsonl", [{"id": "a", "question": "First"}])
+    output_path = tmp_path / "results.jsonl"
+    output_path.write_text(json.dumps({"id": "a", "status": "ok"}) + "\n")
+    with pytest.raises(ValueError):
+        await run_batch(input_path, str(output_path), "m", run=FakeRun(delay=0))
+    assert completed_ids(str(output_path)) == {"a"}
+
+@pytest.mark.asyncio
+async def test_busy_model_does_not_hold_up_others(tmp_path):
+    """Test that a task waiting for a model at its limit lets later tasks for other models start."""
+    tasks = [{"id": f"big{i}", "question": f"Hard question {i}", "model_id": "big"} for i in range(2)]
+    tasks += [{"id": f"t{i}", "question": f"Question {i}"} for i in range(2)]
+    input_path = write_tasks(tmp_path / "tasks.jsonl", tasks)
+    run = FakeRun()
+    summary = await run_batch(input_path, str(tmp_path / "results.jsonl"), "small", workers=2,
+                              model_limits={"big": 1}, run=run)
+    assert summary["completed"] == 4
+    assert run.questions[:2] == ["Hard question 0", "Question 0"]
+    assert run.max_active["big"] == 1
+
+@pytest.mark.asyncio
+async def test_stopped_run_is_an_error(tmp_path):
+    input_path = write_tasks(tmp_path / "tasks.jsonl", [{"id": "a", "question": "An endless task"}])
+    output_path = str(tmp_path / "results.jsonl")
+    summary = await run_batch(input_path, output_path, "m", run=FakeRun(delay=0))
+    assert summary["failed"] == 1
+    result = read_results(output_path)[0]
+    assert result["status"] == "error"
+    assert result["error"] == "Run stopped: max_hops"
+    assert result["stopped"] == "max_hops"
+    assert completed_ids(output_path) == set()
+
+def test_main_rejects_bad_input(tmp_path):
+    bad = tmp_path / "tasks.jsonl"
+    bad.write_text('{"id": 1}\n')
+    with pytest.raises(ValueError):
+        main([str(bad), str(tmp_path / "out.jsonl"), "--model", "m"])
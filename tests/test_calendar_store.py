@@ -0,0 +1,141 @@
+import pytest
+import logging
+from datetime import datetime, timezone
+from unittest.mock import patch
+from calendar_store import BusyIndex, CalendarStore, answer_free_slot_query, parse_ics
+from tools import call_calendar
+
+logger = logging.getLogger(__name__)
+
+def ts(text):
+    return datetime.fromisoformat(text).replace(tzinfo=timezone.utc).timestamp()
+
+ICS = """BEGIN:VCALENDAR
+BEGIN:VEVENT
+SUMMARY:Standup
+DTSTART:20240507T090000Z
+DTEND:20240507T093000Z
+ORGANIZER;CN=Eric Smith:mailto:eric@example.com
+ATTENDEE;CN=Ana Lopez:mailto:ana@example.com
+END:VEVENT
+BEGIN:VEVENT
+SUMMARY:Review
+DTSTART:20240507T140000Z
+DTEND:20240507T150000Z
+ATTENDEE;CN="Eric Smith":mailto:eric@exa
+ mple.com
+END:VEVENT
+END:VCALENDAR
+"""
+
+@pytest.fixture
+def store(tmp_path):
+    path = tmp_path / "team.ics"
+    path.write_text(ICS)
+    store = CalendarStore()
+    store.load_ics(str(path))
+    return store
+
+def test_busy_index_merges_intervals():
+    """Test that overlapping and touching intervals are merged."""
+    logger.info("Testing BusyIndex merging")
+    index = BusyIndex()
+    index.add(10, 20)
+    index.add(30, 40)
+    index.add(15, 30)
+    index.add(50, 60)
+    assert list(zip(index.starts, index.ends)) == [(10, 40), (50, 60)]
+    assert index.busy_until(35) == 40
+    assert index.busy_until(45) is None
+    assert index.next_busy(45) == (50, 60)
+
+def test_parse_ics_unfolds_lines():
+    """Test that folded attendee lines are parsed."""
+    events = list(parse_ics(ICS))
+    assert len(events) == 2
+    assert events[1][0] == [("eric@example.com", "Eric Smith")]
+
+def test_first_common_free_slot(store):
+    """Test that the first slot free for everyone skips each attendee's meetings."""
+    logger.info("Testing first_common_free_slot")
+    try:
+        store.add_event(["ana@example.com"], ts("2024-05-07T09:30"), ts("2024-05-07T10:00"))
+        slot = store.first_common_free_slot(
+            ["eric@example.com", "ana@example.com"], 3600, ts("2024-05-07T09:00")
+        )
+        assert slot == (ts("2024-05-07T10:00"), ts("2024-05-07T11:00"))
+
+        slot = store.first_common_free_slot(["eric@example.com"], 3600, ts("2024-05-07T13:30"))
+        assert slot == (ts("2024-05-07T15:00"), ts("2024-05-07T16:00"))
+
+        assert store.first_common_free_slot(
+            ["eric@example.com"], 3600, ts("2024-05-07T13:30"), before=ts("2024-05-07T15:30")
+        ) is None
+        logger.debug(f"Found slot: {slot}")
+    except Exception as e:
+        logger.error(f"Error in free slot test: {str(e)}")
+        raise
+
+def test_text_query_resolves_names(store):
+    """Test that names from the calendar resolve to attendees in text queries."""
+    answer = answer_free_slot_query(store, "Meet Eric and ana@example.com for 60 minutes after 2024-05-07 13:30")
+    assert answer == (
+        "First common free slot for eric@example.com, ana@example.com: "
+        "2024-05-07 15:00 UTC to 2024-05-07 16:00 UTC"
+    )
+    assert answer_free_slot_query(store, "Meet Zed") is None
+
+def test_call_calendar_tool(tmp_path):
+    """Test that call_calendar answers from the calendar directory when configured."""
+    (tmp_path / "team.ics").write_text(ICS)
+    with patch.dict('os.environ', {"PAA_CALENDAR_DIR": str(tmp_path)}):
+        output = call_calendar.invoke({"query": "1 hour with Eric after 2024-05-07 14:00"})
+    assert output.startswith("First common free slot for eric@example.com: 2024-05-07 15:00")
+
+def vevent(*lines):
+    return "BEGIN:VEVENT\nORGANIZER:mailto:eric@example.com\n" + "\n".join(lines) + "\nEND:VEVENT\n"
+
+def test_parse_ics_converts_tzid():
+    """Test that TZID times are converted with their zone, including DST."""
+    text = vevent("DTSTART;TZID=Europe/Berlin:20240507T090000", "DTEND;TZID=Europe/Berlin:20240507T100000") \
+        + vevent("DTSTART;TZID=Europe/Berlin:20240107T090000", "DURATION:PT30M")
+    events = list(parse_ics(text))
+    assert [(start, end) for _, start, end in events] == [
+        (ts("2024-05-07T07:00"), ts("2024-05-07T08:00")),
+        (ts("2024-01-07T08:00"), ts("2024-01-07T08:30")),
+    ]
+
+def test_parse_ics_expands_rrule():
+    """Test that recurring meetings block every occurrence, at the same local time."""
+    logger.info("Testing RRULE expansion")
+    text = vevent(
+        "DTSTART;TZID=Europe/Berlin:20240320T090000",
+        "DTEND;TZID=Europe/Berlin:20240320T093000",
+        "RRULE:FREQ=WEEKLY;BYDAY=MO,WE;COUNT=4",
+        "EXDATE;TZID=Europe/Berlin:20240325T090000",
+    ) + vevent("DTSTART:20240131T120000Z", "DTEND:20240131T130000Z", "RRULE:FREQ=MONTHLY;UNTIL=20240501T000000Z")
+    starts = [start for _, start, _ in parse_ics(text)]
+    assert starts == [
+        # Mon 25 Mar is excluded; Mon 1 Apr is after the DST change on 31 Mar
+        ts("2024-03-20T08:00"), ts("2024-03-27T08:00"), ts("2024-04-01T07:00"),
+        # Months without a 31st are skipped
+        ts("2024-01-31T12:00"), ts("2024-03-31T12:00"),
+    ]
+
+def test_parse_ics_unbounded_rrule_stops_at_horizon():
+    text = vevent("DTSTART:20240101T090000Z", "DTEND:20240101T100000Z", "RRULE:FREQ=DAILY;INTERVAL=2")
+    events = list(parse_ics(text, horizon=ts("2024-01-10T00:00")))
+    assert len(events) == 5
+
+def test_parse_ics_all_day_and_malformed_events():
+    """Test that all-day events default to one day and malformed events are skipped."""
+    text = vevent("DTSTART;VALUE=DATE:20240507") \
+        + vevent("DTSTART:2024-05-07 09:00") \
+        + vevent("DTSTART;TZID=Nowhere/City:20240507T090000") \
+        + vevent("DTSTART:20240508T090000Z", "DTEND:20240508T100000Z", "RRULE:FREQ=MONTHLY;BYMONTHDAY=8")
+    events = [(start, end) for _, start, end in parse_ics(text)]
+    assert events == [
+        (ts("2024-05-07T00:00"), ts("2024-05-08T00:00")),
+        # Unsupported rules keep only their first occurrence
+        (ts("2024-05-08T09:00"), ts("2024-05-08T10:00")),
+    ]
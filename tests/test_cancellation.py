@@ -0,0 +1,122 @@
+import pytest
+import logging
+import threading
+import time
+from unittest.mock import patch
+from cancellation import CANCELLED, DEADLINE, MAX_HOPS, CancellationToken, CancelledRunError, current_cancel_token
+from llm import create_llm
+from resilience import ResilientCaller
+from task_manager import run_paa, run_tool_calls
+
+logger = logging.getLogger(__name__)
+
+def system_prompt(messages):
+    return messages[0]["content"] if isinstance(messages[0], dict) else messages[0].content
+
+def slow_ollama_chat(model, messages, **kwargs):
+    """Plans instantly; every step takes longer than the tests wait."""
+    system = messages[0]["content"]
+    if "replanning" in system:
+        return {"message": {"role": "assistant", "content": "COMPLETE"}}
+    if "planning" in system:
+        return {"message": {"role": "assistant", "content": '{"goals": "Test goal", "plan": ["Step 1", "Step 2"]}'}}
+    time.sleep(5)
+    return {"message": {"role": "assistant", "content": "Step done"}}
+
+def looping_llm(messages):
+    """Never lets the run finish: the replanner always replans the same step."""
+    system = system_prompt(messages)
+    if "replanning" in system:
+        return {"content": "REPLAN\n- Step 1"}
+    if "planning" in system:
+        return {"content": '{"goals": "Test goal", "plan": ["Step 1"]}'}
+    return {"content": "Step done"}
+
+def uncancellable_llm(model_id, **kwargs):
+    return create_llm(model_id, resilience=ResilientCaller(max_attempts=1), **kwargs)
+
+def test_token_reasons():
+    """Test that a token trips on cancel() and on its deadline."""
+    logger.info("Testing CancellationToken")
+    now = [0.0]
+    token = CancellationToken(timeout=10, clock=lambda: now[0])
+    try:
+        assert token.reason is None
+        assert token.remaining() == 10
+        token.set_deadline(20)  # a later deadline doesn't extend the earlier one
+        now[0] = 10
+        assert token.reason == DEADLINE
+        with pytest.raises(CancelledRunError) as excinfo:
+            token.check()
+        assert excinfo.value.reason == DEADLINE
+        token.cancel()
+        assert token.reason == CANCELLED
+    except Exception as e:
+        logger.error(f"Error in token test: {str(e)}")
+        raise
+
+def test_token_run_abandons_call():
+    token = CancellationToken()
+    release = threading.Event()
+    threading.Timer(0.1, token.cancel).start()
+    started = time.perf_counter()
+    with pytest.raises(CancelledRunError):
+        token.run(lambda: release.wait(5))
+    assert time.perf_counter() - started < 2
+    release.set()
+
+def test_tool_calls_stop_when_cancelled():
+    token = CancellationToken()
+    token.cancel()
+    reset = current_cancel_token.set(token)
+    try:
+        with pytest.raises(CancelledRunError):
+            run_tool_calls([("search", '{"query": "x"}')])
+    finally:
+        current_cancel_token.reset(reset)
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("engine", ["loop", "graph"])
+async def test_deadline_aborts_in_flight_call(engine):
+    """Test that a deadline abandons a slow Ollama call and returns the partial run."""
+    logger.info(f"Testing run_paa deadline with the {engine} engine")
+    started = time.perf_counter()
+    with patch('task_manager.create_llm', side_effect=uncancellable_llm), \
+            patch('ollama.chat', side_effect=slow_ollama_chat):
+        events = [s async for s in run_paa("Test task", "deadline-model", engine=engine, deadline=0.5)]
+    elapsed = time.perf_counter() - started
+    final = events[-1]
+    logger.debug(f"Final event: {final}")
+    assert elapsed < 3
+    assert final["current_node"] == "end"
+    assert final["stopped"] == DEADLINE
+    assert final["plan"] == ["Step 1", "Step 2"]
+    assert final["goals"] == "Test goal"
+    assert "after 0 of 2 steps" in final["response"]
+    assert "routing" in final
+    assert not any("error" in e for e in events)
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("engine", ["loop", "graph"])
+async def test_max_hops_stops_replanning_loop(engine):
+    with patch('task_manager.create_llm', return_value=looping_llm):
+        events = [s async for s in run_paa("Test task", "test-model", engine=engine, max_hops=6)]
+    final = events[-1]
+    assert final["stopped"] == MAX_HOPS
+    assert "after 1 of 1 steps" in final["response"]
+    assert len([e for e in events if e.get("current_node") != "end"]) <= 6
+
+@pytest.mark.asyncio
+async def test_cancel_token_stops_run():
+    token = CancellationToken()
+    events = []
+    with patch('task_manager.create_llm', return_value=looping_llm):
+        async for status in run_paa("Test task", "test-model", max_hops=None, cancel_token=token):
+            events.append(status)
+            # The loop engine reports the node it runs next
+            if status.get("current_node") == "project_updater":
+                token.cancel()
+    final = events[-1]
+    assert final["stopped"] == CANCELLED
+    assert final["past_actions"] == [("Step 1", "Step done")]
+    assert "after 1 of 1 steps" in final["response"]
@@ -0,0 +1,73 @@
+import pytest
+import logging
+import time
+from unittest.mock import patch
+from cassette import Cassette, RECORD, REPLAY, request_key
+from llm import create_llm
+
+logger = logging.getLogger(__name__)
+
+@pytest.fixture
+def cassette_path(tmp_path):
+    """Path for a temporary cassette file."""
+    return str(tmp_path / "cassette.jsonl")
+
+def test_request_key_is_stable():
+    """Test that identical requests produce identical keys."""
+    logger.info("Testing request_key stability")
+    messages = [{"role": "user", "content": "Hello"}]
+    assert request_key("m", messages, {"temperature": 0}) == request_key("m", list(messages), {"temperature": 0})
+    assert request_key("m", messages) != request_key("other", messages)
+
+def test_record_then_replay(cassette_path, mock_ollama_response):
+    """Test that recorded responses are replayed without calling Ollama."""
+    logger.info("Testing cassette record and replay")
+    messages = [{"role": "user", "content": "test message"}]
+
+    with patch('ollama.chat', return_value=mock_ollama_response):
+        llm = create_llm("test-model", cassette=Cassette(cassette_path, mode=RECORD))
+        recorded = llm(messages)
+
+    try:
+        with patch('ollama.chat', side_effect=AssertionError("Ollama should not be called")):
+            llm = create_llm("test-model", cassette=Cassette(cassette_path, mode=REPLAY))
+            replayed = llm(messages)
+        assert replayed == recorded
+        logger.debug(f"Replayed response: {replayed}")
+    except Exception as e:
+        logger.error(f"Error in record/replay test: {str(e)}")
+        raise
+
+def test_replay_miss_raises(cassette_path, mock_ollama_response):
+    """Test that an unrecorded request surfaces as a communication error."""
+    logger.info("Testing cassette replay miss")
+    with patch('ollama.chat', return_value=mock_ollama_response):
+        create_llm("test-model", cassette=Cassette(cassette_path, mode=RECORD))([{"role": "user", "content": "a"}])
+
+    llm = create_llm("test-model", cassette=Cassette(cassette_path, mode=REPLAY))
+    with pytest.raises(RuntimeError) as exc_info:
+        llm([{"role": "user", "content": "b"}])
+    assert "No recorded response" in str(exc_info.value)
+
+def test_replay_speed(cassette_path):
+    """Test that replay honours the recorded timing scaled by speed."""
+    logger.info("Testing cassette replay speed")
+    messages = [{"role": "user", "content": "slow"}]
+    Cassette(cassette_path, mode=RECORD).record(
+        "test-model", messages, None, {"content": "done", "role": "assistant"}, 0.2
+    )
+
+    fast = Cassette(cassette_path, mode=REPLAY, speed=0)
+    started = time.perf_counter()
+    fast.replay("test-model", messages)
+    assert time.perf_counter() - started < 0.1
+
+    scaled = Cassette(cassette_path, mode=REPLAY, speed=2)
+    started = time.perf_counter()
+    scaled.replay("test-model", messages)
+    assert time.perf_counter() - started >= 0.09
+
+def test_invalid_mode(cassette_path):
+    """Test that unknown cassette modes are rejected."""
+    with pytest.raises(ValueError):
+        Cassette(cassette_path, mode="rewind")
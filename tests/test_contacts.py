@@ -0,0 +1,92 @@
+import pytest
+import logging
+import os
+from unittest.mock import patch
+from contacts import ContactDirectory, load_vcard, trigrams
+from tools import get_contact
+
+logger = logging.getLogger(__name__)
+
+CSV = """Name,Email,Phone
+Eric Smith,eric.smith@example.com,555-0100
+Erica Jones,erica@example.com,555-0101
+Ana Lopez,ana@example.com,555-0102
+Frederic Brown,fred@example.com,555-0103
+"""
+
+VCARD = """BEGIN:VCARD
+VERSION:3.0
+N:Smith;Eric;;;
+EMAIL;TYPE=work:eric.smith@exa
+ mple.com
+TEL:555-0100
+END:VCARD
+BEGIN:VCARD
+FN:Ana Lopez
+item1.EMAIL:ana@example.com
+END:VCARD
+"""
+
+@pytest.fixture
+def contacts_file(tmp_path):
+    path = tmp_path / "contacts.csv"
+    path.write_text(CSV)
+    return str(path)
+
+def test_trigrams():
+    assert trigrams("eric") == ["  e", " er", "eri", "ric", "ic "]
+
+def test_prefix_ranking(contacts_file):
+    """Test that prefix matches rank exact word matches first."""
+    logger.info("Testing prefix ranking")
+    try:
+        directory = ContactDirectory(contacts_file, poll_interval=0)
+        results = directory.search("eric", k=3)
+        assert [r["name"] for r in results[:2]] == ["Eric Smith", "Erica Jones"]
+        assert results[0]["email"] == "eric.smith@example.com"
+        assert directory.search("lop")[0]["name"] == "Ana Lopez"
+        assert directory.search("fred")[0]["name"] == "Frederic Brown"
+        logger.debug(f"Search results: {results}")
+    except Exception as e:
+        logger.error(f"Error in prefix ranking test: {str(e)}")
+        raise
+
+def test_fuzzy_matching(contacts_file):
+    """Test that misspelled names are found through trigrams."""
+    directory = ContactDirectory(contacts_file, poll_interval=0)
+    assert directory.search("Erik Smith")[0]["name"] == "Eric Smith"
+    assert directory.search("Lopes")[0]["name"] == "Ana Lopez"
+    assert directory.search("zzzz") == []
+
+def test_load_vcard(tmp_path):
+    """Test that vCards are parsed, including N fallback and folded lines."""
+    path = tmp_path / "contacts.vcf"
+    path.write_text(VCARD)
+    contacts = load_vcard(str(path))
+    assert [(c.name, c.email, c.phone) for c in contacts] == [
+        ("Eric Smith", "eric.smith@example.com", "555-0100"),
+        ("Ana Lopez", "ana@example.com", ""),
+    ]
+
+def test_reload_swaps_index(contacts_file):
+    """Test that a changed file is picked up and a broken one keeps the old index."""
+    logger.info("Testing contact reload")
+    directory = ContactDirectory(contacts_file, poll_interval=0)
+    assert directory.reload() is False
+    with open(contacts_file, "a") as f:
+        f.write("Zoe Quinn,zoe@example.com,555-0104\n")
+    os.utime(contacts_file, ns=(0, 1))
+    assert directory.reload() is True
+    assert directory.search("zoe")[0]["name"] == "Zoe Quinn"
+
+    os.remove(contacts_file)
+    assert directory.reload() is False
+    assert len(directory) == 5
+
+def test_get_contact_tool(contacts_file):
+    """Test that get_contact answers from the directory when configured."""
+    with patch.dict('os.environ', {"PAA_CONTACTS_FILE": contacts_file}):
+        output = get_contact.invoke({"name": "Eric"})
+        assert output.startswith("Contact info for Eric Smith: eric.smith@example.com, 555-0100")
+        assert "Other matches: Erica Jones" in output
+        assert get_contact.invoke({"name": "qqqq"}) == "No contact found for qqqq"
@@ -0,0 +1,46 @@
+import pytest
+import logging
+import os
+from executor import PureExecutor, INLINE, PROCESS
+from task_manager import parse_llm_result
+
+logger = logging.getLogger(__name__)
+
+@pytest.fixture
+def process_executor():
+    executor = PureExecutor(mode=PROCESS, workers=1)
+    yield executor
+    executor.shutdown()
+
+def test_inline_runs_in_caller():
+    """Test that inline mode calls the function directly."""
+    logger.info("Testing inline executor")
+    executor = PureExecutor(mode=INLINE)
+    assert executor.run(os.getpid) == os.getpid()
+
+def test_process_mode_offloads(process_executor):
+    """Test that process mode runs work in a worker process."""
+    logger.info("Testing process executor")
+    try:
+        process_executor.warm()
+        assert process_executor.run(os.getpid) != os.getpid()
+        result = process_executor.run(parse_llm_result, {"content": '{"goals": "g", "plan": ["a"]}'})
+        assert result == {"goals": "g", "plan": ["a"]}
+        logger.debug(f"Offloaded result: {result}")
+    except Exception as e:
+        logger.error(f"Error in process executor test: {str(e)}")
+        raise
+
+def test_small_payloads_stay_inline():
+    """Test that calls below the size threshold skip the pool."""
+    executor = PureExecutor(mode=PROCESS, workers=1, min_payload=1000)
+    try:
+        assert executor.run(os.getpid, size_hint=10) == os.getpid()
+        assert executor._pool is None
+    finally:
+        executor.shutdown()
+
+def test_invalid_mode():
+    """Test that unknown modes are rejected."""
+    with pytest.raises(ValueError):
+        PureExecutor(mode="threads")
@@ -1,7 +1,7 @@
 import pytest
 import logging
 from unittest.mock import patch, MagicMock
-from llm import create_llm, list_available_models
+from llm import PromptSession, create_llm, list_available_models
 
 logger = logging.getLogger(__name__)
 
@@ -112,3 +112,28 @@ def test_llm_with_streaming():
         except Exception as e:
             logger.error(f"Error in streaming test: {str(e)}")
             raise
+
+def test_session_reports_prompt_tokens_saved():
+    """Test that a session canonicalizes prompts and estimates the prompt-eval tokens saved."""
+    logger.info("Testing prompt session accounting")
+    system = {"role": "system", "content": "You are a helpful assistant.  \r\nUse tools.\n"}
+    counts = iter([40, 15])
+
+    def fake_chat(model, messages, stream, **kwargs):
+        assert kwargs["keep_alive"] == "30m"
+        assert messages[0]["content"] == "You are a helpful assistant.\nUse tools."
+        return {"message": {"role": "assistant", "content": "done"}, "prompt_eval_count": next(counts)}
+
+    with patch('ollama.chat', side_effect=fake_chat):
+        session = PromptSession()
+        llm = create_llm("test-model", session=session)
+        llm([system, {"role": "user", "content": "Goal: G\nTask: first step"}])
+        llm([system, {"role": "user", "content": "Goal: G\nTask: other step"}])
+
+    stats = session.stats()
+    logger.debug(f"Session stats: {stats}")
+    assert stats["calls"] == 2
+    assert stats["prompt_eval_tokens"] == 55
+    # The second prompt is as long as the first, which cost 40 tokens
+    assert stats["prompt_eval_tokens_saved"] == 25
+    assert stats["shared_prefix_ratio"] > 0.4
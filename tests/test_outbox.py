@@ -0,0 +1,149 @@
+import pytest
+import logging
+import socketserver
+import threading
+import time
+from unittest.mock import patch
+from outbox import FAILED, QUEUED, SENT, Outbox
+import outbox
+from tools import send_email
+
+logger = logging.getLogger(__name__)
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """Minimal SMTP dialogue that records delivered messages."""
+
+    def reply(self, line):
+        self.wfile.write((line + "\r\n").encode())
+
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        self.reply("220 localhost test SMTP")
+        recipients = []
+        while True:
+            line = self.rfile.readline().decode().strip()
+            command = line[:4].upper()
+            if not line or command == "QUIT":
+                self.reply("221 bye")
+                return
+            if command in ("EHLO", "HELO"):
+                self.reply("250 localhost")
+            elif command == "MAIL":
+                recipients = []
+                self.reply("250 OK")
+            elif command == "RCPT":
+                address = line.split(":", 1)[1].strip("<> ")
+                recipients.append(address)
+                if address in server.reject:
+                    self.reply(server.reject[address])
+                else:
+                    self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 go ahead")
+                data = []
+                while (chunk := self.rfile.readline().decode()) != ".\r\n":
+                    data.append(chunk)
+                server.messages.append((recipients, "".join(data)))
+                self.reply("250 queued")
+            else:
+                self.reply("250 OK")
+
+
+@pytest.fixture
+def smtp_server():
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), SMTPHandler)
+    server.daemon_threads = True
+    server.connections = 0
+    server.messages = []
+    server.reject = {}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_outbox(tmp_path, server, **kwargs):
+    host, port = server.server_address
+    return Outbox(str(tmp_path / "outbox.db"), host, port, start=False, **kwargs)
+
+
+def test_batch_reuses_connection(tmp_path, smtp_server):
+    """Test that one batch is delivered over a single SMTP connection."""
+    logger.info("Testing outbox batching")
+    try:
+        box = make_outbox(tmp_path, smtp_server)
+        ids = [box.enqueue(f"user{i}@example.com", f"Subject {i}", "Hello") for i in range(5)]
+        assert box.pending() == 5
+        assert box.send_due() == 5
+        assert smtp_server.connections == 1
+        assert [m[0] for m in smtp_server.messages] == [[f"user{i}@example.com"] for i in range(5)]
+        assert all(box.status(i)["status"] == SENT for i in ids)
+        box.close()
+    except Exception as e:
+        logger.error(f"Error in outbox batching test: {str(e)}")
+        raise
+
+def test_per_recipient_rate_limit(tmp_path, smtp_server):
+    """Test that messages to the same recipient are spaced out."""
+    now = [1000.0]
+    box = make_outbox(tmp_path, smtp_server, recipient_interval=10, clock=lambda: now[0])
+    first = box.enqueue("eric@example.com", "One", "Hello")
+    second = box.enqueue("eric@example.com", "Two", "Hello")
+    assert box.send_due() == 1
+    assert box.status(second)["status"] == QUEUED
+    assert box.send_due() == 0
+    now[0] += 10
+    assert box.send_due() == 1
+    assert box.status(first)["status"] == box.status(second)["status"] == SENT
+    box.close()
+
+def test_retry_with_backoff(tmp_path, smtp_server):
+    """Test that temporary failures are retried later and permanent ones fail."""
+    logger.info("Testing outbox retries")
+    now = [1000.0]
+    smtp_server.reject = {"busy@example.com": "451 try later", "gone@example.com": "550 no such user"}
+    box = make_outbox(tmp_path, smtp_server, backoff=4, max_attempts=2, clock=lambda: now[0])
+    busy = box.enqueue("busy@example.com", "Hi", "Hello")
+    gone = box.enqueue("gone@example.com", "Hi", "Hello")
+    box.send_due()
+    assert box.status(gone)["status"] == FAILED
+    assert box.status(busy)["status"] == QUEUED
+    assert box.status(busy)["attempts"] == 1
+    assert box.send_due() == 0
+
+    now[0] += 4
+    del smtp_server.reject["busy@example.com"]
+    assert box.send_due() == 1
+    assert box.status(busy)["attempts"] == 2
+    box.close()
+
+def test_messages_survive_restart(tmp_path, smtp_server):
+    """Test that queued messages are sent after the outbox is reopened."""
+    host, port = smtp_server.server_address
+    box = Outbox(str(tmp_path / "outbox.db"), host, 1, start=False, max_attempts=3, backoff=0)
+    message_id = box.enqueue("eric@example.com", "Hi", "Hello")
+    box.send_due()
+    box.close()
+
+    box = make_outbox(tmp_path, smtp_server)
+    assert box.send_due() == 1
+    assert box.status(message_id)["status"] == SENT
+    box.close()
+
+def test_send_email_enqueues(tmp_path, smtp_server):
+    """Test that send_email returns a message id and the sender thread delivers it."""
+    logger.info("Testing send_email with outbox")
+    host, port = smtp_server.server_address
+    env = {"PAA_SMTP_HOST": host, "PAA_SMTP_PORT": str(port), "PAA_OUTBOX_DB": str(tmp_path / "outbox.db")}
+    with patch.dict('os.environ', env), patch.object(outbox, "_outbox", None):
+        output = send_email.invoke({"to": "eric@example.com", "subject": "Plan", "body": "See attached"})
+        assert output.startswith("Email to eric@example.com queued for sending with message id ")
+        box = outbox.get_outbox()
+        deadline = time.time() + 5
+        while box.pending() and time.time() < deadline:
+            time.sleep(0.05)
+        assert "Subject: Plan" in smtp_server.messages[0][1]
+        box.close()
@@ -0,0 +1,60 @@
+import pytest
+import logging
+import tracemalloc
+from unittest.mock import patch
+from profiling import RunProfiler
+from task_manager import run_paa
+
+logger = logging.getLogger(__name__)
+
+def allocate(state):
+    state["blocks"] = [bytearray(1024) for _ in range(200)]
+    return state
+
+def fake_llm(messages):
+    system = messages[0]["content"] if isinstance(messages[0], dict) else messages[0].content
+    if "replanning" in system:
+        return {"content": "COMPLETE"}
+    if "planning" in system:
+        return {"content": '{"goals": "Test goal", "plan": ["Step 1", "Step 2"]}'}
+    return {"content": "Step done"}
+
+def test_profiler_reports_functions_and_allocations():
+    """Test that a profiled node reports its time, functions and allocation sites."""
+    logger.info("Testing RunProfiler")
+    profiler = RunProfiler(top=5)
+    try:
+        profiler.call("node", allocate, {})
+        profiler.call("node", allocate, {})
+        report = profiler.report()
+        logger.debug(f"Profile report: {report}")
+        assert report["nodes"]["node"]["calls"] == 2
+        assert any("allocate" in f["function"] for f in report["top_functions"])
+        assert len(report["top_functions"]) <= 5
+        assert report["top_allocations"][0]["site"].endswith(f"test_profiling.py:{allocate.__code__.co_firstlineno + 1}")
+        assert report["top_allocations"][0]["size_kb"] >= 200
+    finally:
+        profiler.close()
+    assert not tracemalloc.is_tracing()
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("engine", ["loop", "graph"])
+async def test_run_paa_profile(engine):
+    """Test that a profiled run attaches its profile to the final event."""
+    with patch('task_manager.create_llm', return_value=fake_llm):
+        events = [s async for s in run_paa("Test task", "test-model", engine=engine, profile=True)]
+    final = next(e for e in events if e.get("current_node") == "end")
+    assert set(final["profile"]["nodes"]) == {"planner", "task_executor", "project_updater", "replanner"}
+    assert final["profile"]["nodes"]["task_executor"]["calls"] == 2
+    assert final["profile"]["top_functions"]
+    assert not tracemalloc.is_tracing()
+
+@pytest.mark.asyncio
+async def test_run_paa_without_profile():
+    with patch('task_manager.create_llm', return_value=fake_llm), \
+            patch('profiling.cProfile.Profile') as profile:
+        events = [s async for s in run_paa("Test task", "test-model")]
+    final = next(e for e in events if e.get("current_node") == "end")
+    assert "profile" not in final
+    profile.assert_not_called()
+    assert not tracemalloc.is_tracing()
@@ -0,0 +1,75 @@
+import pytest
+import logging
+from unittest.mock import patch
+from routing import ModelRouter, parse_routes
+from task_manager import run_paa
+
+logger = logging.getLogger(__name__)
+
+def model_llm(model_id, calls):
+    """Fake chat callable that records which model served each node."""
+    def chat(messages):
+        system = messages[0]["content"] if isinstance(messages[0], dict) else messages[0].content
+        if "replanning" in system:
+            calls.append(("replanner", model_id))
+            # The small model rambles without a decision; the big one decides
+            return {"content": "Hmm, hard to say." if model_id == "small" else "COMPLETE", "eval_count": 2}
+        if "planning" in system:
+            calls.append(("planner", model_id))
+            return {"content": '{"goals": "Test goal", "plan": ["Step 1"]}', "prompt_eval_count": 10}
+        calls.append(("task_executor", model_id))
+        return {"content": "Step done"}
+    return chat
+
+def test_parse_routes():
+    assert parse_routes("replanner=llama3.2:1b, planner = llama3.1:8b") == {
+        "replanner": "llama3.2:1b", "planner": "llama3.1:8b",
+    }
+    assert parse_routes("") == {}
+    with pytest.raises(ValueError):
+        parse_routes("replanner")
+    with pytest.raises(ValueError):
+        parse_routes("unknown=llama3")
+
+def test_route_stats_and_escalation():
+    """Test that routed calls are accounted per route and unusable output escalates."""
+    logger.info("Testing router escalation")
+    try:
+        calls = []
+        router = ModelRouter("big", {"replanner": "small"}, escalation_model="big",
+                             llm_factory=lambda m: model_llm(m, calls))
+        assert router.model_for("replanner") == "small"
+        assert router.model_for("planner") == "big"
+
+        messages = [{"role": "system", "content": "replanning"}]
+        _, content = router.complete("replanner", messages, lambda r: r["content"],
+                                     accept=lambda c: "COMPLETE" in c)
+        assert content == "COMPLETE"
+        stats = router.stats()
+        assert stats["replanner:small"]["calls"] == 1
+        assert stats["replanner:small"]["escalations"] == 1
+        assert stats["replanner:big"]["completion_tokens"] == 2
+        logger.debug(f"Route stats: {stats}")
+    except Exception as e:
+        logger.error(f"Error in router test: {str(e)}")
+        raise
+
+def test_no_escalation_without_model():
+    router = ModelRouter("small", llm_factory=lambda m: model_llm(m, []))
+    _, content = router.complete("replanner", [{"role": "system", "content": "replanning"}],
+                                 lambda r: r["content"], accept=lambda c: False)
+    assert content == "Hmm, hard to say."
+
+@pytest.mark.asyncio
+async def test_run_paa_routes_nodes():
+    """Test that run_paa sends each node to its routed model and reports the routes."""
+    logger.info("Testing run_paa routing")
+    calls = []
+    with patch('task_manager.create_llm', side_effect=lambda m: model_llm(m, calls)):
+        events = [s async for s in run_paa(
+            "Test task", "big", routes={"replanner": "small", "task_executor": "small"}, escalation_model="big",
+        )]
+    final = next(e for e in events if e.get("current_node") == "end")
+    assert calls == [("planner", "big"), ("task_executor", "small"), ("replanner", "small"), ("replanner", "big")]
+    assert final["routing"]["planner:big"]["prompt_tokens"] == 10
+    assert final["routing"]["replanner:small"]["escalations"] == 1
@@ -0,0 +1,211 @@
+import pytest
+import asyncio
+import logging
+import time
+from unittest.mock import patch
+from runner import RunManager, FINISHED, FAILED
+
+logger = logging.getLogger(__name__)
+
+async def fake_run_paa(question, model_id, **kwargs):
+    """Stand-in for run_paa that emits a few events slowly."""
+    for node in ["planner", "task_executor", "replanner"]:
+        await asyncio.sleep(0.05)
+        yield {"current_node": node, "response": question}
+    yield {"current_node": "end", "response": f"{question} done"}
+
+async def failing_run_paa(question, model_id, **kwargs):
+    yield {"current_node": "planner"}
+    raise RuntimeError("boom")
+
+@pytest.fixture
+def manager():
+    manager = RunManager()
+    yield manager
+    manager.shutdown()
+
+def wait_until_done(manager, run_id, timeout=5):
+    deadline = time.time() + timeout
+    while manager.get(run_id).status == "running" and time.time() < deadline:
+        time.sleep(0.01)
+
+@pytest.mark.asyncio
+async def test_follow_replays_and_streams(manager):
+    """Test that a follower receives all events of a background run."""
+    logger.info("Testing RunManager.follow")
+    with patch('runner.run_paa', fake_run_paa):
+        try:
+            run_id = manager.submit("Test task", "test-model")
+            events = [event async for event in manager.follow(run_id, poll_interval=0.01)]
+            assert [e["current_node"] for e in events] == ["planner", "task_executor", "replanner", "end"]
+
+            # A late follower (e.g. after a Streamlit rerun) gets the same replay
+            replay = [event async for event in manager.follow(run_id)]
+            assert replay == events
+            assert manager.get(run_id).status == FINISHED
+            logger.debug(f"Run events: {events}")
+        except Exception as e:
+            logger.error(f"Error in follow test: {str(e)}")
+            raise
+
+def test_runs_in_flight_concurrently(manager):
+    """Test that several runs progress at the same time."""
+    logger.info("Testing concurrent runs")
+    with patch('runner.run_paa', fake_run_paa):
+        started = time.time()
+        run_ids = [manager.submit(f"Task {i}", "test-model") for i in range(5)]
+        assert len(manager.active_runs()) == 5
+        for run_id in run_ids:
+            wait_until_done(manager, run_id)
+        # Five sequential runs would take at least 1 second
+        assert time.time() - started < 0.8
+        assert not manager.active_runs()
+
+def test_failed_run_records_error(manager):
+    """Test that an exception inside a run ends it with an error event."""
+    with patch('runner.run_paa', failing_run_paa):
+        run_id = manager.submit("Test task", "test-model")
+        wait_until_done(manager, run_id)
+        record = manager.get(run_id)
+        assert record.status == FAILED
+        assert record.events[-1] == {"error": "boom"}
+
+async def error_event_run_paa(question, model_id, **kwargs):
+    yield {"current_node": "planner"}
+    yield {"error": "Error communicating with Ollama"}
+
+def test_error_event_fails_run():
+    """Test that a run that reports an error event is marked failed and not reused."""
+    manager = RunManager(coalesce=True, coalesce_window=60)
+    try:
+        with patch('runner.run_paa', error_event_run_paa):
+            run_id = manager.submit("Test task", "test-model")
+            wait_until_done(manager, run_id)
+            record = manager.get(run_id)
+            assert record.status == FAILED
+            assert record.error == "Error communicating with Ollama"
+            retried_id = manager.submit("Test task", "test-model")
+            assert retried_id != run_id
+            wait_until_done(manager, retried_id)
+    finally:
+        manager.shutdown()
+
+def test_finished_runs_are_pruned():
+    """Test that finished runs are dropped after the retention window."""
+    manager = RunManager(retention=0)
+    try:
+        with patch('runner.run_paa', fake_run_paa):
+            run_id = manager.submit("Test task", "test-model")
+            wait_until_done(manager, run_id)
+            manager.submit("Another task", "test-model")
+            assert manager.get(run_id) is None
+    finally:
+        manager.shutdown()
+
+@pytest.mark.asyncio
+async def test_identical_submissions_coalesce():
+    """Test that identical submissions share one run and late subscribers get a replay."""
+    logger.info("Testing run coalescing")
+    manager = RunManager(coalesce=True, coalesce_window=60)
+    calls = []
+
+    async def counting_run_paa(question, model_id, **kwargs):
+        calls.append(question)
+        async for event in fake_run_paa(question, model_id, **kwargs):
+            yield event
+
+    try:
+        with patch('runner.run_paa', counting_run_paa):
+            run_id = manager.submit("Draft an email", "test-model")
+            await asyncio.sleep(0.08)
+            assert manager.submit("  draft an   EMAIL ", "test-model") == run_id
+            # Different models or options are different runs
+            assert manager.submit("Draft an email", "other-model") != run_id
+            assert manager.submit("Draft an email", "test-model", speculative=True) != run_id
+
+            late = [event async for event in manager.follow(manager.submit("Draft an email", "test-model"))]
+            assert [e["current_node"] for e in late] == ["planner", "task_executor", "replanner", "end"]
+            # The finished run is still reused within the window
+            assert manager.submit("Draft an email", "test-model") == run_id
+            assert calls.count("Draft an email") == 3
+            assert manager.get(run_id).coalesced == 3
+            assert manager.coalesced == 3
+    finally:
+        manager.shutdown()
+
+def test_coalescing_window_and_failures():
+    """Test that expired and failed runs are not reused."""
+    manager = RunManager(coalesce=True, coalesce_window=0)
+    try:
+        with patch('runner.run_paa', fake_run_paa):
+            run_id = manager.submit("Test task", "test-model")
+            wait_until_done(manager, run_id)
+            second_id = manager.submit("Test task", "test-model")
+            assert second_id != run_id
+            wait_until_done(manager, second_id)
+        with patch('runner.run_paa', failing_run_paa):
+            manager.coalesce_window = 60
+            failed_id = manager.submit("Failing task", "test-model")
+            wait_until_done(manager, failed_id)
+            retried_id = manager.submit("Failing task", "test-model")
+            assert retried_id != failed_id
+            wait_until_done(manager, retried_id)
+    finally:
+        manager.shutdown()
+
+def test_coalescing_is_opt_in(manager):
+    with patch('runner.run_paa', fake_run_paa):
+        run_ids = [manager.submit("Test task", "test-model") for _ in range(2)]
+        assert run_ids[0] != run_ids[1]
+        for run_id in run_ids:
+            wait_until_done(manager, run_id)
+
+async def cancellable_run_paa(question, model_id, cancel_token=None, **kwargs):
+    """Stand-in for run_paa that stops with a partial final event once cancelled."""
+    for node in ["planner", "task_executor", "project_updater", "replanner"] * 20:
+        await asyncio.sleep(0.02)
+        if cancel_token.reason:
+            yield {"current_node": "end", "stopped": cancel_token.reason}
+            return
+        yield {"current_node": node}
+    yield {"current_node": "end"}
+
+def test_cancel_stops_run_and_is_not_reused():
+    manager = RunManager(coalesce=True)
+    try:
+        with patch('runner.run_paa', cancellable_run_paa):
+            run_id = manager.submit("Test task", "test-model")
+            time.sleep(0.05)
+            assert manager.cancel(run_id)
+            wait_until_done(manager, run_id)
+            record = manager.get(run_id)
+            assert record.status == FINISHED
+            assert record.events[-1] == {"current_node": "end", "stopped": "cancelled"}
+            assert record.stopped == "cancelled"
+            assert not manager.cancel(run_id)
+            # A stopped run has only part of the answer, so a new submission starts over
+            new_run_id = manager.submit("Test task", "test-model")
+            assert new_run_id != run_id
+            manager.cancel(new_run_id)
+            wait_until_done(manager, new_run_id)
+    finally:
+        manager.shutdown()
+
+def test_cancel_detaches_coalesced_submission():
+    """Test that cancelling a shared run only stops it once every submitter has cancelled."""
+    manager = RunManager(coalesce=True)
+    try:
+        with patch('runner.run_paa', cancellable_run_paa):
+            run_id = manager.submit("Test task", "test-model")
+            assert manager.submit("Test task", "test-model") == run_id
+            time.sleep(0.05)
+            assert manager.cancel(run_id)
+            time.sleep(0.05)
+            record = manager.get(run_id)
+            assert record.status == "running"
+            assert record.cancel_token.reason is None
+            assert manager.cancel(run_id)
+            wait_until_done(manager, run_id)
+            assert record.stopped == "cancelled"
+    finally:
+        manager.shutdown()
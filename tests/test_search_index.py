@@ -0,0 +1,94 @@
+import pytest
+import logging
+from unittest.mock import patch
+from search_index import SearchIndex, tokenize
+from tools import web_search
+
+logger = logging.getLogger(__name__)
+
+DOCUMENTS = [
+    ("doc-1", "Solar adoption", "Solar energy adoption in Europe grew quickly last year."),
+    ("doc-2", "Wind report", "Wind power capacity in Europe reached a record. Wind wind wind."),
+    ("doc-3", "Team offsite", "Planning notes for the team building event."),
+]
+
+@pytest.fixture
+def index(tmp_path):
+    index = SearchIndex(str(tmp_path / "index"))
+    index.add_documents(DOCUMENTS)
+    return index
+
+def test_tokenize():
+    assert tokenize("Renewable-Energy, 2024!") == ["renewable", "energy", "2024"]
+
+def test_bm25_ranking(index):
+    """Test that documents matching more query terms rank higher."""
+    logger.info("Testing BM25 ranking")
+    try:
+        results = index.search("wind power Europe", k=3)
+        assert [r["id"] for r in results] == ["doc-2", "doc-1"]
+        assert results[0]["score"] > results[1]["score"]
+        assert index.search("nonexistent term") == []
+        logger.debug(f"Search results: {results}")
+    except Exception as e:
+        logger.error(f"Error in BM25 ranking test: {str(e)}")
+        raise
+
+def test_incremental_indexing_and_reopen(index, tmp_path):
+    """Test that new segments are searchable and persist across reopen."""
+    logger.info("Testing incremental indexing")
+    index.add_documents([("doc-4", "Hydro", "Hydro energy statistics for Europe.")])
+    assert index.num_docs == 4
+    assert index.search("hydro")[0]["id"] == "doc-4"
+
+    reopened = SearchIndex(str(tmp_path / "index"))
+    assert reopened.num_docs == 4
+    assert {r["id"] for r in reopened.search("europe", k=10)} == {"doc-1", "doc-2", "doc-4"}
+
+def test_top_k_limit(tmp_path):
+    """Test that only k results are returned from a larger candidate set."""
+    index = SearchIndex(str(tmp_path / "index"))
+    index.add_documents((f"d{i}", f"Doc {i}", "energy " * (i + 1)) for i in range(50))
+    results = index.search("energy", k=5)
+    assert len(results) == 5
+    assert [r["score"] for r in results] == sorted((r["score"] for r in results), reverse=True)
+
+def test_web_search_uses_index(index):
+    """Test that web_search queries the local index when configured."""
+    logger.info("Testing web_search with local index")
+    with patch.dict('os.environ', {"PAA_SEARCH_INDEX": index.path}):
+        output = web_search.invoke({"query": "solar adoption"})
+    assert "Solar adoption (doc-1)" in output
+    with patch.dict('os.environ', {}, clear=True):
+        assert web_search.invoke({"query": "x"}) == "Web search results for: x"
+
+def test_reader_sees_segments_added_elsewhere(index, tmp_path):
+    """Test that an open index picks up segments another writer added."""
+    writer = SearchIndex(index.path)
+    writer.add_documents([("doc-4", "Hydro", "Hydro energy statistics for Europe.")])
+    index.add_documents([("doc-5", "Geothermal", "Geothermal energy in Iceland.")])
+    assert index.num_docs == 5
+    assert index.search("hydro")[0]["id"] == "doc-4"
+    # Both writers appended to the manifest instead of overwriting each other
+    assert writer.search("geothermal")[0]["id"] == "doc-5"
+    assert index.num_segments == 3
+
+def test_compaction_keeps_results(tmp_path):
+    """Test that merging segments bounds their number without changing rankings."""
+    index = SearchIndex(str(tmp_path / "index"), max_segments=3)
+    batches = [[(f"d{i}-{j}", f"Doc {i} {j}", f"energy report{i} " * (j + 1)) for j in range(3)] for i in range(3)]
+    for batch in batches:
+        index.add_documents(batch)
+    before = index.search("report1 energy", k=3)
+    assert index.compact()
+    assert index.num_segments == 1
+    assert index.search("report1 energy", k=3) == before
+    assert not index.compact()
+
+    for i in range(3, 7):
+        index.add_documents([(f"d{i}", f"Doc {i}", "energy")])
+    # The fourth segment past the limit triggered a merge
+    assert index.num_segments <= 3
+    assert index.num_docs == 13
+    # More documents change the scores, not which documents match best
+    assert [r["id"] for r in SearchIndex(index.path).search("report1 energy", k=3)] == [r["id"] for r in before]
@@ -0,0 +1,80 @@
+import pytest
+import logging
+import threading
+import time
+from unittest.mock import patch
+from speculation import SpeculativePrefetcher
+from task_manager import run_paa
+
+logger = logging.getLogger(__name__)
+
+@pytest.fixture
+def prefetcher():
+    prefetcher = SpeculativePrefetcher()
+    yield prefetcher
+    prefetcher.close()
+
+def test_prefetch_hit(prefetcher):
+    """Test that a prefetched completion is served on take."""
+    logger.info("Testing prefetch hit")
+    prefetcher.prefetch("step 2", lambda: {"content": "done", "eval_count": 3})
+    assert prefetcher.take("step 2") == {"content": "done", "eval_count": 3}
+    assert prefetcher.take("step 2") is None
+    assert prefetcher.stats()["hits"] == 1
+
+def test_discarded_prefetch_counts_waste():
+    """Test that completions dropped after a replan are reported as waste."""
+    logger.info("Testing prefetch waste accounting")
+    prefetcher = SpeculativePrefetcher()
+    prefetcher.prefetch("old step", lambda: {"content": "x", "prompt_eval_count": 10, "eval_count": 5})
+    prefetcher.prefetch("kept step", lambda: {"content": "y"})
+    prefetcher.discard_except(["kept step"])
+    prefetcher.close()
+    stats = prefetcher.stats()
+    assert stats["wasted"] == 2
+    assert stats["wasted_tokens"] == 15
+    assert stats["hit_rate"] == 0.0
+
+def test_failed_prefetch_falls_back(prefetcher):
+    """Test that a failed prefetch is treated as a miss."""
+    def fail():
+        raise RuntimeError("Error communicating with Ollama")
+    prefetcher.prefetch("step", fail)
+    assert prefetcher.take("step") is None
+
+@pytest.mark.asyncio
+async def test_run_paa_overlaps_next_step():
+    """Test that step N+1's completion is issued while step N's tools run."""
+    logger.info("Testing speculative run_paa")
+    calls = []
+    step_two_started = threading.Event()
+
+    def fake_llm(messages):
+        content = messages[-1].content
+        calls.append(content)
+        if "replanning" in messages[0].content:
+            return {"content": "COMPLETE"}
+        if "planning" in messages[0].content:
+            return {"content": '{"goals": "Test goal", "plan": ["Step 1", "Step 2"]}'}
+        if "Task: Step 2" in content:
+            step_two_started.set()
+            return {"content": "Step 2 done", "eval_count": 4}
+        return {"content": 'Tool: web_search\nArgs: {"query": "slow"}'}
+
+    def slow_search(self, args):
+        # Step 1's tool only finishes once step 2's completion has been requested
+        assert step_two_started.wait(timeout=5)
+        return "results"
+
+    with patch('task_manager.create_llm', return_value=fake_llm), \
+         patch('langchain_core.tools.BaseTool.invoke', slow_search):
+        try:
+            events = [status async for status in run_paa("Test task", "test-model", speculative=True)]
+            final = next(e for e in events if e.get("current_node") == "end")
+            assert final["speculation"]["hits"] == 1
+            assert final["speculation"]["hit_rate"] == 1.0
+            assert sum("Task: Step 2" in c for c in calls) == 1
+            logger.debug(f"Speculation stats: {final['speculation']}")
+        except Exception as e:
+            logger.error(f"Error in speculative run_paa test: {str(e)}")
+            raise
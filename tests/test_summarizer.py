@@ -0,0 +1,97 @@
+import pytest
+import asyncio
+import logging
+import os
+import contextvars
+import threading
+import time
+from unittest.mock import patch
+from summarizer import MapReduceSummarizer, iter_chunks, summarize_document
+from tools import TOOLS, summarize_document as summarize_tool
+
+logger = logging.getLogger(__name__)
+
+@pytest.fixture
+def document(tmp_path):
+    """A document of numbered sentences, large enough for many chunks."""
+    path = tmp_path / "report.txt"
+    path.write_text(" ".join(f"Sentence number {i} of the quarterly report." for i in range(3000)))
+    return str(path)
+
+class CountingLLM:
+    """Fake LLM that tracks how many calls run at once."""
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, messages):
+        with self.lock:
+            self.active += 1
+            self.calls += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(0.01)
+        with self.lock:
+            self.active -= 1
+        return {"content": f"summary {self.calls}", "role": "assistant"}
+
+def test_iter_chunks_are_bounded(document):
+    """Test that streamed chunks respect the chunk size and cover the text."""
+    logger.info("Testing iter_chunks")
+    chunks = list(iter_chunks(document, chunk_size=500, chunk_overlap=0, read_size=1024))
+    assert all(len(c) <= 500 for c in chunks)
+    joined = " ".join(chunks)
+    assert "Sentence number 0 " in joined and "Sentence number 2999 " in joined
+
+@pytest.mark.asyncio
+async def test_map_reduce_concurrency_and_reduction(document):
+    """Test that chunks are summarized concurrently within the limit and reduced to one summary."""
+    logger.info("Testing MapReduceSummarizer")
+    llm = CountingLLM()
+    summarizer = MapReduceSummarizer("test-model", max_concurrency=3, fan_in=4, llm=llm)
+    try:
+        chunks = list(iter_chunks(document, chunk_size=1000, chunk_overlap=0))
+        summary = await summarizer.summarize_chunks(iter(chunks))
+        assert summary.startswith("summary")
+        assert 1 < llm.peak <= 3
+        # Map calls plus roughly one reduce per fan_in summaries
+        assert len(chunks) < llm.calls < len(chunks) * 2
+        logger.debug(f"{len(chunks)} chunks, {llm.calls} calls, peak concurrency {llm.peak}")
+    except Exception as e:
+        logger.error(f"Error in map-reduce test: {str(e)}")
+        raise
+
+@pytest.mark.asyncio
+async def test_single_chunk_needs_no_reduce(tmp_path):
+    """Test that a short document costs a single call."""
+    path = tmp_path / "short.txt"
+    path.write_text("A short note.")
+    llm = CountingLLM()
+    with patch('summarizer.create_llm', return_value=llm):
+        summary = await summarize_document(str(path), "test-model")
+    assert summary == "summary 1"
+    assert llm.calls == 1
+
+def test_tool_is_registered(document):
+    """Test that the executor can call the summarization tool."""
+    logger.info("Testing summarize_document tool")
+    assert summarize_tool in TOOLS
+    with patch('summarizer.create_llm', return_value=CountingLLM()), \
+         patch.dict('os.environ', {"PAA_SUMMARY_MODEL": "test-model", "PAA_UPLOAD_DIR": os.path.dirname(document)}):
+        # Fresh context, so no run's router set by an earlier test is used
+        context = contextvars.Context()
+        assert context.run(summarize_tool.invoke, {"path": document}).startswith("summary")
+        assert "not found" in context.run(summarize_tool.invoke, {"path": document + ".missing"})
+
+def test_tool_only_reads_attached_documents(tmp_path, document):
+    """Test that a path from the model can't point the tool at other local files."""
+    uploads = tmp_path / "uploads"
+    uploads.mkdir()
+    llm = CountingLLM()
+    with patch('summarizer.create_llm', return_value=llm), \
+         patch.dict('os.environ', {"PAA_SUMMARY_MODEL": "test-model", "PAA_UPLOAD_DIR": str(uploads)}):
+        context = contextvars.Context()
+        for path in [document, str(uploads / ".." / "report.txt"), "/etc/passwd"]:
+            assert "only attached documents" in context.run(summarize_tool.invoke, {"path": path})
+    assert llm.calls == 0
@@ -225,3 +225,35 @@ def test_error_handling():
         result = task_executor({"context": {"model_id": "test"}, "current_task": "test"})
         assert "error" in result["response"]
         logger.debug(f"Task executor error handled: {result}")
+
+@pytest.mark.asyncio
+async def test_run_paa_session_affinity():
+    """Test that a session-affinity run sends stable prompts and reports tokens saved."""
+    logger.info("Testing run_paa with session affinity")
+    prompts = []
+
+    def fake_chat(model, messages, stream, **kwargs):
+        system = messages[0]["content"]
+        prompts.append(messages)
+        if "replanning" in system:
+            content = "COMPLETE"
+        elif "planning" in system:
+            content = '{"goals": "Test goal", "plan": ["Step 1", "Step 2"]}'
+        else:
+            content = "Step done"
+        chars = sum(len(m["content"]) for m in messages)
+        # Only the first call evaluates its whole prompt
+        return {"message": {"role": "assistant", "content": content},
+                "prompt_eval_count": chars // 4 if len(prompts) == 1 else 5}
+
+    with patch('ollama.chat', side_effect=fake_chat):
+        events = [s async for s in run_paa("Test task", "session-model", session_affinity=True)]
+
+    final = next(e for e in events if e.get("current_node") == "end")
+    logger.debug(f"Session stats: {final['session']}")
+    assert final["session"]["calls"] == 4
+    assert final["session"]["prompt_eval_tokens_saved"] > 0
+    executor_prompts = [p for p in prompts if p[-1]["content"].startswith("Goal:")]
+    assert executor_prompts[0][0] == executor_prompts[1][0]
+    assert executor_prompts[1][-1]["content"].startswith("Goal: Test goal\nTask: Step 2")
+    assert "- Step 2: Step done" in prompts[-1][-1]["content"]